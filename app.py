@@ -25,35 +25,40 @@ Created: August 11, 2024
 """
 
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from typing import TypedDict, Annotated, List
-import base64
-from pathlib import Path
+from typing import TypedDict, Annotated, List, Optional
+from uuid import uuid4
 import chainlit as cl
 import boto3
 from botocore.config import Config
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.schema.runnable.config import RunnableConfig
 from langchain_aws import ChatBedrock
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
 from langgraph.graph.message import add_messages
-from langgraph.checkpoint.sqlite import SqliteSaver
 
 from function_tools import plot_tools, db_tools, quicksight_chaintools,search_tool
 from prompts.chat_with_tools_prompt import dialogue_prompt
+from utils.artifact_store import artifact_store, find_handles
+from utils.checkpoint_store import checkpoint_store
+from utils.context_manager import build_context, estimate_tokens
+from utils.model_router import MODEL_TIERS, TIER_ORDER, ModelRouter, routing_metrics, tier_from_tags
+from utils.prompt_cache import cacheable_system_message, prompt_cache_metrics
+from utils.query_cancellation import query_canceller
+from utils.semantic_cache import SemanticQueryCache, is_sql_error, is_validated_result
+from utils.tool_executor import ConcurrentToolExecutor
+from utils.tracing import span, tracer
+from utils.upload_processing import process_upload
 
 # Global settings
 PROVIDER = ""
-SEED = 1
-memory = SqliteSaver.from_conn_string(":memory:")
-executor = ThreadPoolExecutor()
+memory = checkpoint_store.saver
 
 # Define all tools used in the application
 tools = [
     plot_tools.plot_chart,
     db_tools.execute_query,
+    db_tools.read_query_result,
     db_tools.get_table_names,
     db_tools.get_table_info,
     search_tool.match_accurate_propernoun_tool,
@@ -67,7 +72,12 @@ tools = [
     quicksight_chaintools.get_analysis_info
 ]
 
-tool_node = ToolNode(tools)
+tool_node = ConcurrentToolExecutor(tools)
+# Validated question -> SQL pairs, looked up by Titan embedding of the question
+semantic_cache = SemanticQueryCache(search_tool.gen_emb)
+
+# System prompt and tool schemas are resent on every step and count against the context budget
+STATIC_PREFIX_TOKENS = estimate_tokens(dialogue_prompt) + sum(estimate_tokens(t.description) for t in tools)
 
 class AgentState(TypedDict):
     """
@@ -75,38 +85,65 @@ class AgentState(TypedDict):
     
     Attributes:
     messages (List): List of messages in the conversation.
-    charts (str): JSON string representation of chart data.
+    charts (str): Artifact handle of the chart produced in the latest step.
     """
     messages: Annotated[list, add_messages]
     charts: str
 
-async def setup_runnable():
+async def setup_runnable(thread_id: Optional[str] = None):
     """
     Set up the runnable for the chat session.
     
-    This function initializes the language model, sets up the prompt template,
+    This function initializes the language models of every routing tier, sets up the prompt template,
     and configures the chat session.
+
+    Args:
+    thread_id (str, optional): Checkpoint thread to continue. A fresh thread scoped
+        to the current Chainlit session is started when omitted.
     """
     #from langchain_anthropic import ChatAnthropic
-    global PROVIDER, SEED
-    bedrock_model_id = "anthropic.claude-3-sonnet-20240229-v1:0"
-    llm = ChatBedrock(
-        model_id=bedrock_model_id,
-        model_kwargs={"temperature": 0.55, "max_tokens": 200000, "top_p": 0.85}
-    )
-    PROVIDER, SEED = bedrock_model_id.split(".")[0], SEED + 1
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", dialogue_prompt),
-        MessagesPlaceholder(variable_name="messages"),
-    ])
-    runnable = prompt | llm.bind_tools(tools)
+    global PROVIDER
+    runnables = {}
+    for tier, model in MODEL_TIERS.items():
+        llm = ChatBedrock(
+            model_id=model["model_id"],
+            streaming=True,
+            model_kwargs=model["model_kwargs"]
+        )
+        # Static prefix (system prompt + tool schemas) is marked for Bedrock prompt caching
+        prompt = ChatPromptTemplate.from_messages([
+            cacheable_system_message(dialogue_prompt, model["model_id"]),
+            MessagesPlaceholder(variable_name="messages"),
+        ])
+        runnables[tier] = prompt | llm.bind_tools(tools)
+    PROVIDER = MODEL_TIERS["large"]["model_id"].split(".")[0]
+    runnable = ModelRouter(runnables)
     cl.user_session.set("runnable", runnable)
     cl.user_session.set("messages", [])
     cl.user_session.set("charts", "")
+    cl.user_session.set("thread_id", thread_id or f"{cl.context.session.thread_id}-{uuid4().hex[:8]}")
+    await checkpoint_store.setup()
+    checkpoint_store.start_compaction()
+    tracer.start_metrics_server()
+
+def latest_chart_handle(messages) -> str:
+    """
+    Return the chart handle produced by the tool results of the latest step, if any.
+    """
+    for m in messages[::-1]:
+        if not isinstance(m, ToolMessage):
+            break
+        handles = find_handles(m.content, kind="chart")
+        if handles:
+            return handles[-1]
+    return ""
 
-def call_model(state: AgentState) -> AgentState:
+async def call_model(state: AgentState) -> AgentState:
     """
     Call the language model with the current state and return the updated state.
+
+    The model is awaited natively so that, when the graph runs under
+    `astream_events`, its tokens are emitted as they are generated.
     
     Args:
     state (AgentState): Current state of the agent.
@@ -115,17 +152,18 @@ def call_model(state: AgentState) -> AgentState:
     AgentState: Updated state after model invocation.
     """
     try:
-        messages = []
         llm = cl.user_session.get('runnable')
-        for m in state["messages"][::-1]:
-            messages.append(m)
-            if len(messages) >= 100:
-                if not hasattr(messages[-1], 'type') or messages[-1].type != "tool":
-                    break
-        
-        response = llm.invoke(messages[::-1])
-        last_message = state["messages"][-1].content if state["messages"] else ""
-        charts = last_message[7:-1] if isinstance(last_message, str) and last_message.startswith("Figure(") else ""
+        messages = build_context(state["messages"], reserved_tokens=STATIC_PREFIX_TOKENS)
+        with span("node", "agent", context_messages=len(messages)) as node_span:
+            response = await llm.ainvoke(messages)
+            usage = getattr(response, "usage_metadata", None) or {}
+            node_span.set(
+                model_tier=response.response_metadata.get("model_tier"),
+                input_tokens=usage.get("input_tokens"),
+                output_tokens=usage.get("output_tokens"),
+            )
+        prompt_cache_metrics.record(response)
+        charts = latest_chart_handle(state["messages"])
         return {"messages": [response], "charts": charts}
     except Exception as e:
         return {"messages": [AIMessage(content=f"Error in call_model: {str(e)}. Conversation reset.")], "charts": ""}
@@ -133,7 +171,7 @@ def call_model(state: AgentState) -> AgentState:
 # Define the workflow graph
 workflow = StateGraph(AgentState)
 workflow.add_node("agent", call_model)
-workflow.add_node("action", tool_node)
+workflow.add_node("action", tool_node.arun)
 workflow.set_entry_point("agent")
 workflow.add_conditional_edges(
     "agent", 
@@ -144,19 +182,52 @@ workflow.add_edge("action", "agent")
 
 app = workflow.compile(checkpointer=memory)
 
+tracer.register_gauge_source("prompt_cache", prompt_cache_metrics.snapshot)
+tracer.register_gauge_source("model_routing", routing_metrics.snapshot)
+tracer.register_gauge_source("semantic_cache", semantic_cache.snapshot)
+
 @cl.on_chat_start
 async def main():
     """
     Initialize the chat session when a new conversation starts.
     """
     #boto3.client("bedrock", config=Config(retries={'max_attempts': 10}))
+    await setup_runnable(cl.context.session.thread_id)
+
+@cl.on_chat_resume
+async def on_chat_resume(thread):
+    """
+    Continue a persisted conversation from its on-disk checkpoints.
+    """
+    await setup_runnable(thread["id"])
+
+@cl.on_settings_update
+async def on_settings_update(settings):
+    """
+    Start a new conversation thread with the updated settings.
+    """
     await setup_runnable()
 
-cl.on_settings_update(setup_runnable)
+@cl.on_stop
+async def on_stop():
+    """
+    Cancel the database statements of a run stopped by the user.
+    """
+    await query_canceller.acancel(cl.context.session.id)
+
+@cl.on_chat_end
+async def on_chat_end():
+    """
+    Cancel the database statements of a session whose tab was closed.
+    """
+    await query_canceller.acancel(cl.context.session.id)
 
 async def process_file(file):
     """
     Process an uploaded file and prepare it for the AI model.
+
+    Encoding happens off the event loop and is cached by content hash; large
+    tabular files are loaded into a database table instead of being inlined.
     
     Args:
     file (cl.File): File object from Chainlit.
@@ -164,32 +235,116 @@ async def process_file(file):
     Returns:
     dict: Processed file information or None if file doesn't exist.
     """
-    if not Path(file.path).exists():
-        return None
-    
-    with open(file.path, "rb") as f:
-        file_data = base64.b64encode(f.read()).decode('utf-8')
-    
-    if "image" in file.mime:
-        return {
-            "type": "image",
-            "source": {
-                "type": "base64",
-                "media_type": file.mime,
-                "data": file_data
-            }
-        }
-    else:
-        return {
-            "type": "document",
-            "source": {
-                "type": "base64",
-                "media_type": file.mime or "application/octet-stream",
-                "data": file_data
-            },
-            "name": Path(file.path).stem.replace('.', '-'),
-            "format": Path(file.path).suffix.lstrip('.')
-        }
+    return await process_upload(file.path, file.mime)
+
+def chunk_text(chunk) -> str:
+    """
+    Extract the text delta from a streamed chat model chunk.
+
+    Bedrock Claude chunks carry either a plain string or a list of content
+    blocks, where tool-use blocks have no text to show.
+    """
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(
+        block.get("text", "") for block in chunk.content
+        if isinstance(block, dict) and block.get("type") in ("text", "text_delta")
+    )
+
+async def stream_graph(messages, config: RunnableConfig, msg: cl.Message) -> bool:
+    """
+    Run the workflow for one user message, streaming model tokens and tool progress into `msg`.
+
+    Args:
+    messages (list): Messages this turn adds: the user's message, optionally followed
+        by an `execute_query` call answered from the semantic cache.
+
+    Tokens of a model tier that can still be escalated are held back until its run
+    ends, and dropped if the router re-runs the step on the large model.
+
+    Returns:
+    bool: Whether the final answer was streamed (False when the last agent step did not stream).
+    """
+    router = cl.user_session.get("runnable")
+    # run id -> (tier, tokens) of runs whose response may still be replaced
+    held = {}
+    answer_streamed = False
+    async for event in app.astream_events({"messages": messages}, config, version="v2"):
+        kind = event["event"]
+        is_agent = event["metadata"].get("langgraph_node") == "agent"
+        if kind == "on_chat_model_stream" and is_agent:
+            token = chunk_text(event["data"]["chunk"])
+            tier = tier_from_tags(event.get("tags"))
+            if token and tier is not None and tier != TIER_ORDER[-1]:
+                held.setdefault(event["run_id"], (tier, []))[1].append(token)
+            elif token:
+                answer_streamed = True
+                await msg.stream_token(token)
+        elif kind == "on_chat_model_end" and is_agent and event["run_id"] in held:
+            tier, tokens = held.pop(event["run_id"])
+            if not router.escalates(tier, event["data"]["output"]):
+                answer_streamed = True
+                await msg.stream_token("".join(tokens))
+        elif kind == "on_tool_start":
+            answer_streamed = False
+            await msg.stream_token(f"\n\n`{event['name']}` running...\n\n")
+        elif kind == "on_tool_end":
+            await msg.stream_token(f"`{event['name']}` done.\n\n")
+    return answer_streamed
+
+async def semantic_shortcut(question: str, config: RunnableConfig, msg: cl.Message, allow_direct: bool = True):
+    """
+    Look the question up in the semantic cache.
+
+    A direct match runs its SQL through `tool_node`, with the same concurrency limit,
+    timeout and cancellation scope as an `execute_query` call of the agent.
+
+    Args:
+    allow_direct (bool): Whether the stored SQL may be run without the agent; False
+        for follow-ups, whose meaning depends on the conversation.
+
+    Returns:
+    tuple: Messages to add after the user's message (an `execute_query` call and
+    its result for a very close match), a hint with validated SQL for the
+    user's message (for a close match), and the question's embedding.
+    """
+    match, embedding = await asyncio.to_thread(semantic_cache.lookup, question)
+    if match is None:
+        return [], "", embedding
+    if match.direct and allow_direct:
+        await msg.stream_token("`execute_query` running (answered before)...\n\n")
+        call = {"name": "execute_query", "args": {"query": match.sql}, "id": f"semantic_{uuid4().hex[:12]}"}
+        result = await tool_node.arun_call(call, config)
+        if is_validated_result(result.content):
+            return [AIMessage(content="", tool_calls=[call]), result], "", embedding
+        # the stored SQL no longer works, e.g. after a schema change; a timeout or cancel says nothing about it
+        if is_sql_error(result.content):
+            await asyncio.to_thread(semantic_cache.forget, match.sql)
+        return [], "", embedding
+    hint = (
+        f"\n\n[A similar earlier question (similarity {match.score:.2f}) was answered with validated SQL.\n"
+        f"Earlier question: {match.question}\n```sql\n{match.sql}\n```\n"
+        "If it fits this question, adapt its literals (dates, names, limits) and call execute_query directly, "
+        "skipping the guidance, table name and table info steps.]"
+    )
+    return [], hint, embedding
+
+def validated_sql(messages) -> Optional[str]:
+    """
+    SQL of the last successful `execute_query` call among the messages of a turn.
+    """
+    queries = {}
+    sql = None
+    for m in messages:
+        if isinstance(m, AIMessage):
+            for call in m.tool_calls or []:
+                if call["name"] == "execute_query":
+                    queries[call["id"]] = call["args"].get("query")
+        elif isinstance(m, ToolMessage) and m.tool_call_id in queries and isinstance(m.content, str):
+            if is_validated_result(m.content):
+                sql = queries[m.tool_call_id]
+    return sql
+
 @cl.on_message
 async def on_message(message: cl.Message):
     """
@@ -201,36 +356,57 @@ async def on_message(message: cl.Message):
     Args:
     message (cl.Message): Incoming message from the user.
     """
+    # statements still running for an earlier message are abandoned now
+    await query_canceller.acancel(cl.context.session.id)
     try:
         content = [await process_file(file) for file in message.elements or []]
         content = [item for item in content if item] + [{"type": "text", "text": message.content}]
         
-        response = await asyncio.get_event_loop().run_in_executor(
-            executor, 
-            app.invoke, 
-            {"messages": [HumanMessage(content=content)]}, 
-            RunnableConfig(callbacks=[cl.LangchainCallbackHandler()], recursion_limit=100, configurable={"thread_id": SEED})
-        )
-        
+        thread_id = cl.user_session.get("thread_id")
+        await checkpoint_store.touch(thread_id)
+        config = RunnableConfig(callbacks=[cl.LangchainCallbackHandler()], recursion_limit=100, configurable={"thread_id": thread_id})
         msg = cl.Message(content="", author=f'Chatbot: {PROVIDER.capitalize()}')
-        
+
+        # questions with attachments depend on the files, so they are not looked up or stored
+        question = message.content if not message.elements else ""
+        # a follow-up depends on the earlier turns: it may get a hint, but is neither replayed nor stored
+        first_turn = not (await app.aget_state(config)).values.get("messages")
+        with span("turn", "chat_turn", thread_id=thread_id) as turn_span, query_canceller.session(cl.context.session.id):
+            shortcut, hint, embedding = (
+                await semantic_shortcut(question, config, msg, allow_direct=first_turn) if question else ([], "", None)
+            )
+            if hint:
+                content[-1] = {"type": "text", "text": message.content + hint}
+            answer_streamed = await stream_graph([HumanMessage(content=content)] + shortcut, config, msg)
+            response = (await app.aget_state(config)).values
+            turn_span.set(messages=len(response["messages"]), semantic_cache="direct" if shortcut else "hint" if hint else None)
+
+        if question and first_turn:
+            sql = validated_sql(response["messages"])
+            if sql:
+                await asyncio.to_thread(semantic_cache.store, question, sql, embedding)
+
         if response['charts']:
             try:
-                import json
-                import plotly.graph_objs as go
-                
-                figure_dict = json.loads(response['charts'].replace("'", '"'))
-                figure_dict['layout']['template'] = figure_dict['layout'].get('template') or 'plotly'
-                msg.elements = [cl.Plotly(name="chart", figure=go.Figure(figure_dict), display="inline")]
+                import plotly.io as pio
+
+                artifact = artifact_store.get(response['charts'])
+                if artifact is None:
+                    raise ValueError(f"chart {response['charts']} is no longer available")
+                figure = pio.from_json(artifact.data.decode("utf-8"))
+                msg.elements = [cl.Plotly(name="chart", figure=figure, display="inline")]
             except Exception as e:
                 await cl.Message(content=f"Error creating chart: {str(e)}").send()
         
-        await msg.stream_token(response["messages"][-1].content)
+        # Nodes that did not stream (e.g. the error reply of call_model) still get their answer shown
+        if not answer_streamed:
+            await msg.stream_token(response["messages"][-1].content)
         await msg.send()
     
     except Exception as e:
         await cl.Message(content=f"Error: {str(e)}. Please rephrase your last message.").send()
         print(f"Error in on_message: {str(e)}")
+        await query_canceller.acancel(cl.context.session.id)
         cl.user_session.set("messages", [])
         cl.user_session.set("charts", "")
         cl.user_session.set("runnable", None)
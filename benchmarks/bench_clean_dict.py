@@ -0,0 +1,86 @@
+"""
+Benchmark for utils.quicksight_assets_class.clean_dict.
+
+Compiles synthetic QuickSight analyses of growing nesting depth and visual count
+through Analysis.compile(), and compares the single-pass pruning against the
+previous doubly-recursive implementation (only for sizes where the old one
+finishes in reasonable time).
+
+Usage:
+    python -m benchmarks.bench_clean_dict
+"""
+
+import time
+
+from utils.quicksight_assets_class import Analysis, Definition, Sheet, clean_dict
+
+# The legacy implementation becomes exponential in depth; skip it beyond this.
+LEGACY_MAX_DEPTH = 4
+
+
+def legacy_clean_dict(input):
+    if type(input) is dict:
+        return dict((key, legacy_clean_dict(value)) for key, value in input.items() if (value or value == 0) and legacy_clean_dict(value) not in [{},[],""])
+    elif type(input) is list:
+        return [legacy_clean_dict(item) for item in input if (item or item == 0) and legacy_clean_dict(item) not in [{},[],""]]
+    else:
+        if input or input == 0:
+            return input
+
+
+class SyntheticVisual():
+    def __init__(self, visual_id, depth):
+        self.visual_id = visual_id
+        self.depth = depth
+
+    def compile(self):
+        # Nested chart configuration with the usual mix of empty placeholders
+        node = {"FieldId": f"{self.visual_id}-leaf", "Value": 0, "Format": "", "Options": {}}
+        for level in range(self.depth):
+            node = {
+                "Level": level,
+                "Child": node,
+                "Siblings": [{"Label": f"L{level}", "Hidden": False}, {}, "", None],
+                "Unset": {"Title": "", "Subtitle": {}},
+            }
+        return {"BarChartVisual": {"VisualId": self.visual_id, "ChartConfiguration": node, "Actions": []}}
+
+
+def build_analysis(depth, visual_count):
+    sheet = Sheet("sheet-1", "Synthetic")
+    sheet.add_visuals([SyntheticVisual(f"visual-{i}", depth) for i in range(visual_count)])
+    definition = Definition([{"DataSetArn": "arn", "Identifier": "dataset"}])
+    definition.add_sheet(sheet)
+    analysis = Analysis("123456789012", "synthetic-analysis", "Synthetic")
+    analysis.add_definition(definition)
+    return analysis
+
+
+def time_call(func, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    print(f"{'depth':>6} {'visuals':>8} {'compile (ms)':>14} {'legacy (ms)':>12}")
+    for depth in (2, 4, 8, 16, 64, 512, 2048):
+        for visual_count in (10, 100):
+            analysis = build_analysis(depth, visual_count)
+            elapsed, compiled = time_call(analysis.compile)
+            legacy = "-"
+            if depth <= LEGACY_MAX_DEPTH:
+                legacy_elapsed, expected = time_call(legacy_clean_dict, analysis.json, repeat=1)
+                assert compiled == expected, "clean_dict output differs from legacy implementation"
+                legacy = f"{legacy_elapsed * 1000:.2f}"
+            print(f"{depth:>6} {visual_count:>8} {elapsed * 1000:>14.2f} {legacy:>12}")
+
+    # Sanity check for top-level scalars, which the old helper also accepted
+    assert clean_dict(0) == 0 and clean_dict("") is None
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,74 @@
-from utils.database import db
+import json
+import time
+from utils.database import db, query_guard, result_cache
+from utils.artifact_store import artifact_store, find_handles
+from utils.result_summary import load_result
+from utils.workload_log import workload_log
 from langchain_core.tools import tool
 
 @tool
-def execute_query(query):
+async def execute_query(query):
     """
     Tool for querying a SQL database.Execute a SQL query against the database and get back the result.
     Parameters: 
         - query: sql
         - limit: 3
     Returns:
-        - results of the query
+        - results of the query. Large results are summarized (row count, column types, null counts,
+          min/max, first rows) and the rows are kept behind an artifact://result/... handle,
+          readable with read_query_result. Queries the planner estimates as too expensive are rejected
+          with the costliest steps; add filters or aggregate earlier and retry.
 
     """
-    return db.run_no_throw(query)
+    started = time.perf_counter()
+    cached = await result_cache.aget(query)
+    # a cached summary is only useful while the rows behind its handle are still stored
+    if cached is not None and all(handle in artifact_store for handle in find_handles(cached, "result")):
+        workload_log.record(query, "cached", time.perf_counter() - started, cached)
+        return cached
+    decision = await query_guard.acheck(query)
+    if decision.action == "reject":
+        workload_log.record(query, "rejected", time.perf_counter() - started, decision.message, guard=decision.action)
+        return decision.message
+    stats = {}
+    result = await db.arun_summarized_no_throw(decision.sql, stats=stats)
+    failed = result.startswith("Error:")
+    if decision.message and not failed:
+        result = f"{decision.message}\n{result}"
+    workload_log.record(
+        query,
+        "error" if failed else "ok",
+        time.perf_counter() - started,
+        result,
+        executed_sql=decision.sql,
+        rows=stats.get("rows"),
+        guard=decision.action,
+        explain=lambda sql: db.explain(sql, analyze=True),
+    )
+    # a sampled or truncated result does not answer the statement as written
+    if decision.action == "allow":
+        await result_cache.aput(query, result)
+    return result
+
+@tool
+def read_query_result(handle, offset=0, limit=50):
+    """
+    Tool for reading rows of a large query result returned by execute_query.
+    Parameters:
+        - handle: the artifact://result/... handle from execute_query
+        - offset: index of the first row to return
+        - limit: number of rows to return (at most 200)
+    Returns:
+        - the column names and the requested rows
+    """
+    result = load_result(handle)
+    if result is None:
+        return f"Error: result {handle} is unknown or has expired, run the query again."
+    offset, limit = max(int(offset), 0), min(max(int(limit), 1), 200)
+    rows = result.slice(offset, limit).to_rows(max_string_length=300)
+    return json.dumps({"columns": result.names, "offset": offset, "rows": rows}, default=str)
 @tool
-def get_table_info(table_names):
+async def get_table_info(table_names):
     """
     Tool for getting metadata about a SQL database
     Parameters: 
@@ -23,12 +77,12 @@ def get_table_info(table_names):
         - the schema and sample rows for the specified SQL tables.
 
     """
-    return db.get_table_info_no_throw(
+    return await db.aget_table_info_no_throw(
             [t.strip() for t in table_names.split(",")]
         )
 
 @tool
-def get_table_names():
+async def get_table_names():
     """Tool for getting tables names.
     Parameters: 
     Input is an empty string, output is a comma-separated list of tables in the database.
@@ -117,6 +171,8 @@ def analyze_data_lineage(table_info):
 def design_query_plan(intent, required_metrics, table_info, proper_nouns, data_lineage):
     "Design a comprehensive query plan"
     required_tables = identify_required_tables(required_metrics, table_info, data_lineage)
+    # a summary table listed in table_info that has the needed grouping columns and measures replaces its fact tables
+    required_tables = prefer_summary_tables(required_tables, required_metrics, table_info)
     join_strategy = optimize_join_strategy(required_tables, table_info, data_lineage)
     filter_conditions = design_filter_conditions(proper_nouns, table_info)
     aggregations = design_aggregations(required_metrics, table_info)
@@ -353,6 +409,20 @@ def identify_required_tables(required_metrics, table_info, data_lineage):
     "
     pass
 
+def prefer_summary_tables(required_tables, required_metrics, table_info):
+    "
+    Replace fact tables with a summary table (bico_summary_*) listed in the table information where one fits.
+    A summary replaces its source tables only if its grouping columns cover every grouping and filter column
+    the question needs, it holds every required measure, and its 'Only rows where' filters are also filters of
+    the question; otherwise query the fact tables.
+    Measures are re-combined with the function given in the summary's notes, never re-applied as written:
+    a count becomes sum(<count column>), a sum stays sum(<sum column>), min/max stay min/max, and an
+    average is sum(<sum column>) / sum(<count column>), never avg(<average>).
+    Input: List of required table names, List of required metrics, Table information
+    Output: List of table names with the covered fact tables replaced by the summary table
+    "
+    pass
+
 def optimize_join_strategy(required_tables, table_info, data_lineage):
     "
     Develop an optimized strategy for joining the required tables.
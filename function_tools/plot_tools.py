@@ -2,6 +2,10 @@ from typing import Literal, Optional
 from langchain_core.tools import tool
 import plotly.graph_objs as go
 import json
+from utils.artifact_store import artifact_store
+from utils.result_summary import load_result
+
+PLOTLY_MEDIA_TYPE = "application/vnd.plotly.v1+json"
 
 @tool
 def plot_chart(
@@ -10,7 +14,7 @@ def plot_chart(
     x_label: str,
     y_label: str,
     plot_type: Literal["bar", "line", "scatter"] = "line",
-    save_path: Optional[str] = "./tmp.png",
+    save_path: Optional[str] = None,
     template: Literal["plotly"] = "plotly"
 ) -> str:
     """
@@ -19,16 +23,17 @@ def plot_chart(
     WARNING:This function can only be used when both the x and y axes are arrays of the same length. Elements cannot be set as a tuple.
 
     Parameters:
-    data (str): A JSON string containing 'x_values' and 'y_values' lists.
+    data (str): A JSON string containing 'x_values' and 'y_values' lists, or 'result_handle', 'x_column' and
+        'y_column' to plot two columns of a stored execute_query result without copying the values.
     plot_title (str): Title of the plot.
     x_label (str): Label for the x-axis.
     y_label (str): Label for the y-axis.
     plot_type (str, optional): Type of plot to generate. Options are "bar", "line", or "scatter". Default is "line".
-    save_path (str, optional): Path to save the plot image locally. If None, the plot image will not be saved. Default is "./tmp.png".
+    save_path (str, optional): Path to save the plot image locally. If None, the plot image will not be saved. Default is None.
     template (str, optional): Plotly template to use. Default is "plotly".
 
     Returns:
-    str: A string representation of the Plotly Figure object.
+    str: A short confirmation with the chart handle (artifact://chart/...). The chart itself is shown to the user directly.
 
     Raises:
     ValueError: If the lengths of x_values and y_values are not the same or if there's an error parsing the input.
@@ -36,16 +41,27 @@ def plot_chart(
     Example:
     data = '{"x_values": [1, 2, 3, 4, 5], "y_values": [2, 4, 1, 5, 3]}'
     plot_chart(data, "Sample Chart", "X Axis", "Y Axis", "line")
+    data = '{"result_handle": "artifact://result/3f2a9c1e0b7d", "x_column": "month", "y_column": "revenue"}'
+    plot_chart(data, "Revenue", "Month", "Revenue", "bar")
     """
     try:
         # Parse the JSON string
         data_dict = json.loads(data)
-        x_values = data_dict['x_values']
-        y_values = data_dict['y_values']
+        if 'result_handle' in data_dict:
+            # columns of a stored result are passed to plotly as arrays, not re-serialized through the LLM
+            result = load_result(data_dict['result_handle'])
+            if result is None:
+                raise ValueError(f"Result {data_dict['result_handle']} is unknown or has expired, run the query again")
+            x_values = result.column(data_dict['x_column'])
+            y_values = result.column(data_dict['y_column'])
+        else:
+            x_values = data_dict['x_values']
+            y_values = data_dict['y_values']
     except json.JSONDecodeError:
         raise ValueError("Invalid JSON string provided for 'data'")
-    except KeyError:
-        raise ValueError("The 'data' JSON must contain 'x_values' and 'y_values' keys")
+    except KeyError as e:
+        raise ValueError(f"The 'data' JSON must contain 'x_values' and 'y_values' keys, "
+                         f"or 'result_handle', 'x_column' and 'y_column': {e}")
 
     # Validate input lengths
     if len(x_values) != len(y_values):
@@ -100,8 +116,9 @@ def plot_chart(
     # Create the figure
     fig = go.Figure(data=[trace], layout=layout)
     
-    # Optionally save the figure
+    # Optionally save the figure; the chart itself is served from the artifact store
     if save_path:
         fig.write_image(save_path)
 
-    return str(fig)
\ No newline at end of file
+    handle = artifact_store.put(fig.to_json().encode("utf-8"), PLOTLY_MEDIA_TYPE, kind="chart")
+    return f"Chart '{plot_title}' created and displayed to the user. Handle: {handle}"
\ No newline at end of file
@@ -2,6 +2,7 @@
 from utils.bedrock_clients import osl_client, client
 import json
 from langchain_core.tools import tool
+from utils.tracing import span
 # Setting
 index_name = ""
 dimensions = 1024
@@ -31,7 +32,9 @@ def match_accurate_propernoun_tool(input_nouns):
       """ Accurate matching of proper nouns from 'input_nouns', return an accurate name which commonly used as filter conditions."""
       query_emb = gen_emb(input_nouns)
       search_query = {"query": {"knn": {f"{index_name}": {"vector": query_emb, "k": 1}}}}
-      results = osl_client.search(index=index_name, body=search_query)
+      with span("aws", "opensearch.search", index=index_name) as search_span:
+            results = osl_client.search(index=index_name, body=search_query)
+            search_span.set(hits=len(results["hits"]["hits"]))
       return results["hits"]["hits"][0]['_source'][f"{field_name}"]
 
 @tool
@@ -0,0 +1,96 @@
+"""
+Artifact store shared by tools and the UI layer.
+
+Tools put serialized artifacts (plotly figures, result sets, files, ...) here and
+return only a short handle such as `artifact://chart/3f2a9c1e0b7d`. The handle is
+all that travels through the LLM context; the UI (or another tool) resolves it
+with `artifact_store.get` and reads the payload directly.
+
+Payloads are kept zlib-compressed in memory, bounded by MAX_STORE_BYTES with
+least-recently-used eviction.
+"""
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+from uuid import uuid4
+
+# Artifact store setting
+MAX_STORE_BYTES = 256 * 1024 * 1024
+COMPRESSION_LEVEL = 6
+
+ARTIFACT_HANDLE_PATTERN = re.compile(r"artifact://([a-z_]+)/([0-9a-f]{12})")
+
+
+class Artifact(NamedTuple):
+    kind: str
+    media_type: str
+    data: bytes
+
+
+class ArtifactStore:
+    """
+    Thread-safe, size-bounded LRU store of compressed artifacts keyed by handle.
+    """
+
+    def __init__(self, max_bytes=MAX_STORE_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def put(self, data: bytes, media_type: str, kind: str = "artifact") -> str:
+        """
+        Store a payload and return its handle.
+
+        Args:
+        data (bytes): Serialized artifact.
+        media_type (str): MIME type of the payload, e.g. "application/vnd.plotly.v1+json".
+        kind (str): Short lowercase category used in the handle, e.g. "chart".
+
+        Returns:
+        str: Handle of the form `artifact://<kind>/<id>`.
+        """
+        handle = f"artifact://{kind}/{uuid4().hex[:12]}"
+        compressed = zlib.compress(data, COMPRESSION_LEVEL)
+        with self._lock:
+            self._items[handle] = (kind, media_type, compressed)
+            self._size += len(compressed)
+            while self._size > self.max_bytes and len(self._items) > 1:
+                _, (_, _, evicted) = self._items.popitem(last=False)
+                self._size -= len(evicted)
+        return handle
+
+    def get(self, handle: str) -> Optional[Artifact]:
+        """Return the artifact behind a handle, or None if it is unknown or was evicted."""
+        with self._lock:
+            item = self._items.get(handle)
+            if item is None:
+                return None
+            self._items.move_to_end(handle)
+        kind, media_type, compressed = item
+        return Artifact(kind, media_type, zlib.decompress(compressed))
+
+    def __contains__(self, handle: str) -> bool:
+        with self._lock:
+            return handle in self._items
+
+    def delete(self, handle: str) -> None:
+        with self._lock:
+            item = self._items.pop(handle, None)
+            if item is not None:
+                self._size -= len(item[2])
+
+
+def find_handles(text, kind: Optional[str] = None) -> List[str]:
+    """Extract artifact handles (optionally of one kind) from a message content."""
+    if not isinstance(text, str):
+        return []
+    return [
+        match.group(0) for match in ARTIFACT_HANDLE_PATTERN.finditer(text)
+        if kind is None or match.group(1) == kind
+    ]
+
+
+artifact_store = ArtifactStore()
@@ -2,9 +2,11 @@
 import boto3
 from botocore.config import Config
 from opensearchpy import OpenSearch, RequestsHttpConnection, AWSV4SignerAuth
+from utils.tracing import instrument_boto3_client
 
 
 client_qs = boto3.client('quicksight', region_name='us-west-2')
+instrument_boto3_client(client_qs)
 
 #connection
 host = '' # cluster endpoint, for example: my-test-domain.us-east-1.es.amazonaws.com
@@ -25,4 +27,5 @@ osl_client = OpenSearch(
 index_name = ""
 dimensions = 1024
 
-client = boto3.client("bedrock-runtime", region_name="us-west-2",config=Config(retries={'max_attempts': 10}))
\ No newline at end of file
+client = boto3.client("bedrock-runtime", region_name="us-west-2",config=Config(retries={'max_attempts': 10}))
+instrument_boto3_client(client)
@@ -0,0 +1,168 @@
+"""
+Durable, bounded checkpoint storage for the LangGraph workflow.
+
+Conversations are checkpointed into an on-disk SQLite database running in WAL
+mode, so they survive a process restart and concurrent sessions do not block
+each other on reads. A periodic compaction pass keeps the file bounded:
+- threads idle for longer than RETENTION_SECONDS are dropped entirely; threads
+  checkpointed before activity was tracked count as seen when the store is first opened
+- only the newest KEEP_CHECKPOINTS_PER_THREAD checkpoints of a live thread are kept
+- pending writes that no longer belong to a checkpoint are removed
+- freed pages are returned to the OS and the WAL is truncated
+"""
+import asyncio
+import time
+
+import aiosqlite
+from langgraph.checkpoint.aiosqlite import AsyncSqliteSaver
+
+# Checkpoint store setting
+CHECKPOINT_DB_PATH = "checkpoints.sqlite"
+RETENTION_SECONDS = 7 * 24 * 3600
+KEEP_CHECKPOINTS_PER_THREAD = 20
+COMPACTION_INTERVAL_SECONDS = 600
+# Negative values are KiB for SQLite's page cache, i.e. 8 MB per connection
+CACHE_SIZE_KIB = 8000
+
+
+class CheckpointStore:
+    """
+    Owns the SQLite connection behind the graph's AsyncSqliteSaver and prunes it.
+
+    Attributes:
+    saver (AsyncSqliteSaver): Checkpointer to pass to `workflow.compile`.
+    """
+
+    def __init__(self, path=CHECKPOINT_DB_PATH, retention_seconds=RETENTION_SECONDS,
+                 keep_per_thread=KEEP_CHECKPOINTS_PER_THREAD):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self.keep_per_thread = keep_per_thread
+        self.conn = aiosqlite.connect(path)
+        self.saver = AsyncSqliteSaver(conn=self.conn)
+        self._is_setup = False
+        self._setup_lock = None
+        self._compaction_task = None
+
+    async def setup(self):
+        """Open the database, apply connection pragmas and create the tables once."""
+        if self._is_setup:
+            return
+        if self._setup_lock is None:
+            self._setup_lock = asyncio.Lock()
+        async with self._setup_lock:
+            if self._is_setup:
+                return
+            if not self.conn.is_alive():
+                await self.conn
+            # auto_vacuum only takes effect before the first table is created
+            await self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await self.conn.execute("PRAGMA journal_mode = WAL")
+            await self.conn.execute("PRAGMA synchronous = NORMAL")
+            await self.conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+            await self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS thread_activity ("
+                "thread_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)"
+            )
+            await self.conn.commit()
+            await self.saver.setup()
+            # threads without an activity row would never expire
+            await self.conn.execute(
+                "INSERT OR IGNORE INTO thread_activity (thread_id, last_seen) "
+                "SELECT DISTINCT thread_id, ? FROM checkpoints",
+                (time.time(),),
+            )
+            await self.conn.commit()
+            self._is_setup = True
+
+    async def touch(self, thread_id):
+        """Record activity on a thread so that retention is measured from its last turn."""
+        await self.setup()
+        await self.conn.execute(
+            "INSERT INTO thread_activity (thread_id, last_seen) VALUES (?, ?) "
+            "ON CONFLICT(thread_id) DO UPDATE SET last_seen = excluded.last_seen",
+            (str(thread_id), time.time()),
+        )
+        await self.conn.commit()
+
+    async def compact(self):
+        """
+        Apply retention and compaction to the checkpoint tables.
+
+        Returns:
+        dict: Number of expired threads, checkpoints and writes removed.
+        """
+        await self.setup()
+        id_column, partition = await self._checkpoint_columns()
+        cutoff = time.time() - self.retention_seconds
+
+        expired = await self._execute(
+            "DELETE FROM thread_activity WHERE last_seen < ? RETURNING thread_id", (cutoff,)
+        )
+        expired_ids = [row[0] for row in expired]
+        for thread_id in expired_ids:
+            await self.conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+
+        # Keep only the newest checkpoints of every (thread, namespace)
+        cursor = await self.conn.execute(
+            f"""
+            DELETE FROM checkpoints WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, ROW_NUMBER() OVER (
+                        PARTITION BY {partition} ORDER BY {id_column} DESC
+                    ) AS rn
+                    FROM checkpoints
+                ) WHERE rn > ?
+            )
+            """,
+            (self.keep_per_thread,),
+        )
+        checkpoints_removed = cursor.rowcount
+
+        cursor = await self.conn.execute(
+            f"""
+            DELETE FROM writes WHERE NOT EXISTS (
+                SELECT 1 FROM checkpoints c
+                WHERE c.thread_id = writes.thread_id AND c.{id_column} = writes.{id_column}
+            )
+            """
+        )
+        writes_removed = cursor.rowcount
+        await self.conn.commit()
+
+        # incremental_vacuum frees one page per VM step, and sqlite3 stops a statement without
+        # result columns after its first step; executescript runs it to completion
+        await self.conn.executescript("PRAGMA incremental_vacuum;")
+        await self._execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return {
+            "threads": len(expired_ids),
+            "checkpoints": checkpoints_removed,
+            "writes": writes_removed,
+        }
+
+    def start_compaction(self, interval=COMPACTION_INTERVAL_SECONDS):
+        """Start the background compaction loop on the running event loop if it is not running yet."""
+        if self._compaction_task is None or self._compaction_task.done():
+            self._compaction_task = asyncio.get_running_loop().create_task(self._compaction_loop(interval))
+
+    async def _compaction_loop(self, interval):
+        while True:
+            try:
+                await self.compact()
+            except Exception as e:
+                print(f"Error in checkpoint compaction: {str(e)}")
+            await asyncio.sleep(interval)
+
+    async def _checkpoint_columns(self):
+        # The checkpoint id column was renamed between langgraph releases
+        columns = [row[1] for row in await self._execute("PRAGMA table_info(checkpoints)")]
+        id_column = "checkpoint_id" if "checkpoint_id" in columns else "thread_ts"
+        partition = "thread_id, checkpoint_ns" if "checkpoint_ns" in columns else "thread_id"
+        return id_column, partition
+
+    async def _execute(self, sql, parameters=()):
+        async with self.conn.execute(sql, parameters) as cursor:
+            return await cursor.fetchall()
+
+
+checkpoint_store = CheckpointStore()
@@ -0,0 +1,180 @@
+"""
+Columnar result sets.
+
+Query results are held as one array per column instead of one dict per row:
+- numeric and boolean columns without nulls become NumPy arrays; other columns
+  are object arrays (plain lists when NumPy is not installed)
+- truncation and formatting run column by column and skip non-string columns
+- `to_bytes` serializes to the Arrow IPC stream format when pyarrow is installed
+  (JSON otherwise); `from_bytes` maps primitive Arrow columns onto NumPy without
+  copying, so tools such as `plot_chart` read a stored result directly
+
+NumPy and pyarrow are optional.
+"""
+import json
+from decimal import Decimal
+from typing import Any, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Columnar setting
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+JSON_MEDIA_TYPE = "application/json"
+
+
+def to_array(values: Sequence[Any]):
+    """Convert a column to the most compact array NumPy can hold without changing its values."""
+    if np is None:
+        return list(values)
+    types = set(map(type, values))
+    if types == {int}:
+        try:
+            return np.asarray(values, dtype=np.int64)
+        except OverflowError:
+            pass
+    elif types == {float} or types == {int, float}:
+        return np.asarray(values, dtype=np.float64)
+    elif types == {bool}:
+        return np.asarray(values, dtype=bool)
+    array = np.empty(len(values), dtype=object)
+    array[:] = list(values)
+    return array
+
+
+def _to_list(column) -> list:
+    # tolist() turns NumPy scalars back into Python ones, so str() output matches `run`
+    return column.tolist() if hasattr(column, "tolist") else list(column)
+
+
+def truncate_values(values: list, length: int, suffix: str = "...") -> list:
+    """`truncate_word` over a whole column; only strings longer than `length` are rebuilt."""
+    if length <= 0:
+        return values
+    out = values
+    for i, value in enumerate(values):
+        if isinstance(value, str) and len(value) > length:
+            if out is values:
+                out = list(values)
+            out[i] = value[: length - len(suffix)].rsplit(" ", 1)[0] + suffix
+    return out
+
+
+class ColumnarResult:
+    """
+    Result set stored column-wise.
+
+    Attributes:
+    names (List[str]): Column names.
+    columns (list): One array (or list) per column, all of the same length.
+    row_count (int): Rows in the full result, which may exceed the rows held.
+    complete (bool): False when reading stopped at a scan limit.
+    """
+
+    def __init__(self, names: Sequence[str], columns: Sequence[Any],
+                 row_count: Optional[int] = None, complete: bool = True):
+        self.names = list(names)
+        self.columns = list(columns)
+        self.row_count = len(self) if row_count is None else row_count
+        self.complete = complete
+
+    def __len__(self) -> int:
+        return len(self.columns[0]) if self.columns else 0
+
+    def column(self, name: str):
+        """Return a column by name, as stored (no copy)."""
+        try:
+            return self.columns[self.names.index(name)]
+        except ValueError:
+            raise KeyError(f"Column {name} not in result, available columns: {', '.join(self.names)}")
+
+    def slice(self, offset: int, limit: int) -> "ColumnarResult":
+        """Rows [offset, offset + limit); NumPy columns are sliced as views."""
+        columns = [column[offset:offset + limit] for column in self.columns]
+        return ColumnarResult(self.names, columns, self.row_count, self.complete)
+
+    def to_rows(self, max_string_length: int = 0) -> List[Tuple[Any, ...]]:
+        """Rows as tuples of Python values, with long strings truncated column by column."""
+        columns = [_to_list(column) for column in self.columns]
+        if max_string_length > 0:
+            columns = [
+                column if is_numeric(array) else truncate_values(column, max_string_length)
+                for column, array in zip(columns, self.columns)
+            ]
+        return list(zip(*columns))
+
+    def to_bytes(self) -> Tuple[bytes, str]:
+        """
+        Serialize the result.
+
+        Returns:
+        Tuple[bytes, str]: Payload and its media type (Arrow IPC stream if possible, JSON otherwise).
+        """
+        metadata = {"row_count": str(self.row_count), "complete": str(int(self.complete))}
+        if pa is not None:
+            try:
+                table = pa.table(
+                    [pa.array(column) for column in self.columns], names=self.names, metadata=metadata
+                )
+                sink = pa.BufferOutputStream()
+                with pa.ipc.new_stream(sink, table.schema) as writer:
+                    writer.write_table(table)
+                return sink.getvalue().to_pybytes(), ARROW_MEDIA_TYPE
+            except (pa.ArrowException, TypeError, ValueError):
+                # mixed-type object columns; fall back to JSON
+                pass
+        payload = {
+            "columns": self.names,
+            "data": [_to_list(column) for column in self.columns],
+            "row_count": self.row_count,
+            "complete": self.complete,
+        }
+        return json.dumps(payload, default=_json_default).encode("utf-8"), JSON_MEDIA_TYPE
+
+    @classmethod
+    def from_bytes(cls, data: bytes, media_type: str) -> "ColumnarResult":
+        if media_type == ARROW_MEDIA_TYPE:
+            if pa is None:
+                raise ImportError(
+                    "pyarrow package not found, please install with `pip install pyarrow`"
+                )
+            table = pa.ipc.open_stream(pa.py_buffer(data)).read_all()
+            columns = [_from_arrow(table.column(i).combine_chunks()) for i in range(table.num_columns)]
+            metadata = table.schema.metadata or {}
+            return cls(
+                table.column_names,
+                columns,
+                int(metadata.get(b"row_count", len(table))),
+                metadata.get(b"complete", b"1") == b"1",
+            )
+        payload = json.loads(data)
+        return cls(
+            payload["columns"],
+            [to_array(column) for column in payload["data"]],
+            payload["row_count"],
+            payload["complete"],
+        )
+
+
+def _json_default(value):
+    # keep numerics plottable; dates and other values become strings
+    return float(value) if isinstance(value, Decimal) else str(value)
+
+
+def is_numeric(column) -> bool:
+    return np is not None and isinstance(column, np.ndarray) and column.dtype != object
+
+
+def _from_arrow(array):
+    if np is not None and array.null_count == 0 and (
+        pa.types.is_integer(array.type) or pa.types.is_floating(array.type)
+    ):
+        return array.to_numpy(zero_copy_only=True)
+    return to_array(array.to_pylist())
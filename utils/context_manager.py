@@ -0,0 +1,135 @@
+"""
+Token-budgeted conversation history for the agent node.
+
+`build_context` turns the full checkpointed message list into the list that is
+actually sent to the model:
+- the most recent KEEP_RECENT_TURNS turns are kept verbatim
+- in older turns, bulky tool outputs (table DDL, query results, ...) are replaced
+  by a short summary, and uploaded images/documents by a placeholder, while the
+  ToolMessage itself and its tool_call_id stay in place so tool_use/tool_result
+  pairs remain valid
+- if the history is still over budget, the oldest whole turns are dropped, so a
+  tool call is never separated from its result
+
+A turn starts at a HumanMessage and runs up to the next one.
+"""
+import json
+from typing import List, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+# Context budget setting
+MAX_CONTEXT_TOKENS = 60000
+KEEP_RECENT_TURNS = 2
+# Older tool outputs above this size are summarised
+TOOL_OUTPUT_SUMMARY_TOKENS = 300
+SUMMARY_PREVIEW_CHARS = 400
+# Rough cost of one attached image in Claude 3 input tokens
+IMAGE_TOKENS = 1600
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of model tokens in a piece of text."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def count_message_tokens(message: BaseMessage) -> int:
+    """
+    Approximate the number of input tokens a message costs, including tool call arguments.
+    """
+    content = message.content
+    if isinstance(content, str):
+        tokens = estimate_tokens(content)
+    else:
+        tokens = 0
+        for block in content:
+            if isinstance(block, str):
+                tokens += estimate_tokens(block)
+            elif block.get("type") == "image":
+                tokens += IMAGE_TOKENS
+            elif block.get("type") == "document":
+                # base64 inflates the payload by 4/3
+                tokens += estimate_tokens(block.get("source", {}).get("data", "")) * 3 // 4
+            else:
+                tokens += estimate_tokens(block.get("text") or json.dumps(block, default=str))
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        tokens += estimate_tokens(json.dumps(tool_call.get("args", {}), default=str))
+    return tokens
+
+
+def split_turns(messages: Sequence[BaseMessage]) -> List[List[BaseMessage]]:
+    """Group messages into turns, each starting at a HumanMessage."""
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def compact_message(message: BaseMessage) -> BaseMessage:
+    """
+    Return a cheaper stand-in for a message from an older turn.
+
+    Tool outputs keep their ToolMessage (and tool_call_id) but the content becomes a
+    summary; attachments in human messages become text placeholders.
+    """
+    if isinstance(message, ToolMessage):
+        content = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+        tokens = estimate_tokens(content)
+        if tokens <= TOOL_OUTPUT_SUMMARY_TOKENS:
+            return message
+        summary = (
+            f"[Earlier output of {message.name or 'tool'} elided: about {tokens} tokens. "
+            f"Call the tool again if the full result is needed. Preview:]\n"
+            f"{content[:SUMMARY_PREVIEW_CHARS]}..."
+        )
+        return message.copy(update={"content": summary})
+    if isinstance(message, HumanMessage) and not isinstance(message.content, str):
+        blocks = []
+        for block in message.content:
+            if isinstance(block, dict) and block.get("type") in ("image", "document"):
+                name = block.get("name") or block.get("source", {}).get("media_type", block["type"])
+                blocks.append({"type": "text", "text": f"[{block['type']} {name} attached earlier]"})
+            else:
+                blocks.append(block)
+        return message.copy(update={"content": blocks})
+    return message
+
+
+def build_context(
+    messages: Sequence[BaseMessage],
+    max_tokens: int = MAX_CONTEXT_TOKENS,
+    keep_recent_turns: int = KEEP_RECENT_TURNS,
+    reserved_tokens: int = 0,
+) -> List[BaseMessage]:
+    """
+    Select and compact the history to send to the model within a token budget.
+
+    Args:
+    messages (Sequence[BaseMessage]): Full conversation history from the graph state.
+    max_tokens (int): Total input token budget.
+    keep_recent_turns (int): Number of latest turns that are never compacted.
+    reserved_tokens (int): Budget already spent on the static prefix (system prompt, tool schemas).
+
+    Returns:
+    List[BaseMessage]: Messages to pass to the model, in order.
+    """
+    system = [m for m in messages if isinstance(m, SystemMessage)]
+    turns = split_turns([m for m in messages if not isinstance(m, SystemMessage)])
+
+    recent = turns[-keep_recent_turns:] if keep_recent_turns > 0 else []
+    older = [[compact_message(m) for m in turn] for turn in turns[:len(turns) - len(recent)]]
+    turns = older + recent
+
+    budget = max_tokens - reserved_tokens - sum(count_message_tokens(m) for m in system)
+    turn_tokens = [sum(count_message_tokens(m) for m in turn) for turn in turns]
+    total = sum(turn_tokens)
+    # Drop the oldest turns first, but always keep the current one
+    start = 0
+    while total > budget and start < len(turns) - 1:
+        total -= turn_tokens[start]
+        start += 1
+
+    return system + [m for turn in turns[start:] for m in turn]
@@ -1,6 +1,13 @@
-
 #database setting
-from langchain_community.utilities import SQLDatabase
+from utils.sql_database import SQLDatabase
+from utils.schema_cache import SchemaCache
+from utils.result_cache import QueryResultCache
+from utils.query_guard import QueryGuard
+from utils.summary_tables import SummaryTableManager
+from utils.db_config import pool_status
+from utils.db_routing import EndpointRouter
+from utils.query_cancellation import query_canceller
+from utils.tracing import instrument_sqlalchemy_engine, tracer
 ENDPOINT=""
 PORT=""
 USER=""
@@ -8,5 +15,61 @@ REGION=""
 DBNAME="" 
 PASSWORD=""
 
-CONNECTION_STRING = f"postgresql+psycopg2://{USER}:{PASSWORD}@{ENDPOINT}:{PORT}/{DBNAME}?sslmode=require"
-db = SQLDatabase.from_uri(CONNECTION_STRING)
+# Endpoint setting: leave a replica empty to route its traffic to the primary
+CATALOG_REPLICA_ENDPOINT = ""
+REPORTING_REPLICA_ENDPOINT = ""
+
+
+def connection_string(endpoint):
+    return f"postgresql+psycopg2://{USER}:{PASSWORD}@{endpoint}:{PORT}/{DBNAME}?sslmode=require"
+
+
+CONNECTION_STRING = connection_string(ENDPOINT)
+ENDPOINTS = {
+    "primary": CONNECTION_STRING,
+    "catalog_replica": connection_string(CATALOG_REPLICA_ENDPOINT) if CATALOG_REPLICA_ENDPOINT else "",
+    "reporting_replica": connection_string(REPORTING_REPLICA_ENDPOINT) if REPORTING_REPLICA_ENDPOINT else "",
+}
+# Role -> endpoints in order of preference, see utils/db_config.py for role pools and timeouts
+ROUTES = {
+    "metadata": ["catalog_replica", "primary"],
+    "analytics": ["reporting_replica", "primary"],
+    # table statistics (result cache versions) are not replicated
+    "writer": ["primary"],
+}
+# Session parameters applied once per pooled connection, e.g. {"TimeZone": "UTC"}
+SESSION_SETTINGS = {}
+router = EndpointRouter(ENDPOINTS, ROUTES)
+# abandoned statements are cancelled through the endpoint's control engine; tracked before
+# any pool opens a connection, so every backend PID is known
+for endpoint, engine in router.endpoint_engines():
+    query_canceller.track(engine, router.control_engine(endpoint))
+router.start_health_checks()
+# Tables are reflected on first use; warm restarts are served from the schema cache
+db = SQLDatabase(
+    router.engine("analytics"),
+    metadata_engine=router.engine("metadata"),
+    engine_router=router,
+    session_settings=SESSION_SETTINGS,
+    schema_cache=SchemaCache(),
+    lazy_table_reflection=True,
+)
+# Results of repeated read-only queries, invalidated when a referenced table changes; versions are
+# read on the primary, so results are only stored while the analytics endpoint is not lagging
+result_cache = QueryResultCache(
+    router.engine("writer"),
+    async_engine=router.async_engine("writer"),
+    source_lag=lambda: router.lag_seconds("analytics"),
+)
+# EXPLAIN-based pre-flight check of model-written SQL
+query_guard = QueryGuard(db)
+# Pre-aggregates of repeated aggregate queries, rebuilt on the primary when their source tables change
+summary_tables = SummaryTableManager(db, router.engine("writer"), table_versions=result_cache.table_versions)
+summary_tables.start_refresher()
+for engine in router.engines().values():
+    instrument_sqlalchemy_engine(engine)
+tracer.register_gauge_source("db_pool", lambda: pool_status(router.engines()))
+tracer.register_gauge_source("db_endpoint", router.status)
+tracer.register_gauge_source("result_cache", result_cache.snapshot)
+tracer.register_gauge_source("query_cancellation", query_canceller.snapshot)
+tracer.register_gauge_source("summary_tables", summary_tables.snapshot)
@@ -0,0 +1,185 @@
+"""
+Engine configuration for the PostgreSQL connections used by the agent.
+
+Connections are split by workload role, each with its own pool:
+- "analytics": ad-hoc SQL written by the agent (`execute_query`)
+- "metadata": catalog lookups, sample rows and comments for `get_table_info`
+- "writer": writes and primary-only reads (upload ingestion, table statistics)
+
+Every pool pre-pings connections on checkout and recycles them periodically.
+The server-side `statement_timeout` and `idle_in_transaction_session_timeout`
+are set once per connection through libpq startup options, so a runaway query
+or a forgotten transaction cannot hold a connection for minutes. Timeouts are
+per role.
+
+`create_async_role_engine` builds the asyncpg counterpart of a role engine for
+the async tool path; asyncpg takes the same settings as `server_settings`.
+
+`install_session_setup` applies session parameters (search_path, TimeZone, ...)
+to a pooled connection when it is checked out, and only if the connection does
+not already carry them, instead of issuing a SET before every statement.
+"""
+import re
+from typing import Dict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+
+# Pool setting
+POOL_SETTINGS = {
+    "pool_timeout": 30,
+    "pool_recycle": 1800,
+    "pool_pre_ping": True,
+    "pool_use_lifo": True,
+}
+ROLE_SETTINGS = {
+    "analytics": {
+        "pool_size": 8,
+        "max_overflow": 8,
+        "statement_timeout_ms": 120000,
+        "idle_in_transaction_session_timeout_ms": 60000,
+    },
+    "metadata": {
+        "pool_size": 4,
+        "max_overflow": 4,
+        "statement_timeout_ms": 15000,
+        "idle_in_transaction_session_timeout_ms": 15000,
+    },
+    "writer": {
+        "pool_size": 2,
+        "max_overflow": 2,
+        "statement_timeout_ms": 300000,
+        "idle_in_transaction_session_timeout_ms": 60000,
+    },
+}
+
+
+def create_role_engine(database_uri: str, role: str, **engine_args) -> Engine:
+    """
+    Create a pooled engine whose sessions carry the timeouts of a workload role.
+
+    Args:
+    database_uri (str): SQLAlchemy URI of the PostgreSQL endpoint.
+    role (str): Key of ROLE_SETTINGS.
+    engine_args: Overrides for `create_engine`.
+
+    Returns:
+    Engine: Engine with its own connection pool.
+    """
+    settings = ROLE_SETTINGS[role]
+    options = (
+        f"-c statement_timeout={settings['statement_timeout_ms']} "
+        f"-c idle_in_transaction_session_timeout={settings['idle_in_transaction_session_timeout_ms']}"
+    )
+    args = {
+        **POOL_SETTINGS,
+        "pool_size": settings["pool_size"],
+        "max_overflow": settings["max_overflow"],
+        "connect_args": {
+            "options": options,
+            "application_name": f"bico-{role}",
+            "keepalives": 1,
+            "keepalives_idle": 60,
+        },
+    }
+    args.update(engine_args)
+    return create_engine(database_uri, **args)
+
+
+def create_async_role_engine(database_uri: str, role: str, **engine_args):
+    """
+    Create the asyncpg-backed AsyncEngine of a workload role.
+
+    Args:
+    database_uri (str): SQLAlchemy URI of the PostgreSQL endpoint, any driver.
+    role (str): Key of ROLE_SETTINGS.
+    engine_args: Overrides for `create_async_engine`.
+
+    Returns:
+    AsyncEngine: Engine with its own connection pool.
+
+    Raises:
+    ImportError: If asyncpg is not installed.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    settings = ROLE_SETTINGS[role]
+    url = make_url(database_uri).set(drivername="postgresql+asyncpg")
+    connect_args = {
+        "server_settings": {
+            "statement_timeout": str(settings["statement_timeout_ms"]),
+            "idle_in_transaction_session_timeout": str(settings["idle_in_transaction_session_timeout_ms"]),
+            "application_name": f"bico-{role}-async",
+        },
+    }
+    # libpq's sslmode is not an asyncpg argument
+    sslmode = url.query.get("sslmode")
+    if sslmode:
+        url = url.difference_update_query(["sslmode"])
+        connect_args["ssl"] = sslmode
+    args = {
+        **POOL_SETTINGS,
+        "pool_size": settings["pool_size"],
+        "max_overflow": settings["max_overflow"],
+        "connect_args": connect_args,
+    }
+    args.update(engine_args)
+    return create_async_engine(url, **args)
+
+
+def pool_status(engines: Dict[str, Engine]) -> dict:
+    """
+    Report pool usage per role; `saturation` is checked-out connections over the pool's capacity.
+    """
+    status = {}
+    for role, engine in engines.items():
+        pool = engine.pool
+        if not hasattr(pool, "checkedout"):
+            continue
+        capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+        status[role] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "saturation": pool.checkedout() / capacity if capacity else 0.0,
+        }
+    return status
+
+
+def _set_statement(name: str, value: str) -> str:
+    if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_.]*", name):
+        raise ValueError(f"Invalid session parameter name: {name}")
+    if name.lower() == "search_path":
+        schemas = [part.strip() for part in str(value).split(",") if part.strip()]
+        return "SET search_path TO " + ", ".join('"' + schema.replace('"', '""') + '"' for schema in schemas)
+    return f"SET {name} TO '" + str(value).replace("'", "''") + "'"
+
+
+def install_session_setup(engine: Engine, settings: Dict[str, str]) -> None:
+    """
+    Apply PostgreSQL session parameters once per pooled connection.
+
+    The parameters are set and committed when a connection is checked out whose
+    recorded settings differ from `settings`; later checkouts of the same
+    connection skip it. `settings` is read at every checkout, so updating the
+    dict in place reconfigures connections lazily.
+
+    Args:
+    engine (Engine): Engine whose pool is configured (use `sync_engine` of an AsyncEngine).
+    settings (Dict[str, str]): Parameter name -> value, e.g. {"search_path": "sales", "TimeZone": "UTC"}.
+    """
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        desired = (id(dbapi_connection), tuple(sorted(settings.items())))
+        if connection_record.info.get("bico_session") == desired:
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in settings.items():
+                cursor.execute(_set_statement(name, value))
+        finally:
+            cursor.close()
+        # session-level SETs are undone if the surrounding transaction rolls back
+        dbapi_connection.commit()
+        connection_record.info["bico_session"] = desired
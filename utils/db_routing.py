@@ -0,0 +1,202 @@
+"""
+Endpoint routing with health-based failover for the PostgreSQL pools.
+
+Each workload role (see ROLE_SETTINGS in utils/db_config.py) has a route: an
+ordered list of endpoints, e.g. catalog lookups on a low-latency replica and
+ad-hoc analytics on a reporting replica, both falling back to the primary.
+- every (role, endpoint) pair has its own pool, with the role's sizes and timeouts
+- a role is served by the first healthy endpoint of its route
+- a daemon thread checks every endpoint every HEALTH_CHECK_INTERVAL_SECONDS over
+  a dedicated unpooled connection; a replica more than MAX_REPLICA_LAG_SECONDS
+  behind counts as unhealthy
+- a disconnect seen by any pool marks its endpoint down at once; the next
+  successful check brings it back
+
+If every endpoint of a route is down, the last one (normally the primary) is
+used anyway, so errors surface from the database rather than from the router.
+"""
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+
+from utils.db_config import create_async_role_engine, create_role_engine
+
+# Routing setting
+HEALTH_CHECK_INTERVAL_SECONDS = 10
+HEALTH_CHECK_TIMEOUT_SECONDS = 3
+FAILURES_BEFORE_DOWN = 2
+MAX_REPLICA_LAG_SECONDS = 30
+
+# 0 on a primary or a replica that has replayed everything it received
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END AS lag_seconds
+""")
+
+
+class EndpointHealth:
+    def __init__(self, name: str):
+        self.name = name
+        self.healthy = True
+        self.failures = 0
+        self.lag_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+
+
+class EndpointRouter:
+    """
+    Resolves a workload role to the pool of its first healthy endpoint.
+
+    Attributes:
+    endpoints (Dict[str, str]): Endpoint name -> SQLAlchemy URI.
+    routes (Dict[str, List[str]]): Role -> endpoint names in order of preference.
+    """
+
+    def __init__(self, endpoints: Dict[str, str], routes: Dict[str, List[str]]):
+        # endpoints without a URI are not configured
+        self.endpoints = {name: uri for name, uri in endpoints.items() if uri}
+        self.routes = {role: [name for name in names if name in self.endpoints] for role, names in routes.items()}
+        for role, names in self.routes.items():
+            if not names:
+                raise ValueError(f"No configured endpoint for role {role}")
+        self.health = {name: EndpointHealth(name) for name in self.endpoints}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._engines: Dict[tuple, Engine] = {}
+        self._async_engines: Dict[tuple, object] = {}
+        for role, names in self.routes.items():
+            for name in names:
+                engine = create_role_engine(self.endpoints[name], role)
+                self._watch(engine, name)
+                self._engines[(role, name)] = engine
+                try:
+                    async_engine = create_async_role_engine(self.endpoints[name], role)
+                except ImportError:
+                    continue
+                self._watch(async_engine.sync_engine, name)
+                self._async_engines[(role, name)] = async_engine
+        self._probes = {
+            name: create_engine(
+                uri,
+                poolclass=NullPool,
+                connect_args={
+                    "connect_timeout": HEALTH_CHECK_TIMEOUT_SECONDS,
+                    "options": f"-c statement_timeout={HEALTH_CHECK_TIMEOUT_SECONDS * 1000}",
+                    "application_name": "bico-health",
+                },
+            )
+            for name, uri in self.endpoints.items()
+        }
+
+    def endpoint(self, role: str) -> str:
+        """Name of the endpoint currently serving a role."""
+        names = self.routes[role]
+        with self._lock:
+            for name in names:
+                if self.health[name].healthy:
+                    return name
+        return names[-1]
+
+    def lag_seconds(self, role: str) -> Optional[float]:
+        """Replication lag of the endpoint serving a role at its last check; None before the first check."""
+        name = self.endpoint(role)
+        with self._lock:
+            return self.health[name].lag_seconds
+
+    def engine(self, role: str) -> Engine:
+        return self._engines[(role, self.endpoint(role))]
+
+    def async_engine(self, role: str):
+        """AsyncEngine of the role's current endpoint, or None without asyncpg."""
+        return self._async_engines.get((role, self.endpoint(role)))
+
+    def engines(self) -> Dict[str, Engine]:
+        """Every pool, keyed `<role>_<endpoint>` (`_async` suffix for asyncpg pools), for pool_status."""
+        engines = {f"{role}_{name}": engine for (role, name), engine in self._engines.items()}
+        engines.update(
+            {f"{role}_{name}_async": engine.sync_engine for (role, name), engine in self._async_engines.items()}
+        )
+        return engines
+
+    def endpoint_engines(self) -> List[tuple]:
+        """(endpoint name, engine) of every pool, with the sync_engine of asyncpg pools."""
+        pairs = [(name, engine) for (_, name), engine in self._engines.items()]
+        pairs += [(name, engine.sync_engine) for (_, name), engine in self._async_engines.items()]
+        return pairs
+
+    def control_engine(self, name: str) -> Engine:
+        """Unpooled engine on an endpoint for out-of-band statements such as pg_cancel_backend."""
+        return self._probes[name]
+
+    def mark_down(self, name: str, error: str) -> None:
+        with self._lock:
+            health = self.health[name]
+            if health.healthy:
+                print(f"Error on database endpoint {name}, routing around it: {error}")
+            health.healthy = False
+            health.failures = max(health.failures, FAILURES_BEFORE_DOWN)
+            health.last_error = error
+
+    def check(self) -> None:
+        """Check every endpoint once."""
+        for name, probe in self._probes.items():
+            lag, error = None, None
+            try:
+                with probe.connect() as connection:
+                    lag = float(connection.execute(REPLICA_LAG_QUERY).scalar() or 0)
+            except Exception as e:
+                error = str(e)
+            with self._lock:
+                health = self.health[name]
+                health.checked_at = time.time()
+                health.lag_seconds = lag
+                if error is None and lag <= MAX_REPLICA_LAG_SECONDS:
+                    health.failures = 0
+                    health.healthy = True
+                    health.last_error = None
+                    continue
+                health.failures += 1
+                health.last_error = error or f"replica lag {lag:.0f}s"
+                if health.failures >= FAILURES_BEFORE_DOWN:
+                    health.healthy = False
+
+    def start_health_checks(self) -> None:
+        """Check endpoints periodically on a daemon thread; later calls are no-ops."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run_health_checks, name="db-health", daemon=True)
+        self._thread.start()
+
+    def _run_health_checks(self) -> None:
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Error checking database endpoints: {str(e)}")
+            time.sleep(HEALTH_CHECK_INTERVAL_SECONDS)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "healthy": int(health.healthy),
+                    "failures": health.failures,
+                    "lag_seconds": health.lag_seconds if health.lag_seconds is not None else -1,
+                }
+                for name, health in self.health.items()
+            }
+
+    def _watch(self, engine: Engine, name: str) -> None:
+        @event.listens_for(engine, "handle_error")
+        def _handle_error(exception_context):
+            if exception_context.is_disconnect:
+                self.mark_down(name, str(exception_context.original_exception))
@@ -0,0 +1,89 @@
+"""
+Background writer for append-only JSON lines files.
+
+`write` only puts the record on a queue, so callers on the event loop never
+touch the file. A daemon thread drains the queue in batches, appends them with
+one open/write per batch and, when `max_bytes` is set, rotates the file to
+`<path>.1` ... `<path>.<backups>` once it grows past that size.
+"""
+import json
+import os
+import queue
+import threading
+from typing import Optional
+
+# JSON lines writer setting
+WRITE_BATCH_SIZE = 500
+MAX_QUEUED_RECORDS = 100000
+
+
+class JsonLinesWriter:
+    """
+    Appends records to a JSON lines file on a daemon thread.
+
+    Attributes:
+    path (str): File appended to.
+    max_bytes (Optional[int]): Size after which the file is rotated; None never rotates.
+    backups (int): Rotated files kept.
+    """
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None, backups: int = 3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self._queue: "queue.Queue[str]" = queue.Queue(maxsize=MAX_QUEUED_RECORDS)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def write(self, record: dict) -> None:
+        """Queue a record; records are dropped (and counted) while the queue is full."""
+        self._start()
+        try:
+            self._queue.put_nowait(json.dumps(record, default=str))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self) -> None:
+        """Wait until every queued record is written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def _start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"jsonl-{os.path.basename(self.path)}", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            lines = [self._queue.get()]
+            while len(lines) < WRITE_BATCH_SIZE:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._rotate()
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+            except OSError as e:
+                print(f"Error writing {self.path}: {str(e)}")
+            finally:
+                for _ in lines:
+                    self._queue.task_done()
+
+    def _rotate(self) -> None:
+        if self.max_bytes is None:
+            return
+        try:
+            if os.path.getsize(self.path) < self.max_bytes:
+                return
+        except OSError:
+            return
+        for i in range(self.backups, 0, -1):
+            source = f"{self.path}.{i - 1}" if i > 1 else self.path
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i}")
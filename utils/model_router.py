@@ -0,0 +1,151 @@
+"""
+Tiered model routing for the agent node.
+
+Most agent steps are orchestration, e.g. deciding to call `get_table_names` or
+`get_sql_design_guidance`. Those go to a small, fast Bedrock model. Steps that
+synthesize SQL or QuickSight definitions go to the large model.
+
+The tier of a step is decided from the conversation state by ROUTING_POLICY:
+- "first_step": tier for the first step after a user message
+- "after_tools": tier for a step following results of the given tools; if several
+  tools ran, the largest of their tiers wins
+- "default": everything else
+If the fast model nevertheless answers with a call to one of HEAVY_TOOLS (it
+wrote SQL or a chart definition itself), the step is escalated and re-run on the
+large model.
+
+Each run is tagged `model_tier:<tier>`. A streaming consumer should hold back the
+tokens of runs on a tier that can still be escalated until the run ends, and
+drop them if `ModelRouter.escalates` says the response is replaced.
+
+Which tier served each step, and how often a step was escalated, is counted in
+`routing_metrics`.
+"""
+import threading
+from typing import Dict, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+
+# Model routing setting
+MODEL_TIERS = {
+    "fast": {
+        "model_id": "anthropic.claude-3-haiku-20240307-v1:0",
+        "model_kwargs": {"temperature": 0.3, "max_tokens": 4096, "top_p": 0.85},
+    },
+    "large": {
+        "model_id": "anthropic.claude-3-sonnet-20240229-v1:0",
+        "model_kwargs": {"temperature": 0.55, "max_tokens": 200000, "top_p": 0.85},
+    },
+}
+TIER_ORDER = ["fast", "large"]
+ROUTING_POLICY = {
+    "first_step": "fast",
+    "after_tools": {
+        "get_table_names": "fast",
+        "get_all_datasets_from_quicksight": "large",
+        "get_sql_design_guidance": "large",
+        "get_table_info": "large",
+        "match_accurate_propernoun_tool": "large",
+        "execute_query": "large",
+        "get_analysis_info": "large",
+        "create_or_select_quicksight_builder_with_analysis": "large",
+        "create_or_select_sheet": "large",
+        "create_or_operate_charts": "large",
+        "create_or_operate_filter_and_control": "large",
+        "build_compile": "fast",
+        "plot_chart": "fast",
+    },
+    "default": "large",
+}
+TIER_TAG_PREFIX = "model_tier:"
+# Tool calls whose arguments need the large model
+HEAVY_TOOLS = {
+    "execute_query",
+    "plot_chart",
+    "create_or_select_quicksight_builder_with_analysis",
+    "create_or_operate_charts",
+    "create_or_operate_filter_and_control",
+}
+
+
+class RoutingMetrics:
+    """
+    Process-wide counters of agent steps served per tier and of escalations.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.steps = {tier: 0 for tier in TIER_ORDER}
+        self.escalations = 0
+
+    def record(self, tier: str, escalated: bool = False) -> None:
+        with self._lock:
+            self.steps[tier] = self.steps.get(tier, 0) + 1
+            self.escalations += int(escalated)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"steps": dict(self.steps), "escalations": self.escalations}
+
+
+routing_metrics = RoutingMetrics()
+
+
+def tier_from_tags(tags: Sequence[str]) -> Optional[str]:
+    """Tier of a run from its tags, see `ModelRouter.ainvoke`."""
+    for tag in tags or []:
+        if tag.startswith(TIER_TAG_PREFIX):
+            return tag[len(TIER_TAG_PREFIX):]
+    return None
+
+
+class ModelRouter:
+    """
+    Routes each agent step to the runnable of the tier chosen by the policy.
+
+    Attributes:
+    runnables (Dict[str, Runnable]): Prompt | model pipeline per tier.
+    policy (dict): Routing policy, see ROUTING_POLICY.
+    """
+
+    def __init__(self, runnables: Dict[str, object], policy: dict = ROUTING_POLICY,
+                 heavy_tools=HEAVY_TOOLS):
+        self.runnables = runnables
+        self.policy = policy
+        self.heavy_tools = set(heavy_tools)
+
+    def select_tier(self, messages: Sequence[BaseMessage]) -> str:
+        """Choose the tier for the next step from the trailing messages."""
+        if not messages or isinstance(messages[-1], HumanMessage):
+            return self.policy.get("first_step", self.policy["default"])
+        tool_names = []
+        for m in messages[::-1]:
+            if not isinstance(m, ToolMessage):
+                break
+            tool_names.append(m.name)
+        if not tool_names:
+            return self.policy["default"]
+        after_tools = self.policy.get("after_tools", {})
+        tiers = [after_tools.get(name, self.policy["default"]) for name in tool_names]
+        return max(tiers, key=TIER_ORDER.index)
+
+    def escalates(self, tier: str, response) -> bool:
+        """Whether a response of `tier` is discarded and the step re-run on the large model."""
+        return tier != TIER_ORDER[-1] and any(call["name"] in self.heavy_tools for call in response.tool_calls or [])
+
+    async def ainvoke(self, messages: Sequence[BaseMessage]):
+        """
+        Run the step on the selected tier, escalating fast-tier responses that call heavy tools.
+
+        Returns:
+        AIMessage: The model response; `response_metadata["model_tier"]` names the tier that served it.
+        """
+        tier = self.select_tier(messages)
+        response = await self.runnables[tier].ainvoke(messages, {"tags": [f"{TIER_TAG_PREFIX}{tier}"]})
+        escalated = False
+        if self.escalates(tier, response):
+            tier, escalated = TIER_ORDER[-1], True
+            response = await self.runnables[tier].ainvoke(messages, {"tags": [f"{TIER_TAG_PREFIX}{tier}"]})
+        routing_metrics.record(tier, escalated)
+        response.response_metadata["model_tier"] = tier
+        return response
@@ -0,0 +1,81 @@
+"""
+Bedrock prompt caching for the static prefix of every agent step.
+
+The system prompt and the bound tool schemas are identical on every call. A
+cache breakpoint on the system prompt covers both, because Claude caches the
+prefix in the order tools -> system -> messages. Later steps then read that
+prefix from the cache instead of paying for it again.
+
+Caching is only requested for models that support it on Bedrock. Hits and
+misses are counted from the usage data returned with each response.
+"""
+import threading
+
+from langchain_core.messages import SystemMessage
+
+# Prompt caching setting
+PROMPT_CACHE_MODELS = (
+    "anthropic.claude-3-5-haiku",
+    "anthropic.claude-3-7-sonnet",
+    "anthropic.claude-sonnet-4",
+    "anthropic.claude-opus-4",
+)
+
+
+def supports_prompt_cache(model_id: str) -> bool:
+    """Whether Bedrock accepts cache breakpoints for this model (or its inference profile)."""
+    return any(name in model_id for name in PROMPT_CACHE_MODELS)
+
+
+def cacheable_system_message(text: str, model_id: str) -> SystemMessage:
+    """
+    Build the system message, marked as a cache breakpoint when the model supports it.
+    """
+    if not supports_prompt_cache(model_id):
+        return SystemMessage(content=text)
+    return SystemMessage(content=[{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}])
+
+
+class PromptCacheMetrics:
+    """
+    Process-wide counters of prompt cache hits, misses and cached token volumes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+        self.uncached_input_tokens = 0
+
+    def record(self, response) -> None:
+        """Update the counters from a model response's usage data."""
+        usage = (getattr(response, "response_metadata", None) or {}).get("usage") or {}
+        details = (getattr(response, "usage_metadata", None) or {}).get("input_token_details") or {}
+        read = usage.get("cache_read_input_tokens") or details.get("cache_read") or 0
+        write = usage.get("cache_creation_input_tokens") or details.get("cache_creation") or 0
+        uncached = usage.get("input_tokens") or usage.get("prompt_tokens") or 0
+        with self._lock:
+            if read:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.cache_read_tokens += read
+            self.cache_write_tokens += write
+            self.uncached_input_tokens += uncached
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            calls = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / calls if calls else 0.0,
+                "cache_read_tokens": self.cache_read_tokens,
+                "cache_write_tokens": self.cache_write_tokens,
+                "uncached_input_tokens": self.uncached_input_tokens,
+            }
+
+
+prompt_cache_metrics = PromptCacheMetrics()
@@ -0,0 +1,201 @@
+"""
+Cancellation of database work abandoned by a chat session.
+
+A pooled connection checked out while a session (and optionally a tool call)
+scope is active is registered under its PostgreSQL backend PID until it is
+checked in again. Streaming reads hold their connection until the last row, so
+they stay registered the whole time. When the work is abandoned, the registered
+backends get `pg_cancel_backend`:
+- the user sends a new message, stops the run, or closes the tab
+- the session is reset after an error
+- a tool call times out (only that call's backends)
+
+The backend PID is read once per DBAPI connection, when it is opened or, for
+connections opened before `track`, at their first checkout. Cancel requests go
+through a separate control engine per endpoint, so they do not wait for the pool
+they are trying to relieve. Each checkout gets a token. A cancel is only sent if
+the backend is still registered under the same checkout. A connection checked in
+while a cancel for its backend is in flight is invalidated, not returned to the
+pool, so the signal can never reach a statement of the next checkout. Checkin
+listeners run on the event loop for async pools, so they never wait.
+"""
+import asyncio
+import contextvars
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+CANCEL_QUERY = text("SELECT pg_cancel_backend(:pid)")
+
+# (session id, tool call id or None) of the work running in this context
+_current_scope: contextvars.ContextVar[Optional[Tuple[str, Optional[str]]]] = contextvars.ContextVar(
+    "bico_query_scope", default=None
+)
+
+
+class QueryCanceller:
+    """
+    Registry of backends in use per session and tool call, with `pg_cancel_backend` on demand.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # backend key (control engine id, pid) -> (session id, tool call id, control engine, registered at, checkout token)
+        self._active: Dict[tuple, tuple] = {}
+        # backend keys with a cancel request in flight
+        self._cancelling: set = set()
+        self._tokens = itertools.count()
+        self.cancelled = 0
+
+    @contextmanager
+    def session(self, session_id: str):
+        """Attribute database work started inside the block to a chat session."""
+        token = _current_scope.set((session_id, None))
+        try:
+            yield
+        finally:
+            _current_scope.reset(token)
+
+    @contextmanager
+    def tool_call(self, tool_call_id: str):
+        """Attribute database work started inside the block to one tool call of the current session."""
+        scope = _current_scope.get()
+        if scope is None:
+            yield
+            return
+        token = _current_scope.set((scope[0], tool_call_id))
+        try:
+            yield
+        finally:
+            _current_scope.reset(token)
+
+    def track(self, engine: Engine, control_engine: Engine) -> None:
+        """
+        Register the connections of `engine` while they are checked out in a scope.
+
+        Args:
+        engine (Engine): Pool to watch (use `sync_engine` of an AsyncEngine).
+        control_engine (Engine): Engine on the same endpoint used to send cancel requests.
+        """
+        @event.listens_for(engine, "connect")
+        def _connect(dbapi_connection, connection_record):
+            connection_record.info["backend_pid"] = _backend_pid(dbapi_connection)
+
+        @event.listens_for(engine, "checkout")
+        def _checkout(dbapi_connection, connection_record, connection_proxy):
+            scope = _current_scope.get()
+            if scope is None:
+                return
+            if "backend_pid" not in connection_record.info:
+                # opened before `track` was called
+                connection_record.info["backend_pid"] = _backend_pid(dbapi_connection)
+            pid = connection_record.info["backend_pid"]
+            if pid is None:
+                return
+            key = (id(control_engine), pid)
+            with self._lock:
+                self._active[key] = (scope[0], scope[1], control_engine, time.time(), next(self._tokens))
+            connection_record.info["bico_cancel_key"] = key
+
+        @event.listens_for(engine, "checkin")
+        def _checkin(dbapi_connection, connection_record):
+            key = connection_record.info.pop("bico_cancel_key", None)
+            if key is None:
+                return
+            with self._lock:
+                self._active.pop(key, None)
+                pending = key in self._cancelling
+            if pending:
+                # the signal may still arrive; the backend must not serve another checkout
+                connection_record.info.pop("backend_pid", None)
+                connection_record.invalidate()
+
+    def cancel(self, session_id: str, tool_call_id: Optional[str] = None) -> int:
+        """
+        Cancel the running statements of a session, or of one of its tool calls.
+
+        Returns:
+        int: Number of backends a cancel request was sent to.
+        """
+        with self._lock:
+            targets = [
+                (key, entry[4]) for key, entry in self._active.items()
+                if entry[0] == session_id and (tool_call_id is None or entry[1] == tool_call_id)
+            ]
+        cancelled = 0
+        for key, token in targets:
+            with self._lock:
+                entry = self._active.get(key)
+                if entry is None or entry[4] != token or key in self._cancelling:
+                    # finished, or checked out again, in the meantime
+                    continue
+                self._cancelling.add(key)
+            try:
+                with entry[2].connect() as connection:
+                    connection.execute(CANCEL_QUERY, {"pid": key[1]})
+                cancelled += 1
+            except Exception as e:
+                print(f"Error cancelling backend {key[1]}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._cancelling.discard(key)
+        with self._lock:
+            self.cancelled += cancelled
+        return cancelled
+
+    async def acancel(self, session_id: str, tool_call_id: Optional[str] = None) -> int:
+        """`cancel` off the event loop."""
+        if not self.active(session_id, tool_call_id):
+            return 0
+        return await asyncio.to_thread(self.cancel, session_id, tool_call_id)
+
+    async def acancel_current(self) -> int:
+        """Cancel the work of the current scope: the running tool call, or the whole session outside one."""
+        scope = _current_scope.get()
+        if scope is None:
+            return 0
+        return await self.acancel(*scope)
+
+    def active(self, session_id: str, tool_call_id: Optional[str] = None) -> List[int]:
+        """Backend PIDs currently registered for a session or tool call."""
+        with self._lock:
+            return [
+                key[1] for key, entry in self._active.items()
+                if entry[0] == session_id and (tool_call_id is None or entry[1] == tool_call_id)
+            ]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"active": len(self._active), "cancelled": self.cancelled}
+
+
+def current_scope() -> Optional[Tuple[str, Optional[str]]]:
+    """(session id, tool call id) of the work running in this context, if any."""
+    return _current_scope.get()
+
+
+def _backend_pid(dbapi_connection) -> Optional[int]:
+    # psycopg2 and asyncpg know the PID from the startup handshake
+    if hasattr(dbapi_connection, "get_backend_pid"):
+        return dbapi_connection.get_backend_pid()
+    driver_connection = getattr(dbapi_connection, "driver_connection", None)
+    if driver_connection is not None and hasattr(driver_connection, "get_server_pid"):
+        return driver_connection.get_server_pid()
+    try:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("SELECT pg_backend_pid()")
+        pid = cursor.fetchone()[0]
+        cursor.close()
+        dbapi_connection.rollback()
+        return pid
+    except Exception as e:
+        print(f"Error reading backend pid: {str(e)}")
+        return None
+
+
+query_canceller = QueryCanceller()
@@ -0,0 +1,179 @@
+"""
+Pre-flight cost guard for SQL written by the model.
+
+Before `execute_query` runs a read-only statement, the planner's estimate is
+read with `EXPLAIN (FORMAT JSON)` (planning only, nothing is executed) and one
+of the following happens:
+- "allow": the estimate is within the thresholds
+- "limit": the estimated cost is acceptable but the query would return too many
+  rows, so a LIMIT is added to the outermost query
+- "sample": the query is too expensive, but tables it reads have a
+  sample table (SAMPLE_TABLES, or `<table>_sample` by convention), and the
+  rewritten query is within the thresholds; the result says it is sampled
+- "reject": the query is too expensive; the message names the most expensive
+  plan nodes so the model can add filters or aggregate earlier
+
+Planner estimates are only estimates. The guard stops queries that would
+obviously run for minutes, and the role's statement_timeout remains the backstop.
+"""
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from utils.sql_fingerprint import has_top_level_limit, is_read_only, referenced_tables, replace_tables, tokenize
+
+# Query guard setting
+MAX_TOTAL_COST = 5e6
+MAX_PLAN_ROWS = 200000
+INJECTED_LIMIT = 100000
+# table -> sample table, e.g. {"orders": "orders_sample"}
+SAMPLE_TABLES: Dict[str, str] = {}
+SAMPLE_TABLE_SUFFIX = "_sample"
+
+
+class GuardDecision(NamedTuple):
+    action: str
+    sql: str
+    message: str = ""
+    cost: Optional[float] = None
+    rows: Optional[float] = None
+
+
+class QueryGuard:
+    """
+    Decides, from the planner's estimate, whether and how a query is run.
+    """
+
+    def __init__(self, db, max_total_cost: float = MAX_TOTAL_COST, max_plan_rows: float = MAX_PLAN_ROWS,
+                 injected_limit: int = INJECTED_LIMIT, sample_tables: Dict[str, str] = None):
+        self.db = db
+        self.max_total_cost = max_total_cost
+        self.max_plan_rows = max_plan_rows
+        self.injected_limit = injected_limit
+        self.sample_tables = SAMPLE_TABLES if sample_tables is None else sample_tables
+
+    def check(self, sql: str) -> GuardDecision:
+        """
+        Args:
+        sql (str): Statement written by the model.
+
+        Returns:
+        GuardDecision: Action, the statement to run and a note for the model.
+        """
+        if not self._applies(sql):
+            return GuardDecision("allow", sql)
+        sql = sql.strip().rstrip(";")
+        plan = self._estimate(sql)
+        sampled = sampled_plan = None
+        if plan is not None and plan["Total Cost"] > self.max_total_cost:
+            sampled = self._sampled(sql)
+            if sampled is not None:
+                sampled_plan = self._estimate(sampled)
+        return self._decide(sql, plan, sampled, sampled_plan)
+
+    async def acheck(self, sql: str) -> GuardDecision:
+        """Async `check`; plans are read through `db.aexplain`."""
+        if not self._applies(sql):
+            return GuardDecision("allow", sql)
+        sql = sql.strip().rstrip(";")
+        plan = await self._aestimate(sql)
+        sampled = sampled_plan = None
+        if plan is not None and plan["Total Cost"] > self.max_total_cost:
+            sampled = self._sampled(sql)
+            if sampled is not None:
+                sampled_plan = await self._aestimate(sampled)
+        return self._decide(sql, plan, sampled, sampled_plan)
+
+    def _applies(self, sql: str) -> bool:
+        return self.db.dialect == "postgresql" and is_read_only(sql) and not sql.lstrip().lower().startswith("explain")
+
+    def _decide(self, sql: str, plan: Optional[Dict[str, Any]], sampled: Optional[str],
+                sampled_plan: Optional[Dict[str, Any]]) -> GuardDecision:
+        if plan is None:
+            # the statement does not plan (syntax error, unknown column, ...): let execution report it
+            return GuardDecision("allow", sql)
+        cost, rows = plan["Total Cost"], plan["Plan Rows"]
+
+        if cost > self.max_total_cost:
+            if sampled_plan is not None and sampled_plan["Total Cost"] <= self.max_total_cost:
+                return GuardDecision(
+                    "sample",
+                    self._limited(sampled, sampled_plan["Plan Rows"]),
+                    "Note: the query was too expensive on the full tables and was run on sample tables, "
+                    "so counts and sums are not totals.",
+                    sampled_plan["Total Cost"],
+                    sampled_plan["Plan Rows"],
+                )
+            return GuardDecision("reject", sql, self._rejection(plan), cost, rows)
+
+        limited = self._limited(sql, rows)
+        if limited != sql:
+            return GuardDecision(
+                "limit",
+                limited,
+                f"Note: about {int(rows)} rows were estimated, only the first {self.injected_limit} were read.",
+                cost,
+                rows,
+            )
+        return GuardDecision("allow", sql, cost=cost, rows=rows)
+
+    def _estimate(self, sql: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self.db.explain(sql)["Plan"]
+        except (SQLAlchemyError, ValueError, KeyError, IndexError) as e:
+            print(f"Error explaining query: {str(e)}")
+            return None
+
+    async def _aestimate(self, sql: str) -> Optional[Dict[str, Any]]:
+        try:
+            return (await self.db.aexplain(sql))["Plan"]
+        except (SQLAlchemyError, ValueError, KeyError, IndexError) as e:
+            print(f"Error explaining query: {str(e)}")
+            return None
+
+    def _limited(self, sql: str, rows: float) -> str:
+        if rows <= self.max_plan_rows or has_top_level_limit(sql) or ("op", ";") in tokenize(sql):
+            return sql
+        return f"{sql}\nLIMIT {self.injected_limit}"
+
+    def _sampled(self, sql: str) -> Optional[str]:
+        tables = referenced_tables(sql)
+        if not tables:
+            return None
+        usable = set(self.db.get_usable_table_names())
+        mapping = {}
+        for table in tables:
+            sample = self.sample_tables.get(table)
+            if sample is None and f"{table}{SAMPLE_TABLE_SUFFIX}" in usable:
+                sample = f"{table}{SAMPLE_TABLE_SUFFIX}"
+            if sample is not None:
+                mapping[table] = sample
+        return replace_tables(sql, mapping) if mapping else None
+
+    def _rejection(self, plan: Dict[str, Any]) -> str:
+        nodes = sorted(_walk(plan), key=lambda node: node.get("Total Cost", 0), reverse=True)
+        lines = [
+            f"Error: the query was not run. Its estimated cost is {plan['Total Cost']:.0f} "
+            f"(limit {self.max_total_cost:.0f}) and it would return about {int(plan['Plan Rows'])} rows.",
+            "Most expensive steps:",
+        ]
+        for node in nodes[:3]:
+            relation = f" on {node['Relation Name']}" if "Relation Name" in node else ""
+            lines.append(
+                f"- {node['Node Type']}{relation}: cost {node.get('Total Cost', 0):.0f}, "
+                f"about {int(node.get('Plan Rows', 0))} rows"
+            )
+        lines.append(
+            "Add selective WHERE filters (e.g. a date range), aggregate before joining, "
+            "join on indexed keys, or select fewer rows."
+        )
+        return "\n".join(lines)
+
+
+def _walk(node: Dict[str, Any]) -> List[Dict[str, Any]]:
+    nodes, stack = [], [node]
+    while stack:
+        current = stack.pop()
+        nodes.append(current)
+        stack.extend(current.get("Plans", []))
+    return nodes
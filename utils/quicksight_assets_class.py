@@ -2412,12 +2412,46 @@ class TextBox():
 
 		return self.json
 
-# Recursive function to remove parameters with empty values from dictionary object
+# Remove parameters with empty values from dictionary object.
+# Single pass over the tree with an explicit stack: every node is visited once,
+# so the cost is linear in the size of the definition and deep analyses cannot
+# hit the interpreter recursion limit. Empty values ({}, [], "", None, False-y
+# scalars other than 0) are dropped, as are containers that become empty once
+# their own children have been pruned.
 def clean_dict(input):
-    if type(input) is dict:
-        return dict((key, clean_dict(value)) for key, value in input.items() if (value or value == 0) and clean_dict(value) not in [{},[],""])
-    elif type(input) is list:
-        return [clean_dict(item) for item in input if (item or item == 0) and clean_dict(item) not in [{},[],""]]
+    if type(input) is not dict and type(input) is not list:
+        return input if _is_kept_scalar(input) else None
+
+    root = {} if type(input) is dict else []
+    # Each frame: (iterator over source items, cleaned container, parent container, key in parent)
+    stack = [(_iter_items(input), root, None, None)]
+    while stack:
+        items, output, parent, parent_key = stack[-1]
+        for key, value in items:
+            if type(value) is dict or type(value) is list:
+                if not value:
+                    continue
+                child = {} if type(value) is dict else []
+                stack.append((_iter_items(value), child, output, key))
+                break
+            if _is_kept_scalar(value):
+                _attach(output, key, value)
+        else:
+            stack.pop()
+            if parent is not None and output:
+                _attach(parent, parent_key, output)
+    return root
+
+def _is_kept_scalar(value):
+    return bool(value or value == 0)
+
+def _iter_items(container):
+    if type(container) is dict:
+        return iter(container.items())
+    return ((None, item) for item in container)
+
+def _attach(container, key, value):
+    if type(container) is dict:
+        container[key] = value
     else:
-	    if input or input == 0:
-		    return input
\ No newline at end of file
+        container.append(value)
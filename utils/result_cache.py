@@ -0,0 +1,242 @@
+"""
+Result cache for `execute_query`, keyed by SQL fingerprint.
+
+Repeated analytical questions often produce the same query up to whitespace,
+case, comments or alias spelling; those all share a fingerprint (see
+utils/sql_fingerprint.py) and are answered from memory.
+
+Entries are bounded by TTL, entry count and total bytes, evicting the least
+recently used first. Each entry records a version of every table it reads, taken
+from the pg_stat_user_tables modification counters. A lookup re-reads those
+counters in one cheap query and discards the entry if any table changed.
+Statistics are flushed asynchronously by PostgreSQL, so a write can take up to
+about a second to invalidate.
+
+The counters are read on the primary (they are not replicated), while results
+may come from a replica. With `source_lag`, results are only stored while the
+endpoint that ran the query is at most MAX_SOURCE_LAG_SECONDS behind, so a
+replica result is never recorded against a newer primary version.
+
+Only read-only statements whose referenced tables can all be identified and
+versioned are cached; volatile functions such as random() disable caching.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from utils.sql_fingerprint import fingerprint, is_read_only, referenced_tables, tokenize
+
+# Result cache setting
+RESULT_CACHE_TTL_SECONDS = 15 * 60
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RESULT_CACHE_MAX_ENTRIES = 2000
+# results are not stored while the endpoint they came from lags the primary by more
+MAX_SOURCE_LAG_SECONDS = 1
+VOLATILE_FUNCTIONS = {
+    "random", "setseed", "nextval", "currval", "lastval", "setval",
+    "gen_random_uuid", "uuid_generate_v4", "clock_timestamp", "timeofday",
+    "pg_sleep", "txid_current",
+}
+
+TABLE_VERSION_QUERY = text("""
+    SELECT
+        r.name AS table_name,
+        s.n_tup_ins::text || ':' || s.n_tup_upd::text || ':' || s.n_tup_del::text
+            || ':' || s.n_live_tup::text AS version
+    FROM
+        unnest(CAST(:table_names AS text[])) AS r(name)
+        LEFT JOIN pg_catalog.pg_stat_user_tables s ON s.relid = to_regclass(r.name)
+""")
+
+
+class QueryResultCache:
+    """
+    Thread-safe LRU of query results with TTL, byte budget and table-change invalidation.
+
+    Attributes:
+    engine (Engine): Engine the table versions are read on, normally the primary.
+    source_lag (Optional[Callable]): Returns the replication lag, in seconds, of the endpoint
+    results are read from (None while unknown); None when results come from `engine`'s endpoint.
+    """
+
+    def __init__(self, engine: Engine, schema: Optional[str] = None, ttl=RESULT_CACHE_TTL_SECONDS,
+                 max_bytes=RESULT_CACHE_MAX_BYTES, max_entries=RESULT_CACHE_MAX_ENTRIES, async_engine=None,
+                 source_lag: Optional[Callable[[], Optional[float]]] = None,
+                 max_source_lag: float = MAX_SOURCE_LAG_SECONDS):
+        self.engine = engine
+        self.async_engine = async_engine
+        self.source_lag = source_lag
+        self.max_source_lag = max_source_lag
+        self.schema = schema
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lagging = 0
+
+    def table_versions(self, table_names: List[str]) -> Optional[Dict[str, str]]:
+        """
+        Current modification counters of the tables, or None if any is not a versionable table.
+        """
+        if not table_names:
+            return {}
+        if self.engine.dialect.name != "postgresql":
+            return None
+        try:
+            with self.engine.connect() as connection:
+                rows = connection.execute(TABLE_VERSION_QUERY, {"table_names": table_names}).fetchall()
+        except Exception as e:
+            print(f"Error reading table versions: {str(e)}")
+            return None
+        return self._versions(rows, table_names)
+
+    async def atable_versions(self, table_names: List[str]) -> Optional[Dict[str, str]]:
+        """Async `table_versions`, on `async_engine` when one is configured."""
+        if self.async_engine is None:
+            return await asyncio.to_thread(self.table_versions, table_names)
+        if not table_names:
+            return {}
+        if self.async_engine.dialect.name != "postgresql":
+            return None
+        try:
+            async with self.async_engine.connect() as connection:
+                result = await connection.execute(TABLE_VERSION_QUERY, {"table_names": table_names})
+                rows = result.fetchall()
+        except Exception as e:
+            print(f"Error reading table versions: {str(e)}")
+            return None
+        return self._versions(rows, table_names)
+
+    @staticmethod
+    def _versions(rows, table_names: List[str]) -> Optional[Dict[str, str]]:
+        versions = {row.table_name: row.version for row in rows}
+        if any(versions.get(name) is None for name in table_names):
+            return None
+        return versions
+
+    def get(self, sql: str) -> Optional[str]:
+        """Return the cached result of an equivalent query if it is still valid."""
+        key, entry = self._lookup(sql)
+        if entry is None:
+            return None
+        versions = None if self._expired(entry) else self.table_versions(list(entry["versions"]))
+        return self._validate(key, entry, versions)
+
+    async def aget(self, sql: str) -> Optional[str]:
+        """Async `get`."""
+        key, entry = self._lookup(sql)
+        if entry is None:
+            return None
+        versions = None if self._expired(entry) else await self.atable_versions(list(entry["versions"]))
+        return self._validate(key, entry, versions)
+
+    def put(self, sql: str, result: str) -> bool:
+        """
+        Cache a successful result if the statement is cacheable.
+
+        Returns:
+        bool: Whether the result was stored.
+        """
+        tables = self._cacheable_tables(sql, result)
+        if tables is None:
+            return False
+        return self._store(sql, result, self.table_versions(tables))
+
+    async def aput(self, sql: str, result: str) -> bool:
+        """Async `put`."""
+        tables = self._cacheable_tables(sql, result)
+        if tables is None:
+            return False
+        return self._store(sql, result, await self.atable_versions(tables))
+
+    def _lookup(self, sql: str):
+        key = fingerprint(sql)
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                self.misses += 1
+        return key, entry
+
+    def _expired(self, entry: dict) -> bool:
+        return time.time() - entry["stored_at"] > self.ttl
+
+    def _validate(self, key: str, entry: dict, versions: Optional[Dict[str, str]]) -> Optional[str]:
+        with self._lock:
+            if versions != entry["versions"]:
+                if self._items.get(key) is entry:
+                    self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            if key in self._items:
+                self._items.move_to_end(key)
+            self.hits += 1
+        return entry["result"]
+
+    def _cacheable_tables(self, sql: str, result: str) -> Optional[List[str]]:
+        if not isinstance(result, str) or result.startswith("Error:") or not self.is_cacheable(sql):
+            return None
+        if len(result.encode("utf-8")) > self.max_bytes // 4:
+            return None
+        if self.source_lag is not None:
+            lag = self.source_lag()
+            if lag is None or lag > self.max_source_lag:
+                with self._lock:
+                    self.lagging += 1
+                return None
+        tables = referenced_tables(sql)
+        if tables is not None and self.schema:
+            # queries run with search_path set to the database schema
+            tables = [name if "." in name else f"{self.schema}.{name}" for name in tables]
+        return tables
+
+    def _store(self, sql: str, result: str, versions: Optional[Dict[str, str]]) -> bool:
+        if versions is None:
+            return False
+        key = fingerprint(sql)
+        size = len(result.encode("utf-8"))
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+            self._items[key] = {"result": result, "versions": versions, "stored_at": time.time(), "size": size}
+            self._size += size
+            while self._items and (self._size > self.max_bytes or len(self._items) > self.max_entries):
+                self._remove(next(iter(self._items)))
+        return True
+
+    @staticmethod
+    def is_cacheable(sql: str) -> bool:
+        if not is_read_only(sql):
+            return False
+        words = {value.lower() for kind, value in tokenize(sql) if kind == "word"}
+        return not words & VOLATILE_FUNCTIONS and "explain" not in words
+
+    def invalidate_all(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "lagging": self.lagging,
+            }
+
+    def _remove(self, key) -> None:
+        entry = self._items.pop(key)
+        self._size -= entry["size"]
@@ -0,0 +1,145 @@
+"""
+Compact summaries of large query results.
+
+`execute_query` used to return `str()` of every row, which for a large result
+exhausts memory first and the model's context next. A streamed result is folded
+into a `ResultSummary` batch by batch instead:
+- the total row count (up to a scan limit) and per-column null counts and min/max
+  are computed over every row read
+- only the first `max_rows` rows are kept, column by column (see utils/columnar.py);
+  they are stored in the artifact store and referenced by a handle
+  (`artifact://result/...`) that other tools can read
+- the text returned to the agent contains the column types, the statistics and
+  the first few rows
+"""
+from typing import Any, List, Optional, Sequence
+
+from utils.artifact_store import artifact_store
+from utils.columnar import ColumnarResult, to_array
+
+# Result summary setting
+MAX_STORED_ROWS = 10000
+MAX_SCANNED_ROWS = 1000000
+PREVIEW_ROWS = 20
+FETCH_BATCH_SIZE = 2000
+# results up to this many rows are returned in full, as before
+INLINE_ROW_LIMIT = 50
+
+
+class ColumnStats:
+    """Running null count, min and max of one column, updated a batch at a time."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.type_name: Optional[str] = None
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self._comparable = True
+
+    def update(self, values: Sequence[Any]) -> None:
+        present = [value for value in values if value is not None]
+        self.nulls += len(values) - len(present)
+        if not present:
+            return
+        if self.type_name is None:
+            self.type_name = type(present[0]).__name__
+        if not self._comparable:
+            return
+        try:
+            low, high = min(present), max(present)
+            self.min = low if self.min is None else min(self.min, low)
+            self.max = high if self.max is None else max(self.max, high)
+        except TypeError:
+            # mixed or unorderable values (e.g. dicts from json columns)
+            self._comparable = False
+            self.min = self.max = None
+
+    def describe(self, length: int) -> str:
+        text = f"- {self.name} ({self.type_name or 'unknown'}): nulls {self.nulls}"
+        if self.min is not None:
+            text += f", min {_short(self.min, length)}, max {_short(self.max, length)}"
+        return text
+
+
+class ResultSummary:
+    """
+    Accumulates a streamed result set column by column.
+
+    Attributes:
+    columns (List[str]): Column names.
+    row_count (int): Rows read so far.
+    complete (bool): False when reading stopped at `max_scanned_rows`.
+    """
+
+    def __init__(self, columns: Sequence[str], max_rows: int = MAX_STORED_ROWS,
+                 max_scanned_rows: int = MAX_SCANNED_ROWS):
+        self.columns = list(columns)
+        self.stats = [ColumnStats(name) for name in self.columns]
+        self._buffers: List[list] = [[] for _ in self.columns]
+        self._kept = 0
+        self.row_count = 0
+        self.complete = True
+        self.max_rows = max_rows
+        self.max_scanned_rows = max_scanned_rows
+
+    def add_batch(self, batch: Sequence[Sequence[Any]]) -> bool:
+        """
+        Fold a batch of rows into the summary.
+
+        Returns:
+        bool: Whether more rows should be read.
+        """
+        remaining = self.max_scanned_rows - self.row_count
+        if len(batch) > remaining:
+            batch = batch[:remaining]
+            self.complete = False
+        if not batch:
+            return self.complete
+        self.row_count += len(batch)
+        keep = self.max_rows - self._kept
+        for stats, buffer, values in zip(self.stats, self._buffers, zip(*batch)):
+            stats.update(values)
+            if keep > 0:
+                buffer.extend(values[:keep])
+        self._kept += max(min(keep, len(batch)), 0)
+        return self.complete
+
+    def result(self) -> ColumnarResult:
+        """The kept rows as a columnar result."""
+        columns = [to_array(buffer) for buffer in self._buffers]
+        return ColumnarResult(self.columns, columns, self.row_count, self.complete)
+
+    def store(self, result: Optional[ColumnarResult] = None) -> str:
+        """Put the kept rows in the artifact store and return the handle."""
+        data, media_type = (result or self.result()).to_bytes()
+        return artifact_store.put(data, media_type, kind="result")
+
+    def render(self, handle: Optional[str], preview_rows: int = PREVIEW_ROWS, max_string_length: int = 300,
+               result: Optional[ColumnarResult] = None) -> str:
+        """Text returned to the agent."""
+        result = result or self.result()
+        count = f"{self.row_count}" if self.complete else f"more than {self.row_count}"
+        lines = [f"Rows: {count}, columns: {len(self.columns)}"]
+        if handle:
+            kept = "all rows" if self._kept == self.row_count else f"the first {self._kept} rows"
+            lines.append(f"Full result ({kept}): {handle}")
+        lines.append("Columns:")
+        lines.extend(stats.describe(max_string_length) for stats in self.stats)
+        lines.append(f"First {min(preview_rows, self._kept)} rows:")
+        lines.append(str(result.slice(0, preview_rows).to_rows(max_string_length)))
+        return "\n".join(lines)
+
+
+def load_result(handle: str) -> Optional[ColumnarResult]:
+    """Read a stored result back; NumPy columns share memory with the stored payload where possible."""
+    artifact = artifact_store.get(handle)
+    if artifact is None or artifact.kind != "result":
+        return None
+    return ColumnarResult.from_bytes(artifact.data, artifact.media_type)
+
+
+def _short(value: Any, length: int) -> Any:
+    if isinstance(value, str) and len(value) > length > 3:
+        return value[: length - 3] + "..."
+    return value
@@ -0,0 +1,139 @@
+"""
+Persistent cache of rendered table metadata for SQLDatabase.get_table_info.
+
+Each entry holds the text rendered for one table (DDL, sample rows, column
+comments) together with the catalog change marker it was rendered under. The
+marker is an md5 over the xmin of the table's pg_class, pg_attribute,
+pg_description and pg_constraint rows. Any DDL or COMMENT touching the table
+rewrites at least one of those rows, so a changed marker means the entry is
+stale. Sample rows are illustrative and are not re-read on data changes.
+
+Checking the markers of all requested tables is a single catalog query, so a
+warm `get_table_info` costs one round trip instead of reflection, sample-row and
+comment queries per table. Entries are kept in a JSON file so they survive restarts.
+"""
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Engine
+
+# Schema cache setting
+SCHEMA_CACHE_PATH = "schema_cache.json"
+
+CATALOG_MARKER_QUERY = text("""
+    SELECT
+        c.relname AS table_name,
+        md5(
+            c.xmin::text || ':' || c.relnatts::text
+            || ':' || coalesce((
+                SELECT string_agg(a.xmin::text || '.' || a.attnum::text, ',' ORDER BY a.attnum)
+                FROM pg_catalog.pg_attribute a
+                WHERE a.attrelid = c.oid AND a.attnum > 0
+            ), '')
+            || ':' || coalesce((
+                SELECT string_agg(d.xmin::text || '.' || d.objsubid::text, ',' ORDER BY d.objsubid)
+                FROM pg_catalog.pg_description d
+                WHERE d.objoid = c.oid AND d.classoid = 'pg_catalog.pg_class'::regclass
+            ), '')
+            || ':' || coalesce((
+                SELECT string_agg(k.xmin::text || '.' || k.oid::text, ',' ORDER BY k.oid)
+                FROM pg_catalog.pg_constraint k
+                WHERE k.conrelid = c.oid
+            ), '')
+        ) AS marker
+    FROM
+        pg_catalog.pg_class c
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    WHERE
+        n.nspname = coalesce(:schema, current_schema())
+        AND c.relname IN :table_names
+""").bindparams(bindparam("table_names", expanding=True))
+
+
+class SchemaCache:
+    """
+    Thread-safe, file-backed map of table name -> (catalog marker, rendered table info).
+    """
+
+    def __init__(self, path: str = SCHEMA_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error loading schema cache {path}: {str(e)}")
+
+    @staticmethod
+    def _key(schema: Optional[str], table_name: str) -> str:
+        return f"{schema or ''}.{table_name}"
+
+    def get(self, schema: Optional[str], table_name: str, marker: Optional[str]) -> Optional[str]:
+        """Return the cached table info if it was rendered under the same catalog marker."""
+        if marker is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(self._key(schema, table_name))
+        if entry and entry["marker"] == marker:
+            return entry["info"]
+        return None
+
+    def contains(self, schema: Optional[str], table_name: str) -> bool:
+        """Whether any entry, current or stale, exists for the table."""
+        with self._lock:
+            return self._key(schema, table_name) in self._entries
+
+    def put(self, schema: Optional[str], table_name: str, marker: Optional[str], info: str) -> None:
+        if marker is None:
+            return
+        with self._lock:
+            self._entries[self._key(schema, table_name)] = {"marker": marker, "info": info}
+
+    def invalidate(self, schema: Optional[str] = None, table_name: Optional[str] = None) -> None:
+        """Drop one table's entry, or everything when no table is given."""
+        with self._lock:
+            if table_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self._key(schema, table_name), None)
+
+    def save(self) -> None:
+        """Write the cache to disk atomically."""
+        with self._lock:
+            data = json.dumps(self._entries)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+
+def get_catalog_markers(engine: Engine, schema: Optional[str], table_names: List[str]) -> Dict[str, str]:
+    """
+    Fetch the catalog change marker of every table in one query.
+
+    Returns an empty dict for dialects other than PostgreSQL, which disables caching.
+    """
+    if engine.dialect.name != "postgresql" or not table_names:
+        return {}
+    with engine.connect() as connection:
+        rows = connection.execute(
+            CATALOG_MARKER_QUERY, {"schema": schema, "table_names": list(table_names)}
+        ).fetchall()
+    return {row.table_name: row.marker for row in rows}
+
+
+async def aget_catalog_markers(engine, schema: Optional[str], table_names: List[str]) -> Dict[str, str]:
+    """`get_catalog_markers` on a SQLAlchemy AsyncEngine."""
+    if engine.dialect.name != "postgresql" or not table_names:
+        return {}
+    async with engine.connect() as connection:
+        result = await connection.execute(
+            CATALOG_MARKER_QUERY, {"schema": schema, "table_names": list(table_names)}
+        )
+        rows = result.fetchall()
+    return {row.table_name: row.marker for row in rows}
@@ -0,0 +1,299 @@
+"""
+Semantic cache of validated question -> SQL pairs.
+
+Users keep asking near-identical questions ("monthly revenue by region last
+year"), and each one normally goes through guidance, table names, table info and
+proper-noun lookups before the query is written. When a turn ends with a
+successful `execute_query`, its question and SQL are stored with the question's
+embedding (Titan, see `search_tool.gen_emb`). A new question is looked up by
+cosine similarity:
+- at DIRECT_THRESHOLD or above, and only if both questions mention the same
+  numbers, dates, quoted values and proper nouns (see `question_literals`), the
+  stored SQL is run right away and the agent only has to answer from its result;
+  "revenue in 2023" and "revenue in 2024" embed almost identically
+- otherwise, at HINT_THRESHOLD or above, the SQL is offered to the agent as a
+  validated example to adapt and run with `execute_query`, skipping the discovery steps
+- an exact repeat of a question (after case and whitespace normalization) is
+  found without calling the embedding model
+- a question with a relative date ("today", "last month", "ytd", see
+  RELATIVE_DATE_WORDS) is never run directly, not even an exact repeat: its
+  stored SQL has the dates of the day it was answered, so it is only a hint
+
+Only standalone questions belong in the cache: a follow-up ("and for Europe?")
+means something else without its conversation, so callers store only the first
+question of a thread.
+
+Entries expire after TTL_SECONDS. An entry whose SQL fails with a database error
+(see `is_sql_error`) is forgotten; a timeout, cancel or lost connection keeps it. Entries are kept in a JSON file so they survive
+restarts; NumPy, if installed, vectorizes the similarity search.
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from utils.sql_fingerprint import fingerprint
+
+# Semantic cache setting
+SEMANTIC_CACHE_PATH = "semantic_cache.json"
+DIRECT_THRESHOLD = 0.97
+HINT_THRESHOLD = 0.88
+MAX_ENTRIES = 1000
+TTL_SECONDS = 7 * 24 * 3600
+DATE_WORDS = {
+    "january", "february", "march", "april", "may", "june", "july", "august", "september", "october",
+    "november", "december", "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+    "week", "month", "quarter", "year", "q1", "q2", "q3", "q4",
+}
+# words that make a question's dates depend on the day it is asked
+RELATIVE_DATE_WORDS = {
+    "today", "tonight", "yesterday", "tomorrow", "now", "current", "currently", "this", "last", "next", "past",
+    "previous", "recent", "recently", "latest", "ago", "ytd", "mtd", "qtd", "wtd",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+}
+# database errors that say nothing about whether the SQL itself is still valid
+TRANSIENT_ERROR_MARKERS = (
+    "QueryCanceled", "canceling statement", "OperationalError", "InterfaceError", "DisconnectionError",
+    "TimeoutError", "AdminShutdown", "SerializationFailure", "DeadlockDetected", "LockNotAvailable",
+    "server closed the connection", "could not connect",
+)
+
+
+class SemanticMatch(NamedTuple):
+    question: str
+    sql: str
+    score: float
+    # whether the stored SQL can be run as is, rather than offered as an example
+    direct: bool = False
+
+
+def is_validated_result(result: str) -> bool:
+    """Whether an `execute_query` result shows its SQL answered the question: rows, no error, not sampled."""
+    return bool(result) and not result.startswith(("Error", "Note: the query was too expensive"))
+
+
+def is_sql_error(result: str) -> bool:
+    """
+    Whether an `execute_query` result is a database error about the statement (e.g. a dropped column).
+
+    Tool timeouts and cancels ("Error: execute_query did not finish ...") and transient
+    database errors are not: the same SQL may well succeed next time.
+    """
+    return result.startswith("Error: (") and not any(marker in result for marker in TRANSIENT_ERROR_MARKERS)
+
+
+def has_relative_date(question: str) -> bool:
+    """Whether a question's dates depend on when it is asked, e.g. "sales today" or "revenue last month"."""
+    return any(word in RELATIVE_DATE_WORDS for word in re.findall(r"[a-z]+", question.lower()))
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip("?.! ")
+
+
+def question_literals(question: str) -> frozenset:
+    """
+    The parts of a question that change its SQL literals: numbers and dates, quoted values,
+    date words, and capitalized words (proper nouns such as regions or products).
+
+    A capitalized first word counts too, so a question may miss the direct path only
+    for its capitalization, but not run with another region's SQL.
+    """
+    literals = set(re.findall(r"\d+(?:[./:-]\d+)*", question))
+    literals.update(value.lower() for value in re.findall(r"[\"'“‘]([^\"'”’]+)[\"'”’]", question))
+    for word in re.findall(r"[^\W\d_][\w&-]*", question):
+        if word.lower() in DATE_WORDS or word[0].isupper():
+            literals.add(word.lower())
+    return frozenset(literals)
+
+
+def _unit(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+class SemanticQueryCache:
+    """
+    Thread-safe, file-backed store of question embeddings and the SQL that answered them.
+
+    Attributes:
+    embed (Callable): Text -> embedding vector, e.g. `search_tool.gen_emb`.
+    path (str): JSON file the entries are kept in.
+    """
+
+    def __init__(self, embed: Callable[[str], Sequence[float]], path: str = SEMANTIC_CACHE_PATH,
+                 max_entries: int = MAX_ENTRIES, ttl: float = TTL_SECONDS):
+        self.embed = embed
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # normalized question -> {"question", "sql", "embedding", "created_at", "last_used", "hits"}
+        self._entries: Dict[str, dict] = {}
+        self._matrix = None
+        self._keys: List[str] = []
+        self.direct = 0
+        self.hints = 0
+        self.misses = 0
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error loading semantic cache {path}: {str(e)}")
+        self._rebuild()
+
+    def lookup(self, question: str) -> Tuple[Optional[SemanticMatch], Optional[List[float]]]:
+        """
+        Find the stored question closest to `question`.
+
+        Returns:
+        Tuple[Optional[SemanticMatch], Optional[List[float]]]: The match at HINT_THRESHOLD
+        or above (None otherwise), and the question's embedding when one was computed,
+        so that `store` does not compute it again.
+        """
+        key = normalize_question(question)
+        if not key:
+            return None, None
+        now = time.time()
+        relative = has_relative_date(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry["created_at"] < self.ttl:
+                entry["last_used"] = now
+                entry["hits"] += 1
+                if relative:
+                    self.hints += 1
+                else:
+                    self.direct += 1
+                return SemanticMatch(entry["question"], entry["sql"], 1.0, not relative), None
+        try:
+            embedding = _unit(self.embed(question))
+        except Exception as e:
+            print(f"Error embedding question for semantic cache: {str(e)}")
+            return None, None
+        with self._lock:
+            best_key, best_score = self._nearest(embedding)
+            entry = self._entries.get(best_key) if best_key is not None else None
+            if entry is None or best_score < HINT_THRESHOLD or now - entry["created_at"] >= self.ttl:
+                self.misses += 1
+                return None, embedding
+            entry["last_used"] = now
+            entry["hits"] += 1
+            # a near-identical question about another year, region or product needs other literals,
+            # and "today" stored last week meant another day
+            direct = (
+                best_score >= DIRECT_THRESHOLD
+                and not relative
+                and question_literals(question) == question_literals(entry["question"])
+            )
+            if direct:
+                self.direct += 1
+            else:
+                self.hints += 1
+            return SemanticMatch(entry["question"], entry["sql"], best_score, direct), embedding
+
+    def _nearest(self, embedding: List[float]) -> Tuple[Optional[str], float]:
+        if not self._keys:
+            return None, 0.0
+        if np is not None:
+            scores = self._matrix @ np.asarray(embedding, dtype=np.float32)
+            index = int(scores.argmax())
+            return self._keys[index], float(scores[index])
+        best_key, best_score = None, -1.0
+        for key in self._keys:
+            score = sum(a * b for a, b in zip(self._entries[key]["embedding"], embedding))
+            if score > best_score:
+                best_key, best_score = key, score
+        return best_key, best_score
+
+    def store(self, question: str, sql: str, embedding: Optional[Sequence[float]] = None) -> None:
+        """
+        Remember the SQL that answered a question; the embedding is computed if not given.
+        """
+        key = normalize_question(question)
+        if not key or not sql.strip():
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and embedding is None:
+                embedding = entry["embedding"]
+        if embedding is None:
+            try:
+                embedding = self.embed(question)
+            except Exception as e:
+                print(f"Error embedding question for semantic cache: {str(e)}")
+                return
+        now = time.time()
+        with self._lock:
+            previous = self._entries.get(key)
+            self._entries[key] = {
+                "question": question.strip(),
+                "sql": sql.strip(),
+                "embedding": [round(value, 6) for value in _unit(embedding)],
+                "created_at": previous["created_at"] if previous and previous["sql"] == sql.strip() else now,
+                "last_used": now,
+                "hits": previous["hits"] if previous else 0,
+            }
+            self._evict(now)
+            self._rebuild()
+        self.save()
+
+    def forget(self, sql: str) -> None:
+        """Drop every entry answered by `sql`, e.g. after it failed."""
+        target = fingerprint(sql)
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if fingerprint(entry["sql"]) == target]
+            for key in keys:
+                del self._entries[key]
+            if keys:
+                self._rebuild()
+        if keys:
+            self.save()
+
+    def _evict(self, now: float) -> None:
+        for key in [key for key, entry in self._entries.items() if now - entry["created_at"] >= self.ttl]:
+            del self._entries[key]
+        if len(self._entries) > self.max_entries:
+            by_use = sorted(self._entries, key=lambda key: self._entries[key]["last_used"])
+            for key in by_use[: len(self._entries) - self.max_entries]:
+                del self._entries[key]
+
+    def _rebuild(self) -> None:
+        self._keys = list(self._entries)
+        if np is not None and self._keys:
+            self._matrix = np.asarray([self._entries[key]["embedding"] for key in self._keys], dtype=np.float32)
+        else:
+            self._matrix = None
+
+    def save(self) -> None:
+        """Write the entries to disk atomically."""
+        with self._lock:
+            data = json.dumps(self._entries)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving semantic cache {self.path}: {str(e)}")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.direct + self.hints + self.misses
+            return {
+                "entries": len(self._entries),
+                "direct": self.direct,
+                "hints": self.hints,
+                "misses": self.misses,
+                "hit_rate": (self.direct + self.hints) / lookups if lookups else 0.0,
+            }
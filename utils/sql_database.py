@@ -2,7 +2,12 @@
 #增加了对表的comments的输出给llm，可以复制那段函数或替换整个文件到langchain的目录下
 from __future__ import annotations
 
-from typing import Any, Dict, Iterable, List, Literal, Optional, Sequence, Union
+import asyncio
+import contextvars
+import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Literal, Optional, Sequence, Union
 
 import sqlalchemy
 from langchain_core._api import deprecated
@@ -10,17 +15,30 @@ from langchain_core.utils import get_from_env
 from sqlalchemy import (
     MetaData,
     Table,
+    bindparam,
     create_engine,
+    func,
     inspect,
     select,
     text,
 )
 from sqlalchemy.engine import Engine, Result
-from sqlalchemy.exc import ProgrammingError, SQLAlchemyError
+from sqlalchemy.exc import OperationalError, ProgrammingError, SQLAlchemyError
 from sqlalchemy.schema import CreateTable
 from sqlalchemy.sql.expression import Executable
 from sqlalchemy.types import NullType
 
+from utils.result_summary import (
+    FETCH_BATCH_SIZE,
+    INLINE_ROW_LIMIT,
+    MAX_STORED_ROWS,
+    PREVIEW_ROWS,
+    ResultSummary,
+)
+from utils.db_config import install_session_setup
+from utils.schema_cache import SchemaCache, aget_catalog_markers, get_catalog_markers
+from utils.sql_fingerprint import is_read_only, tokenize
+
 
 def _format_index(index: sqlalchemy.engine.interfaces.ReflectedIndex) -> str:
     return (
@@ -44,6 +62,14 @@ def truncate_word(content: Any, *, length: int, suffix: str = "...") -> str:
     return content[: length - len(suffix)].rsplit(" ", 1)[0] + suffix
 
 
+def _single_statement(command: str) -> str:
+    """`command` without trailing semicolons; raises ValueError if it holds more than one statement."""
+    command = command.strip().rstrip(";").rstrip()
+    if ("op", ";") in tokenize(command):
+        raise ValueError("Only a single statement can be explained")
+    return command
+
+
 class SQLDatabase:
     """SQLAlchemy wrapper around a database."""
 
@@ -60,14 +86,52 @@ class SQLDatabase:
         view_support: bool = False,
         max_string_length: int = 300,
         lazy_table_reflection: bool = False,
+        schema_cache: Optional[SchemaCache] = None,
+        sample_rows_mode: Literal["limit", "tablesample"] = "limit",
+        sample_rows_tablesample_percent: float = 1.0,
+        sample_rows_timeout: Optional[float] = 5.0,
+        sample_rows_concurrency: int = 4,
+        metadata_engine: Optional[Engine] = None,
+        async_engine: Optional[Any] = None,
+        async_metadata_engine: Optional[Any] = None,
+        engine_router: Optional[Any] = None,
+        session_settings: Optional[Dict[str, str]] = None,
     ):
-        """Create engine from database URI."""
-        self._engine = engine
+        """Create engine from database URI.
+
+        `metadata_engine`, if given, serves reflection, catalog, comment and sample
+        row queries from its own pool, so they are not queued behind analytical
+        queries on `engine`.
+
+        `async_engine` / `async_metadata_engine` (SQLAlchemy AsyncEngines on the
+        same database) back the `a*` methods; without them those methods run the
+        synchronous ones in a worker thread.
+
+        `engine_router` (an EndpointRouter), if given, picks the engines of the
+        "analytics" and "metadata" roles per call, so queries follow endpoint
+        failover; the engines passed above are then only used for their dialect.
+
+        On PostgreSQL, `schema` and `session_settings` (e.g. {"TimeZone": "UTC"})
+        are applied once per pooled connection at checkout (see
+        `install_session_setup`) instead of a SET before every statement, and
+        read-only statements run without an explicit transaction.
+        """
+        self._engine_router = engine_router
+        self._engines = {"analytics": engine, "metadata": metadata_engine or engine}
+        self._async_engines = {"analytics": async_engine, "metadata": async_metadata_engine or async_engine}
+        self._session_configured = engine.dialect.name == "postgresql"
+        if self._session_configured:
+            self._session_settings = dict(session_settings or {})
+            if schema is not None:
+                self._session_settings["search_path"] = schema
+            for pooled_engine in self._pooled_engines():
+                install_session_setup(pooled_engine, self._session_settings)
+        self._schema_cache = schema_cache
         self._schema = schema
         if include_tables and ignore_tables:
             raise ValueError("Cannot specify both include_tables and ignore_tables")
 
-        self._inspector = inspect(self._engine)
+        self._inspector = inspect(self._metadata_engine)
 
         # including view support by adding the views as well as tables to the all
         # tables list if view_support is True
@@ -98,6 +162,12 @@ class SQLDatabase:
 
         self._sample_rows_in_table_info = sample_rows_in_table_info
         self._indexes_in_table_info = indexes_in_table_info
+        if sample_rows_mode not in ("limit", "tablesample"):
+            raise ValueError("sample_rows_mode must be either 'limit' or 'tablesample'")
+        self._sample_rows_mode = sample_rows_mode
+        self._sample_rows_tablesample_percent = sample_rows_tablesample_percent
+        self._sample_rows_timeout = sample_rows_timeout
+        self._sample_rows_concurrency = max(1, sample_rows_concurrency)
 
         self._custom_table_info = custom_table_info
         if self._custom_table_info:
@@ -116,13 +186,15 @@ class SQLDatabase:
 
         self._max_string_length = max_string_length
         self._view_support = view_support
+        # table name -> note appended to its table info, e.g. summary tables built from it
+        self._table_notes: Dict[str, str] = {}
 
         self._metadata = metadata or MetaData()
         if not lazy_table_reflection:
             # including view support if view_support = true
             self._metadata.reflect(
                 views=view_support,
-                bind=self._engine,
+                bind=self._metadata_engine,
                 only=list(self._usable_tables),
                 schema=self._schema,
             )
@@ -273,6 +345,54 @@ class SQLDatabase:
                 " `pip install cnos-connector`"
             )
 
+    @property
+    def _engine(self) -> Engine:
+        return self._routed_engine("analytics")
+
+    @property
+    def _metadata_engine(self) -> Engine:
+        return self._routed_engine("metadata")
+
+    @property
+    def _async_engine(self) -> Any:
+        if self._engine_router is not None:
+            return self._engine_router.async_engine("analytics")
+        return self._async_engines["analytics"]
+
+    @property
+    def _async_metadata_engine(self) -> Any:
+        if self._engine_router is not None:
+            return self._engine_router.async_engine("metadata")
+        return self._async_engines["metadata"]
+
+    def _pooled_engines(self) -> List[Engine]:
+        """Every distinct sync engine (and AsyncEngine.sync_engine) this instance may use."""
+        engines = list(self._engines.values())
+        engines += [engine.sync_engine for engine in self._async_engines.values() if engine is not None]
+        if self._engine_router is not None:
+            engines += list(self._engine_router.engines().values())
+        return list({id(engine): engine for engine in engines}.values())
+
+    @contextmanager
+    def _connection(self, read_only: bool) -> Iterator[Any]:
+        """Connection for one statement: autocommit for reads once the session is configured, else a transaction.
+
+        `read_only` must come from the strict `is_read_only` check (no data-modifying
+        CTE, SELECT INTO, locking clause or second statement); anything else keeps
+        the transactional path so a failure rolls back.
+        """
+        if read_only and self._session_configured:
+            with self._engine.connect() as connection:
+                yield connection.execution_options(isolation_level="AUTOCOMMIT")
+        else:
+            with self._engine.begin() as connection:
+                yield connection
+
+    def _routed_engine(self, role: str) -> Engine:
+        if self._engine_router is not None:
+            return self._engine_router.engine(role)
+        return self._engines[role]
+
     @property
     def dialect(self) -> str:
         """Return string representation of dialect to use."""
@@ -284,6 +404,21 @@ class SQLDatabase:
             return sorted(self._include_tables)
         return sorted(self._all_tables - self._ignore_tables)
 
+    def add_usable_table(self, table_name: str) -> None:
+        """Make a table created after initialization (e.g. an ingested upload) usable."""
+        self._all_tables.add(table_name)
+        self._usable_tables.add(table_name)
+        if self._include_tables:
+            self._include_tables.add(table_name)
+
+    def set_table_notes(self, notes: Dict[str, str]) -> None:
+        """Replace the notes shown after the table info of the named tables (not cached with it)."""
+        self._table_notes = dict(notes)
+
+    def _render_table_notes(self, table_names: List[str]) -> str:
+        notes = [self._table_notes[name] for name in table_names if name in self._table_notes]
+        return "".join(f"\n\n/*\n{note}\n*/" for note in dict.fromkeys(notes))
+
     @deprecated("0.0.1", alternative="get_usable_table_names", removal="0.3.0")
     def get_table_names(self) -> Iterable[str]:
         """Get names of tables available."""
@@ -304,19 +439,34 @@ class SQLDatabase:
         appended to each table description. This can increase performance as
         demonstrated in the paper.
         """
-        all_table_names = self.get_usable_table_names()
-        if table_names is not None:
-            missing_tables = set(table_names).difference(all_table_names)
-            if missing_tables:
-                raise ValueError(f"table_names {missing_tables} not found in database")
-            all_table_names = table_names
+        all_table_names = self._resolve_table_names(table_names)
+        notes = self._render_table_notes(all_table_names)
+
+        # Serve tables whose catalog marker is unchanged from the schema cache;
+        # re-reflect the ones whose definition changed since they were cached.
+        cached_tables = {}
+        markers = {}
+        if self._schema_cache is not None:
+            markers = get_catalog_markers(self._metadata_engine, self._schema, list(all_table_names))
+            for table_name in all_table_names:
+                if self._custom_table_info and table_name in self._custom_table_info:
+                    continue
+                cached = self._schema_cache.get(self._schema, table_name, markers.get(table_name))
+                if cached is not None:
+                    cached_tables[table_name] = cached
+                    continue
+                if self._schema_cache.contains(self._schema, table_name):
+                    # cached under an older marker: the reflected Table is outdated too
+                    for tbl in [tbl for tbl in self._metadata.sorted_tables if tbl.name == table_name]:
+                        self._metadata.remove(tbl)
+            all_table_names = [t for t in all_table_names if t not in cached_tables]
 
         metadata_table_names = [tbl.name for tbl in self._metadata.sorted_tables]
         to_reflect = set(all_table_names) - set(metadata_table_names)
         if to_reflect:
             self._metadata.reflect(
                 views=self._view_support,
-                bind=self._engine,
+                bind=self._metadata_engine,
                 only=list(to_reflect),
                 schema=self._schema,
             )
@@ -328,36 +478,51 @@ class SQLDatabase:
             and not (self.dialect == "sqlite" and tbl.name.startswith("sqlite_"))
         ]
 
+        has_extra_info = (
+            self._indexes_in_table_info or self._sample_rows_in_table_info
+        )
+        described_tables = [
+            tbl
+            for tbl in meta_tables
+            if not (self._custom_table_info and tbl.name in self._custom_table_info)
+        ]
+        for table in described_tables:
+            # Ignore JSON datatyped columns
+            for k, v in table.columns.items():
+                if type(v.type) is NullType:
+                    table._columns.remove(v)
+
+        # one catalog round trip for the comments of every table
+        table_comments = {}
+        if has_extra_info:
+            table_comments = self._get_table_comments([tbl.name for tbl in described_tables])
+        # sample rows of all tables are collected concurrently
+        sample_rows = {}
+        if self._sample_rows_in_table_info:
+            sample_rows = self._get_sample_rows_batch(described_tables)
+
         tables = []
         for table in meta_tables:
             if self._custom_table_info and table.name in self._custom_table_info:
                 tables.append(self._custom_table_info[table.name])
                 continue
 
-            # Ignore JSON datatyped columns
-            for k, v in table.columns.items():
-                if type(v.type) is NullType:
-                    table._columns.remove(v)
-
             # add create table command
             create_table = str(CreateTable(table).compile(self._engine))
             table_info = f"{create_table.rstrip()}"
-            has_extra_info = (
-                self._indexes_in_table_info or self._sample_rows_in_table_info
-            )
             if has_extra_info:
                 table_info += "\n\n/*"
             if self._indexes_in_table_info:
                 table_info += f"\n{self._get_table_indexes(table)}\n"
             if self._sample_rows_in_table_info:
-                table_info += f"\n{self._get_sample_rows(table)}\n"
+                table_info += f"\n{sample_rows[table.name]}\n"
             if has_extra_info:
                 table_info += "*/"
             if has_extra_info:
                 table_info += "\n\n/*"
             #这里输出commnets
             if has_extra_info:
-                table_info += f"\n{self._get_table_comment(table)}\n"
+                table_info += f"\n{table_comments[table.name]}\n"
             if has_extra_info:
                 table_info += "*/"
             # if has_extra_info:
@@ -367,30 +532,109 @@ class SQLDatabase:
             # if has_extra_info:
             #     table_info += "*/"
             tables.append(table_info)
+            if self._schema_cache is not None:
+                self._schema_cache.put(self._schema, table.name, markers.get(table.name), table_info)
+        if self._schema_cache is not None and tables:
+            self._schema_cache.save()
+        tables.extend(cached_tables.values())
         tables.sort()
         final_str = "\n\n".join(tables)
-        return final_str
+        return final_str + notes
+
+    def _resolve_table_names(self, table_names: Optional[List[str]]) -> List[str]:
+        all_table_names = self.get_usable_table_names()
+        if table_names is not None:
+            missing_tables = set(table_names).difference(all_table_names)
+            if missing_tables:
+                raise ValueError(f"table_names {missing_tables} not found in database")
+            all_table_names = table_names
+        return list(all_table_names)
+
+    async def aget_table_info(self, table_names: Optional[List[str]] = None) -> str:
+        """Async `get_table_info`.
+
+        When every requested table is current in the schema cache, the answer
+        costs one catalog query on the async metadata engine. Otherwise the
+        tables have to be reflected, which SQLAlchemy only does synchronously, so
+        `get_table_info` runs in a worker thread.
+        """
+        if self._async_metadata_engine is None or self._schema_cache is None:
+            return await asyncio.to_thread(self.get_table_info, table_names)
+        all_table_names = self._resolve_table_names(table_names)
+        markers = await aget_catalog_markers(self._async_metadata_engine, self._schema, all_table_names)
+        tables = []
+        for table_name in all_table_names:
+            if self._custom_table_info and table_name in self._custom_table_info:
+                tables.append(self._custom_table_info[table_name])
+                continue
+            cached = self._schema_cache.get(self._schema, table_name, markers.get(table_name))
+            if cached is None:
+                return await asyncio.to_thread(self.get_table_info, table_names)
+            tables.append(cached)
+        tables.sort()
+        return "\n\n".join(tables) + self._render_table_notes(all_table_names)
 
     def _get_table_indexes(self, table: Table) -> str:
-        indexes = self._inspector.get_indexes(table.name)
+        # a fresh inspector, so the lookup follows the metadata route
+        indexes = inspect(self._metadata_engine).get_indexes(table.name, schema=self._schema)
         indexes_formatted = "\n".join(map(_format_index, indexes))
         return f"Table Indexes:\n{indexes_formatted}"
 
-    def _get_sample_rows(self, table: Table) -> str:
-        # build the select command
-        command = select(table).limit(self._sample_rows_in_table_info)
+    def _get_sample_rows_batch(self, tables: List[Table]) -> Dict[str, str]:
+        """Collect the sample rows of several tables concurrently over the engine's pool."""
+        if len(tables) <= 1 or self._sample_rows_concurrency == 1:
+            return {table.name: self._get_sample_rows(table) for table in tables}
+        workers = min(self._sample_rows_concurrency, len(tables))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # copy the context so that tracing spans keep their parent
+            futures = {
+                table.name: executor.submit(
+                    contextvars.copy_context().run, self._get_sample_rows, table
+                )
+                for table in tables
+            }
+            return {name: future.result() for name, future in futures.items()}
+
+    def _sample_rows_command(self, table: Table, tablesample: bool) -> Executable:
+        if tablesample:
+            sampled = table.tablesample(
+                func.system(self._sample_rows_tablesample_percent)
+            )
+            return select(sampled).limit(self._sample_rows_in_table_info)
+        return select(table).limit(self._sample_rows_in_table_info)
 
+    def _get_sample_rows(self, table: Table) -> str:
         # save the columns in string format
         columns_str = "\t".join([col.name for col in table.columns])
 
+        # TABLESAMPLE SYSTEM reads a random subset of pages instead of the
+        # head of the heap; tiny tables may yield no rows and fall back to LIMIT
+        use_tablesample = (
+            self._sample_rows_mode == "tablesample" and self.dialect == "postgresql"
+        )
+
         try:
             # get the sample rows
-            with self._engine.connect() as connection:
-                sample_rows_result = connection.execute(command)  # type: ignore
+            with self._metadata_engine.connect() as connection:
+                if self._sample_rows_timeout and self.dialect == "postgresql":
+                    connection.exec_driver_sql(
+                        "SET LOCAL statement_timeout = %s",
+                        (int(self._sample_rows_timeout * 1000),),
+                    )
+                sample_rows_result = connection.execute(
+                    self._sample_rows_command(table, use_tablesample)
+                )  # type: ignore
                 # shorten values in the sample rows
                 sample_rows = list(
                     map(lambda ls: [str(i)[:100] for i in ls], sample_rows_result)
                 )
+                if use_tablesample and not sample_rows:
+                    sample_rows_result = connection.execute(
+                        self._sample_rows_command(table, False)
+                    )
+                    sample_rows = list(
+                        map(lambda ls: [str(i)[:100] for i in ls], sample_rows_result)
+                    )
 
             # save the sample rows in string format
             sample_rows_str = "\n".join(["\t".join(row) for row in sample_rows])
@@ -399,6 +643,12 @@ class SQLDatabase:
         # 'ProgrammingError' is returned
         except ProgrammingError:
             sample_rows_str = ""
+        except OperationalError as e:
+            # SQLSTATE 57014 (query_canceled): statement_timeout cancelled the sample query
+            if getattr(e.orig, "pgcode", None) == "57014":
+                sample_rows_str = "(sample rows unavailable: query timed out)"
+            else:
+                sample_rows_str = f"(sample rows unavailable: {str(e.orig).strip()})"
 
         return (
             f"{self._sample_rows_in_table_info} rows from {table.name} table:\n"
@@ -406,67 +656,130 @@ class SQLDatabase:
             f"{sample_rows_str}"
         )
     #新增函数，增加输入表的每个列的comnets，而不是数据库中对表的commnets
-    def _get_table_comment(self, table_name: str) -> str:
-        # build the SQL command to get column comments
-        command = text(f"""
+    def _load_table_comments(self, table_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch table and column comments of all tables in one catalog query.
+
+        Returns a dict keyed by table name with the table comment under
+        "table_comment" and (column name, column comment) pairs under "columns".
+        """
+        if not table_names:
+            return {}
+        command = text("""
             SELECT
+                c.relname AS table_name,
+                obj_description(c.oid, 'pg_class') AS table_comment,
                 a.attname AS column_name,
                 col_description(a.attrelid, a.attnum) AS column_comment
             FROM
-                pg_catalog.pg_attribute a
+                pg_catalog.pg_class c
+                JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                JOIN pg_catalog.pg_attribute a
+                    ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
             WHERE
-                a.attrelid = (SELECT oid FROM pg_catalog.pg_class WHERE relname = '{table_name}')
-                AND a.attnum > 0
-                AND NOT a.attisdropped
+                n.nspname = coalesce(:schema, current_schema())
+                AND c.relname IN :table_names
             ORDER BY
-                a.attnum;
-        """)
-
+                c.relname, a.attnum
+        """).bindparams(bindparam("table_names", expanding=True))
+
+        with self._metadata_engine.connect() as connection:
+            rows = connection.execute(
+                command, {"schema": self._schema, "table_names": list(table_names)}
+            ).fetchall()
+
+        comments: Dict[str, Dict[str, Any]] = {
+            name: {"table_comment": None, "columns": []} for name in table_names
+        }
+        for row in rows:
+            entry = comments[row.table_name]
+            entry["table_comment"] = row.table_comment
+            entry["columns"].append((row.column_name, row.column_comment))
+        return comments
+
+    def _get_table_comments(self, table_names: List[str]) -> Dict[str, str]:
+        """Format the column comments (and table comment, if any) of each table."""
         try:
-            # get the column comments
-            with self._engine.connect() as connection:
-                column_comments_result = connection.execute(command)
-                column_comments = column_comments_result.fetchall()
-
-            # format the column comments
-            column_comments_str = "\n".join([f"{row.column_name}: {row.column_comment}" for row in column_comments])
-
+            comments = self._load_table_comments(table_names)
         except Exception as e:
-            column_comments_str = f"Error getting column comments: {str(e)}"
-
-        return f"Column comments for table {table_name}:\n{column_comments_str}"
+            return {
+                name: f"Column comments for table {name}:\nError getting column comments: {str(e)}"
+                for name in table_names
+            }
 
-    from sqlalchemy import text
+        formatted = {}
+        for name, entry in comments.items():
+            column_comments_str = "\n".join(
+                [f"{column}: {comment}" for column, comment in entry["columns"]]
+            )
+            table_comment_str = (
+                f"Table comment: {entry['table_comment']}\n" if entry["table_comment"] else ""
+            )
+            formatted[name] = (
+                f"Column comments for table {name}:\n{table_comment_str}{column_comments_str}"
+            )
+        return formatted
 
     def _get_table_example_comment(self, table_name: str) -> str:
-        # Build the SQL command to get the table comment
-        command = text(f"""
-            SELECT
-                obj_description(pg_class.oid) AS table_comment
-            FROM
-                pg_catalog.pg_class
-            WHERE
-                relname = '{table_name}'
-        """)
-
         try:
-            # Get the table comment
-            with self._engine.connect() as connection:
-                table_comment_result = connection.execute(command)
-                table_comment = table_comment_result.fetchone()
-
-            # Format the table comment
-            if table_comment and table_comment.table_comment:
-                table_comment_str = table_comment.table_comment
-            else:
-                table_comment_str = "No comment available for this table."
-
+            table_comment = self._load_table_comments([table_name])[table_name]["table_comment"]
+            table_comment_str = table_comment or "No comment available for this table."
         except Exception as e:
             table_comment_str = f"Error getting table comment: {str(e)}"
 
         return f"Current table's high-frequency SQL as reference:\n for table {table_name}:\n{table_comment_str}"
 
 
+    def _set_schema(self, connection: Any, execution_options: Dict[str, Any]) -> None:
+        """Point the connection's session at `self._schema`, if one is configured."""
+        if self._session_configured:
+            # already applied when the connection was checked out
+            return
+        if self._schema is not None:
+            if self.dialect == "snowflake":
+                connection.exec_driver_sql(
+                    "ALTER SESSION SET search_path = %s",
+                    (self._schema,),
+                    execution_options=execution_options,
+                )
+            elif self.dialect == "bigquery":
+                connection.exec_driver_sql(
+                    "SET @@dataset_id=?",
+                    (self._schema,),
+                    execution_options=execution_options,
+                )
+            elif self.dialect == "mssql":
+                pass
+            elif self.dialect == "trino":
+                connection.exec_driver_sql(
+                    "USE ?",
+                    (self._schema,),
+                    execution_options=execution_options,
+                )
+            elif self.dialect == "duckdb":
+                # Unclear which parameterized argument syntax duckdb supports.
+                # The docs for the duckdb client say they support multiple,
+                # but `duckdb_engine` seemed to struggle with all of them:
+                # https://github.com/Mause/duckdb_engine/issues/796
+                connection.exec_driver_sql(
+                    f"SET search_path TO {self._schema}",
+                    execution_options=execution_options,
+                )
+            elif self.dialect == "oracle":
+                connection.exec_driver_sql(
+                    f"ALTER SESSION SET CURRENT_SCHEMA = {self._schema}",
+                    execution_options=execution_options,
+                )
+            elif self.dialect == "sqlany":
+                # If anybody using Sybase SQL anywhere database then it should not
+                # go to else condition. It should be same as mssql.
+                pass
+            elif self.dialect == "postgresql":  # postgresql
+                connection.exec_driver_sql(
+                    "SET search_path TO %s",
+                    (self._schema,),
+                    execution_options=execution_options,
+                )
+
     def _execute(
         self,
         command: Union[str, Executable],
@@ -482,52 +795,10 @@ class SQLDatabase:
         """
         parameters = parameters or {}
         execution_options = execution_options or {}
-        with self._engine.begin() as connection:  # type: Connection  # type: ignore[name-defined]
-            if self._schema is not None:
-                if self.dialect == "snowflake":
-                    connection.exec_driver_sql(
-                        "ALTER SESSION SET search_path = %s",
-                        (self._schema,),
-                        execution_options=execution_options,
-                    )
-                elif self.dialect == "bigquery":
-                    connection.exec_driver_sql(
-                        "SET @@dataset_id=?",
-                        (self._schema,),
-                        execution_options=execution_options,
-                    )
-                elif self.dialect == "mssql":
-                    pass
-                elif self.dialect == "trino":
-                    connection.exec_driver_sql(
-                        "USE ?",
-                        (self._schema,),
-                        execution_options=execution_options,
-                    )
-                elif self.dialect == "duckdb":
-                    # Unclear which parameterized argument syntax duckdb supports.
-                    # The docs for the duckdb client say they support multiple,
-                    # but `duckdb_engine` seemed to struggle with all of them:
-                    # https://github.com/Mause/duckdb_engine/issues/796
-                    connection.exec_driver_sql(
-                        f"SET search_path TO {self._schema}",
-                        execution_options=execution_options,
-                    )
-                elif self.dialect == "oracle":
-                    connection.exec_driver_sql(
-                        f"ALTER SESSION SET CURRENT_SCHEMA = {self._schema}",
-                        execution_options=execution_options,
-                    )
-                elif self.dialect == "sqlany":
-                    # If anybody using Sybase SQL anywhere database then it should not
-                    # go to else condition. It should be same as mssql.
-                    pass
-                elif self.dialect == "postgresql":  # postgresql
-                    connection.exec_driver_sql(
-                        "SET search_path TO %s",
-                        (self._schema,),
-                        execution_options=execution_options,
-                    )
+        # Executables and statements that may write run in a transaction
+        read_only = isinstance(command, str) and fetch != "cursor" and is_read_only(command)
+        with self._connection(read_only) as connection:  # type: Connection  # type: ignore[name-defined]
+            self._set_schema(connection, execution_options)
 
             if isinstance(command, str):
                 command = text(command)
@@ -593,6 +864,160 @@ class SQLDatabase:
         else:
             return str(res)
 
+    def run_summarized(
+        self,
+        command: Union[str, Executable],
+        *,
+        parameters: Optional[Dict[str, Any]] = None,
+        max_rows: int = MAX_STORED_ROWS,
+        preview_rows: int = PREVIEW_ROWS,
+        inline_row_limit: int = INLINE_ROW_LIMIT,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Execute a query over a server-side cursor and return a compact result.
+
+        Rows are fetched in batches of FETCH_BATCH_SIZE, so memory stays bounded
+        however large the result is. Small results are returned in full, in the
+        same format as `run`. Larger ones are summarized (row count, column types,
+        null counts, min/max, first rows) and the first `max_rows` rows are kept
+        behind an `artifact://result/...` handle. If `stats` is given, it receives
+        the row count and whether every row was read.
+        """
+        if isinstance(command, str):
+            command = text(command)
+        execution_options = {"stream_results": True, "max_row_buffer": FETCH_BATCH_SIZE}
+        with self._engine.begin() as connection:  # type: Connection  # type: ignore[name-defined]
+            self._set_schema(connection, {})
+            cursor = connection.execute(
+                command, parameters or {}, execution_options=execution_options
+            )
+            if not cursor.returns_rows:
+                return ""
+            summary = ResultSummary(list(cursor.keys()), max_rows=max_rows)
+            try:
+                for batch in cursor.partitions(FETCH_BATCH_SIZE):
+                    if not summary.add_batch(batch):
+                        break
+            finally:
+                # closes the server-side cursor without reading the remaining rows
+                cursor.close()
+
+        return self._render_summary(summary, preview_rows, inline_row_limit, stats)
+
+    async def arun_summarized(
+        self,
+        command: Union[str, Executable],
+        *,
+        parameters: Optional[Dict[str, Any]] = None,
+        max_rows: int = MAX_STORED_ROWS,
+        preview_rows: int = PREVIEW_ROWS,
+        inline_row_limit: int = INLINE_ROW_LIMIT,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Async `run_summarized`; rows are streamed from the async engine without a worker thread.
+
+        The async engines are PostgreSQL only, so the schema comes from the session setup.
+        """
+        if self._async_engine is None:
+            return await asyncio.to_thread(
+                self.run_summarized,
+                command,
+                parameters=parameters,
+                max_rows=max_rows,
+                preview_rows=preview_rows,
+                inline_row_limit=inline_row_limit,
+                stats=stats,
+            )
+        # statements that may not return rows are executed buffered, so `returns_rows` can be checked
+        streamed = not isinstance(command, str) or is_read_only(command)
+        if isinstance(command, str):
+            command = text(command)
+        async with self._async_engine.begin() as connection:
+            if streamed:
+                result = await connection.stream(command, parameters or {})
+                summary = ResultSummary(list(result.keys()), max_rows=max_rows)
+                try:
+                    async for batch in result.partitions(FETCH_BATCH_SIZE):
+                        if not summary.add_batch(batch):
+                            break
+                finally:
+                    await result.close()
+            else:
+                result = await connection.execute(command, parameters or {})
+                if not result.returns_rows:
+                    return ""
+                summary = ResultSummary(list(result.keys()), max_rows=max_rows)
+                summary.add_batch(result.fetchall())
+        return self._render_summary(summary, preview_rows, inline_row_limit, stats)
+
+    def _render_summary(self, summary: ResultSummary, preview_rows: int, inline_row_limit: int,
+                        stats: Optional[Dict[str, Any]] = None) -> str:
+        if stats is not None:
+            stats.update(rows=summary.row_count, complete=summary.complete)
+        if not summary.row_count:
+            return ""
+        result = summary.result()
+        if summary.complete and summary.row_count <= inline_row_limit:
+            return str(result.to_rows(self._max_string_length))
+        return summary.render(summary.store(result), preview_rows, self._max_string_length, result)
+
+    def run_summarized_no_throw(self, command: str, **kwargs: Any) -> str:
+        """Like `run_summarized`, but return the error message instead of raising."""
+        try:
+            return self.run_summarized(command, **kwargs)
+        except SQLAlchemyError as e:
+            """Format the error message"""
+            return f"Error: {e}"
+
+    async def arun_summarized_no_throw(self, command: str, **kwargs: Any) -> str:
+        """Like `arun_summarized`, but return the error message instead of raising."""
+        try:
+            return await self.arun_summarized(command, **kwargs)
+        except SQLAlchemyError as e:
+            """Format the error message"""
+            return f"Error: {e}"
+
+    def explain(self, command: str, analyze: bool = False) -> Dict[str, Any]:
+        """Return the planner's estimate for a statement (`EXPLAIN (FORMAT JSON)`, PostgreSQL only).
+
+        The statement is planned, not executed, unless `analyze` is set: then it
+        runs and the plan carries actual rows, timings and buffer usage. The
+        returned dict has the root node under "Plan".
+        """
+        if self.dialect != "postgresql":
+            raise ValueError(f"EXPLAIN (FORMAT JSON) is not supported for {self.dialect}")
+        command = _single_statement(command)
+        if not analyze:
+            result = self._execute(f"EXPLAIN (FORMAT JSON) {command}", "one")
+            plan = next(iter(result[0].values()))
+        else:
+            # ANALYZE executes the statement: only strict reads, and never committed
+            if not is_read_only(command):
+                raise ValueError("EXPLAIN ANALYZE is only run for read-only statements")
+            with self._engine.connect() as connection:
+                transaction = connection.begin()
+                try:
+                    plan = connection.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {command}")).scalar()
+                finally:
+                    transaction.rollback()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]
+
+    async def aexplain(self, command: str) -> Dict[str, Any]:
+        """Async `explain`."""
+        if self._async_engine is None:
+            return await asyncio.to_thread(self.explain, command)
+        if self.dialect != "postgresql":
+            raise ValueError(f"EXPLAIN (FORMAT JSON) is not supported for {self.dialect}")
+        command = _single_statement(command)
+        async with self._async_engine.connect() as connection:
+            result = await connection.execute(text(f"EXPLAIN (FORMAT JSON) {command}"))
+            plan = result.scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]
+
     def get_table_info_no_throw(self, table_names: Optional[List[str]] = None) -> str:
         """Get information about specified tables.
 
@@ -609,6 +1034,14 @@ class SQLDatabase:
             """Format the error message"""
             return f"Error: {e}"
 
+    async def aget_table_info_no_throw(self, table_names: Optional[List[str]] = None) -> str:
+        """Async `get_table_info_no_throw`."""
+        try:
+            return await self.aget_table_info(table_names)
+        except ValueError as e:
+            """Format the error message"""
+            return f"Error: {e}"
+
     def run_no_throw(
         self,
         command: str,
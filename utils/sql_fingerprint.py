@@ -0,0 +1,300 @@
+"""
+SQL normalization and fingerprinting for agent-generated queries.
+
+`normalize_sql` produces a canonical text for a statement, so that queries that
+differ only in comments, whitespace, keyword/identifier case, trailing semicolons
+or an optional `AS` before an alias map to the same text. String literals and
+quoted identifiers are kept verbatim. With `strip_literals=True` the literals
+are replaced by `?` as well, which gives the *shape* of a query (used to group
+repeated statements in the workload log).
+
+`referenced_tables` lists the relations named after FROM/JOIN, excluding CTE
+names, for cache invalidation. It is a lightweight tokenizer, not a parser, and
+returns None when it cannot be sure (e.g. table functions).
+"""
+import hashlib
+import re
+from typing import Dict, List, Optional
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<space>\s+)
+    |(?P<line_comment>--[^\n]*)
+    |(?P<block_comment>/\*.*?\*/)
+    |(?P<string>(?:[EeBbXxNn])?'(?:[^']|'')*')
+    |(?P<dollar>\$(?P<tag>[A-Za-z_]*)\$.*?\$(?P=tag)\$)
+    |(?P<quoted>"(?:[^"]|"")*")
+    |(?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)
+    |(?P<param>\$\d+|%\(\w+\)s|:\w+)
+    |(?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    |(?P<op>::|<=|>=|<>|!=|\|\||[^\sA-Za-z0-9_])
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# Functions whose arguments use FROM, e.g. extract(year FROM d)
+_FROM_ARGUMENT_FUNCTIONS = {"extract", "substring", "trim", "overlay", "position"}
+# Keywords after which a FROM list ends
+_CLAUSE_KEYWORDS = {
+    "where", "group", "order", "having", "limit", "offset", "union", "intersect",
+    "except", "window", "fetch", "for", "on", "using", "join", "inner", "left",
+    "right", "full", "cross", "natural", "lateral", "returning", "tablesample",
+}
+# Keywords that continue a FROM list
+_JOIN_KEYWORDS = {
+    "on", "using", "join", "inner", "left", "right", "full", "cross", "natural", "lateral", "outer",
+}
+READ_ONLY_STARTS = {"select", "with", "values", "table", "explain"}
+# Keywords that make a statement write, anywhere in it (e.g. a data-modifying CTE)
+WRITE_KEYWORDS = {
+    "insert", "update", "delete", "merge", "truncate", "create", "drop", "alter",
+    "grant", "revoke", "copy", "call", "lock", "vacuum", "refresh",
+}
+# Functions with side effects
+WRITE_FUNCTIONS = {
+    "nextval", "setval", "set_config", "pg_terminate_backend", "pg_cancel_backend", "pg_advisory_lock",
+    "pg_advisory_xact_lock", "dblink_exec", "lo_import", "lo_export", "lo_unlink", "pg_notify",
+}
+
+
+def tokenize(sql: str) -> List[tuple]:
+    """Split SQL into (kind, text) tokens, dropping whitespace and comments."""
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(sql):
+        kind = match.lastgroup
+        if kind == "tag":
+            kind = "dollar"
+        if kind in ("space", "line_comment", "block_comment"):
+            continue
+        tokens.append((kind, match.group(0)))
+    return tokens
+
+
+def normalize_sql(sql: str, strip_literals: bool = False) -> str:
+    """
+    Canonical text of a SQL statement.
+
+    Args:
+    sql (str): Statement as written by the model.
+    strip_literals (bool): Replace string and numeric literals by `?`.
+
+    Returns:
+    str: Single-line, lower-cased (outside literals and quoted names) statement.
+    """
+    out = []
+    tokens = tokenize(sql)
+    while tokens and tokens[-1] == ("op", ";"):
+        tokens.pop()
+    for index, (kind, value) in enumerate(tokens):
+        if kind == "word":
+            value = value.lower()
+            # `expr AS alias` and `expr alias` are the same statement; keep AS in CAST(x AS type)
+            if value == "as" and index + 1 < len(tokens) and tokens[index + 1][0] in ("word", "quoted") \
+                    and not _inside_cast(tokens, index):
+                continue
+        elif kind in ("string", "dollar", "number") and strip_literals:
+            value = "?"
+        out.append(value)
+    text = " ".join(out)
+    # no spaces around punctuation that does not need them
+    text = re.sub(r" ([(),.]|::)", r"\1", text)
+    text = re.sub(r"([(.]|::) ", r"\1", text)
+    return text
+
+
+def _inside_cast(tokens, index) -> bool:
+    depth = 0
+    for i in range(index - 1, -1, -1):
+        value = tokens[i][1]
+        if value == ")":
+            depth += 1
+        elif value == "(":
+            if depth == 0:
+                return i > 0 and tokens[i - 1][1].lower() in ("cast", "try_cast")
+            depth -= 1
+    return False
+
+
+def fingerprint(sql: str, strip_literals: bool = False) -> str:
+    """Stable hash of the normalized statement."""
+    return hashlib.sha256(normalize_sql(sql, strip_literals).encode("utf-8")).hexdigest()[:32]
+
+
+def is_read_only(sql: str) -> bool:
+    """
+    Whether a statement only reads: a single query starting with SELECT/WITH/VALUES/TABLE/EXPLAIN
+    and containing no data-modifying CTE, SELECT INTO, row locking clause or write function.
+    """
+    tokens = tokenize(sql)
+    while tokens and tokens[-1] == ("op", ";"):
+        tokens.pop()
+    if not tokens or tokens[0][0] != "word" or tokens[0][1].lower() not in READ_ONLY_STARTS:
+        return False
+    depth = 0
+    for i, (kind, value) in enumerate(tokens):
+        lowered = value.lower()
+        if value == "(":
+            depth += 1
+        elif value == ")":
+            depth -= 1
+        elif value == ";":
+            # more than one statement
+            return False
+        elif kind != "word":
+            continue
+        elif lowered in WRITE_KEYWORDS or (lowered == "into" and depth == 0):
+            return False
+        elif lowered == "for" and i + 1 < len(tokens) and tokens[i + 1][1].lower() in ("update", "share", "no", "key"):
+            return False
+        elif lowered in WRITE_FUNCTIONS and i + 1 < len(tokens) and tokens[i + 1][1] == "(":
+            return False
+    return True
+
+
+def _scan_relations(tokens) -> tuple:
+    """
+    Find the relations named in FROM lists and JOINs, including those listed after a join clause.
+
+    Returns:
+    tuple: A list of (first token index, last token index, name) and whether some
+    FROM item could not be read (e.g. a table function).
+    """
+    relations, unsure = [], False
+    # one frame per open parenthesis: [function owning it, inside a FROM list]
+    frames = [[None, False]]
+    previous, position = None, 0
+    while position < len(tokens):
+        kind, value = tokens[position]
+        lowered = value.lower()
+        frame = frames[-1]
+        expects_relation = previous in ("from", "join") or (previous == "," and frame[1])
+        if expects_relation and kind == "word" and lowered in ("only", "lateral"):
+            position += 1
+            continue
+        if expects_relation and kind in ("word", "quoted") and lowered not in ("select", "values", "with", "table"):
+            # read a possibly schema-qualified name: name(.name)*
+            end, parts = position, [_unquote(value)]
+            while end + 2 < len(tokens) and tokens[end + 1][1] == "." and tokens[end + 2][0] in ("word", "quoted"):
+                parts.append(_unquote(tokens[end + 2][1]))
+                end += 2
+            if end + 1 < len(tokens) and tokens[end + 1][1] == "(":
+                # table function such as generate_series(...)
+                unsure = True
+            else:
+                relations.append((position, end, ".".join(parts)))
+            previous, position = "name", end + 1
+            continue
+        if expects_relation and value != "(" and lowered not in ("select", "values", "with", "table"):
+            unsure = True
+        if value == "(":
+            # a parenthesized join keeps the FROM list going, a subquery starts its own
+            frames.append([previous, expects_relation])
+            if expects_relation:
+                previous = "from"
+                position += 1
+                continue
+        elif value == ")" and len(frames) > 1:
+            frames.pop()
+        elif kind == "word":
+            if lowered in ("from", "join") and frame[0] not in _FROM_ARGUMENT_FUNCTIONS:
+                frame[1] = True
+            elif lowered in _CLAUSE_KEYWORDS - _JOIN_KEYWORDS or lowered == "select":
+                frame[1] = False
+            elif lowered in ("from", "join"):
+                lowered = "argument_from"
+        previous = lowered if kind in ("word", "op") else kind
+        position += 1
+    return relations, unsure
+
+
+def _cte_names(tokens) -> set:
+    words = [(kind, value.lower() if kind == "word" else value) for kind, value in tokens]
+    cte_names = set()
+    for i, (kind, value) in enumerate(words[:-2]):
+        # `name AS (` or `name(cols) AS (` inside a WITH clause
+        if kind in ("word", "quoted") and words[i + 1][1] == "as" and words[i + 2][1] == "(":
+            cte_names.add(_unquote(value))
+    for i, (kind, value) in enumerate(words[:-1]):
+        if kind in ("word", "quoted") and words[i + 1][1] == "(":
+            # `name(col, ...) AS (` column-list form
+            j, depth = i + 1, 0
+            while j < len(words):
+                if words[j][1] == "(":
+                    depth += 1
+                elif words[j][1] == ")":
+                    depth -= 1
+                    if depth == 0:
+                        break
+                j += 1
+            if j + 2 < len(words) and words[j + 1][1] == "as" and words[j + 2][1] == "(":
+                cte_names.add(_unquote(value))
+    return cte_names
+
+
+def referenced_tables(sql: str) -> Optional[List[str]]:
+    """
+    Names of the relations a query reads, as written (`table` or `schema.table`).
+
+    Returns None when a relation cannot be identified reliably.
+    """
+    tokens = tokenize(sql)
+    relations, unsure = _scan_relations(tokens)
+    if unsure:
+        return None
+    cte_names = _cte_names(tokens)
+    return sorted({name for _, _, name in relations if name not in cte_names})
+
+
+def _unquote(name: str) -> str:
+    if name.startswith('"') and name.endswith('"'):
+        return name[1:-1].replace('""', '"')
+    return name
+
+
+def has_top_level_limit(sql: str) -> bool:
+    """Whether the outermost query already has a LIMIT or FETCH clause."""
+    depth = 0
+    for kind, value in tokenize(sql):
+        if value == "(":
+            depth += 1
+        elif value == ")":
+            depth -= 1
+        elif depth == 0 and kind == "word" and value.lower() in ("limit", "fetch"):
+            return True
+    return False
+
+
+def replace_tables(sql: str, mapping: Dict[str, str]) -> str:
+    """
+    Rename relations read in FROM lists and JOINs, keeping everything else (comments, spacing) as written.
+
+    A relation without an alias gets its old name as alias, so qualified column
+    references stay valid. CTE names are left alone.
+
+    Args:
+    sql (str): Statement to rewrite.
+    mapping (Dict[str, str]): Table name as returned by `referenced_tables` -> replacement name.
+
+    Returns:
+    str: The rewritten statement.
+    """
+    pieces = [(match.lastgroup, match.group(0)) for match in _TOKEN_PATTERN.finditer(sql)]
+    significant = [i for i, (kind, _) in enumerate(pieces) if kind not in ("space", "line_comment", "block_comment")]
+    tokens = [pieces[i] for i in significant]
+    relations, _ = _scan_relations(tokens)
+    cte_names = _cte_names(tokens)
+    for first, last, name in relations:
+        if name not in mapping or name in cte_names:
+            continue
+        following = tokens[last + 1] if last + 1 < len(tokens) else ("op", "")
+        aliased = following[0] == "quoted" or (
+            following[0] == "word" and following[1].lower() not in _CLAUSE_KEYWORDS | _JOIN_KEYWORDS
+        )
+        replacement = mapping[name]
+        if not aliased:
+            # `orders.id` must keep resolving once `orders` is replaced
+            replacement = f"{replacement} AS {tokens[last][1]}"
+        pieces[significant[first]] = (tokens[first][0], replacement)
+        for skipped in significant[first + 1:last + 1]:
+            pieces[skipped] = ("space", "")
+    return "".join(value for _, value in pieces)
@@ -0,0 +1,636 @@
+"""
+Summary tables mined from the agent's query workload.
+
+Dashboard-style questions produce the same aggregate shape over the fact tables
+again and again, with different filter values. `SummaryTableManager.propose`
+reads the workload log (utils/workload_log.py) and, for aggregate shapes that
+ran often and slowly enough, derives a summary table from the latest statement:
+- filters of the form `<expression> <comparison> <constant>` are lifted out of
+  WHERE and become grouping columns, so one summary serves every filter value
+- other filters are kept, and the summary only covers those rows
+- sum/count/min/max are stored as is; avg is stored as a sum and a count;
+  shapes with other aggregates (count(DISTINCT ...), percentiles, ...) or
+  window functions are skipped
+- a proposal is only kept if the planner estimates the summary to be at least
+  MIN_REDUCTION times smaller than the rows it aggregates
+
+`create` builds the table on the primary and registers it in
+SUMMARY_REGISTRY_PATH. The registry file is shared with other processes (the
+app, the CLI): it is re-read and merged before every save, refresh and publish,
+so summaries created elsewhere are picked up and made usable. `refresh` rebuilds a summary inside one transaction
+(DELETE + INSERT, so readers keep seeing the previous rows until it commits),
+and only when the modification counters of its source tables changed since the
+last refresh. `start_refresher` does that every REFRESH_INTERVAL_SECONDS, and
+with AUTO_CREATE_SUMMARIES also creates new proposals.
+
+Registered summaries are advertised by `get_table_info`: the notes on a source
+table and on the summary name the grouping columns and how to combine each
+measure.
+
+Run `python -m utils.summary_tables advise|apply|refresh|list` to manage them.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from utils.sql_fingerprint import referenced_tables, tokenize
+from utils.workload_log import WORKLOAD_LOG_PATH, aggregate, read_entries
+
+# Summary table setting
+SUMMARY_TABLE_PREFIX = "bico_summary_"
+SUMMARY_REGISTRY_PATH = "summary_tables.json"
+MIN_EXECUTIONS = 5
+MIN_TOTAL_SECONDS = 30
+MIN_REDUCTION = 20
+MAX_SUMMARY_ROWS = 1000000
+REFRESH_INTERVAL_SECONDS = 15 * 60
+AUTO_CREATE_SUMMARIES = False
+MAX_AUTO_CREATED = 5
+
+# aggregate -> function that combines its stored partial results
+_COMBINE = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+_CLAUSES = {"select", "from", "where", "group", "having", "order", "limit", "offset", "fetch", "window"}
+_COMPARISONS = {"=", "<", ">", "<=", ">=", "<>", "!="}
+_COMPARISON_WORDS = {"between", "in", "like", "ilike"}
+_CONSTANT_WORDS = {
+    "and", "date", "timestamp", "time", "interval", "current_date", "current_timestamp",
+    "localtimestamp", "now", "null", "true", "false",
+}
+_NOT_ALIAS_AFTER = {"is", "not", "and", "or", "then", "else", "when", "distinct", "interval", "date", "timestamp"}
+_NOT_ALIAS = {"end", "null", "true", "false", "asc", "desc"}
+# words followed by a parenthesis that is not a function call
+_KEYWORDS = {"and", "or", "not", "in", "as", "on", "from", "join", "where", "select", "by", "exists", "between",
+             "when", "then", "else", "using", "lateral"}
+
+
+class SummaryTable(NamedTuple):
+    name: str
+    sql: str
+    fingerprint: str
+    tables: List[str]
+    # (column, expression) pairs
+    dimensions: List[List[str]]
+    # (column, aggregate as written, combining function) triples
+    measures: List[List[str]]
+    filters: List[str]
+    # FROM and WHERE clauses of `sql`
+    source: str
+    source_sql: str
+    executions: int = 0
+    total_ms: float = 0
+    estimated_rows: Optional[float] = None
+    input_rows: Optional[float] = None
+
+
+def plan_summary(sql: str, fingerprint: str = "") -> Optional[SummaryTable]:
+    """
+    Derive a summary table definition from an aggregate query.
+
+    Args:
+    sql (str): A single SELECT with aggregates, as written by the model.
+    fingerprint (str): Shape fingerprint of the query in the workload log.
+
+    Returns:
+    Optional[SummaryTable]: The definition, or None if the query cannot be served by a summary.
+    """
+    tokens = tokenize(sql)
+    while tokens and tokens[-1] == ("op", ";"):
+        tokens.pop()
+    tables = referenced_tables(sql)
+    if not tokens or tokens[0][1].lower() != "select" or not tables or ("op", ";") in tokens:
+        return None
+    if any(kind == "word" and value.lower() in ("over", "union", "intersect", "except", "rollup", "cube", "grouping")
+           for kind, value in tokens):
+        return None
+    clauses = _split_clauses(tokens)
+    if clauses is None or "from" not in clauses or not clauses["select"]:
+        return None
+    if clauses["select"][0][1].lower() == "distinct" or any(value.lower() == "select" for _, value in clauses["select"]):
+        return None
+
+    dimensions: List[List[str]] = []
+    measures: List[List[str]] = []
+    names: set = set()
+    select_items = [_split_alias(item) for item in _split_top_level(clauses["select"], ",")]
+    for position, (expression, alias) in enumerate(select_items, 1):
+        calls = _aggregate_calls(expression)
+        if calls is None:
+            return None
+        if not calls:
+            _add_dimension(dimensions, names, expression, alias, position)
+            continue
+        whole = len(calls) == 1 and calls[0][2] == len(expression) and expression[0][1].lower() == calls[0][0]
+        for function, call, _ in calls:
+            parts = [("sum", f"sum({call[4:-1]})"), ("count", f"count({call[4:-1]})")] if function == "avg" \
+                else [(function, call)]
+            for part_function, part in parts:
+                if any(measure[1] == part for measure in measures):
+                    continue
+                name = alias if whole and alias and function != "avg" else _slug(part)
+                measures.append([_unique(name, names), part, _COMBINE[part_function]])
+    if not measures:
+        return None
+
+    for item in _split_top_level(clauses.get("group", []), ","):
+        expression = _text(item)
+        if re.fullmatch(r"\d+", expression):
+            continue
+        if any(expression in (dimension[1], dimension[0]) for dimension in dimensions):
+            continue
+        _add_dimension(dimensions, names, item, None, len(dimensions) + 1)
+
+    filters = []
+    for conjunct in _split_conjuncts(clauses.get("where", [])):
+        lifted = _liftable(conjunct)
+        if lifted is None:
+            filters.append(_text(conjunct))
+        elif not any(_text(lifted) == dimension[1] for dimension in dimensions):
+            _add_dimension(dimensions, names, lifted, None, len(dimensions) + 1)
+    if not dimensions:
+        return None
+
+    select = ", ".join(f"{expression} AS {name}" for name, expression in dimensions)
+    select += ", " + ", ".join(f"{expression} AS {name}" for name, expression, _ in measures)
+    source = f"FROM {_text(clauses['from'])}"
+    if filters:
+        source += " WHERE " + " AND ".join(filters)
+    definition = f"SELECT {select} {source} GROUP BY " + ", ".join(str(i) for i in range(1, len(dimensions) + 1))
+    digest = hashlib.sha256(definition.encode("utf-8")).hexdigest()[:8]
+    # named after the first relation of the FROM clause, normally the fact table
+    first = tables[0]
+    if clauses["from"][0][0] in ("word", "quoted"):
+        first = clauses["from"][0][1]
+        if len(clauses["from"]) > 2 and clauses["from"][1][1] == "." and clauses["from"][2][0] in ("word", "quoted"):
+            first = clauses["from"][2][1]
+    base = re.sub(r"\W", "_", first.strip('"').lower())[:30]
+    return SummaryTable(
+        f"{SUMMARY_TABLE_PREFIX}{base}_{digest}", definition, fingerprint, tables,
+        dimensions, measures, filters, source, sql,
+    )
+
+
+def _split_clauses(tokens) -> Optional[Dict[str, list]]:
+    clauses, current, depth, i = {}, None, 0, 0
+    while i < len(tokens):
+        kind, value = tokens[i]
+        lowered = value.lower()
+        if value == "(":
+            depth += 1
+        elif value == ")":
+            depth -= 1
+        elif depth == 0 and kind == "word" and lowered in _CLAUSES:
+            if lowered in ("group", "order"):
+                if i + 1 >= len(tokens) or tokens[i + 1][1].lower() != "by":
+                    return None
+                i += 1
+            if lowered in clauses:
+                return None
+            current = lowered
+            clauses[current] = []
+            i += 1
+            continue
+        if current is None:
+            return None
+        clauses[current].append(tokens[i])
+        i += 1
+    return clauses
+
+
+def _split_top_level(tokens, separator: str) -> List[list]:
+    items, current, depth = [], [], 0
+    for token in tokens:
+        if token[1] == "(":
+            depth += 1
+        elif token[1] == ")":
+            depth -= 1
+        if depth == 0 and token[1].lower() == separator:
+            items.append(current)
+            current = []
+            continue
+        current.append(token)
+    if current:
+        items.append(current)
+    return items
+
+
+def _split_conjuncts(tokens) -> List[list]:
+    """Top-level AND terms of a WHERE clause; the AND of `BETWEEN x AND y` is not a separator."""
+    items, current, depth, between = [], [], 0, False
+    for token in tokens:
+        lowered = token[1].lower()
+        if token[1] == "(":
+            depth += 1
+        elif token[1] == ")":
+            depth -= 1
+        elif depth == 0 and token[0] == "word" and lowered == "between":
+            between = True
+        elif depth == 0 and token[0] == "word" and lowered == "and":
+            if between:
+                between = False
+            else:
+                items.append(current)
+                current = []
+                continue
+        current.append(token)
+    if current:
+        items.append(current)
+    return items
+
+
+def _split_alias(item) -> tuple:
+    if len(item) >= 3 and item[-2][1].lower() == "as" and item[-1][0] in ("word", "quoted"):
+        return item[:-2], _text(item[-1:])
+    if len(item) >= 2 and item[-1][0] in ("word", "quoted") and item[-1][1].lower() not in _NOT_ALIAS:
+        previous = item[-2]
+        if previous[1] == ")" or (previous[0] in ("word", "quoted") and previous[1].lower() not in _NOT_ALIAS_AFTER):
+            return item[:-1], _text(item[-1:])
+    return item, None
+
+
+def _aggregate_calls(tokens) -> Optional[List[tuple]]:
+    """
+    (function, call text, end position) of each aggregate call in an expression.
+
+    Returns None if an aggregate cannot be combined from partial results.
+    """
+    calls = []
+    for i, (kind, value) in enumerate(tokens):
+        function = value.lower()
+        if kind != "word" or i + 1 >= len(tokens) or tokens[i + 1][1] != "(":
+            continue
+        if function not in ("sum", "count", "min", "max", "avg"):
+            if function in ("string_agg", "array_agg", "json_agg", "jsonb_agg", "percentile_cont",
+                            "percentile_disc", "mode", "stddev", "variance", "bool_and", "bool_or", "every"):
+                return None
+            continue
+        depth, end = 0, i + 1
+        while end < len(tokens):
+            if tokens[end][1] == "(":
+                depth += 1
+            elif tokens[end][1] == ")":
+                depth -= 1
+                if depth == 0:
+                    break
+            end += 1
+        arguments = tokens[i + 2:end]
+        following = tokens[end + 1][1].lower() if end + 1 < len(tokens) else None
+        if not arguments or arguments[0][1].lower() == "distinct" or following in ("filter", "within"):
+            return None
+        calls.append((function, f"{function}({_text(arguments)})", end + 1))
+    return calls
+
+
+def _liftable(conjunct) -> Optional[list]:
+    """The left-hand expression of `<expression> <comparison> <constant>`, if the conjunct is one."""
+    # `NOT x = 1` negates the whole comparison, so it stays a filter
+    if conjunct and conjunct[0][0] == "word" and conjunct[0][1].lower() == "not":
+        return None
+    depth = 0
+    for i, (kind, value) in enumerate(conjunct):
+        lowered = value.lower()
+        if value == "(":
+            depth += 1
+        elif value == ")":
+            depth -= 1
+        elif depth == 0 and (value in _COMPARISONS or (kind == "word" and lowered in _COMPARISON_WORDS)):
+            left = conjunct[:i - 1] if i > 0 and conjunct[i - 1][1].lower() == "not" else conjunct[:i]
+            right = conjunct[i + 1:]
+            if not left or not right or _aggregate_calls(left) or any(t[1].lower() == "select" for t in conjunct):
+                return None
+            for j, (right_kind, right_value) in enumerate(right):
+                if right_kind in ("string", "number", "param", "dollar"):
+                    continue
+                if right_kind == "op" and right_value in (",", "(", ")", "::", "-", "+", "*", "/"):
+                    continue
+                if right_kind == "word" and (right_value.lower() in _CONSTANT_WORDS or (j > 0 and right[j - 1][1] == "::")):
+                    continue
+                return None
+            return left
+    return None
+
+
+def _add_dimension(dimensions, names, tokens, alias, position) -> None:
+    expression = _text(tokens)
+    if alias is None:
+        # a plain column reference `name` or `alias.name` keeps its name
+        column = len(tokens) % 2 == 1 and all(
+            kind in ("word", "quoted") if i % 2 == 0 else value == "." for i, (kind, value) in enumerate(tokens)
+        )
+        alias = tokens[-1][1] if column else f"dim_{position}"
+    dimensions.append([_unique(alias, names), expression])
+
+
+def _unique(name: str, names: set) -> str:
+    name = name[:55]
+    candidate, n = name, 2
+    while candidate.strip('"').lower() in names:
+        candidate = f"{name.strip(chr(34))}_{n}"
+        n += 1
+    names.add(candidate.strip('"').lower())
+    return candidate
+
+
+def _slug(call: str) -> str:
+    slug = re.sub(r"\W+", "_", call.replace("*", "all").lower()).strip("_")
+    return slug[:55] or "measure"
+
+
+def _text(tokens) -> str:
+    out, previous = "", None
+    for kind, value in tokens:
+        call = value == "(" and previous is not None and previous[0] in ("word", "quoted") \
+            and previous[1].lower() not in _KEYWORDS
+        if out and not (call or value in (")", ",", ".", "::") or out.endswith(("(", ".", "::"))):
+            out += " "
+        out += value
+        previous = (kind, value)
+    return out
+
+
+def describe(summary: SummaryTable, refreshed_at: Optional[float] = None) -> str:
+    """Note for the agent: what a summary table holds and how to query it."""
+    lines = [
+        f"Summary table {summary.name}: pre-aggregated from {', '.join(summary.tables)}. "
+        f"Prefer it over aggregating {', '.join(summary.tables)} when the question only needs these "
+        "grouping columns and measures; re-aggregate it with GROUP BY over the columns you need.",
+        "Grouping columns: " + ", ".join(f"{name} = {expression}" for name, expression in summary.dimensions),
+        "Measures: " + ", ".join(
+            f"{name} = {expression} (combine with {combine}({name}))" for name, expression, combine in summary.measures
+        ),
+    ]
+    if any(expression.startswith("sum(") for _, expression, _ in summary.measures) and \
+            any(expression.startswith("count(") for _, expression, _ in summary.measures):
+        lines.append("An average is sum(<sum column>) / sum(<count column>).")
+    if summary.filters:
+        lines.append("Only rows where: " + " AND ".join(summary.filters))
+    if refreshed_at:
+        lines.append(f"Refreshed: {time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime(refreshed_at))}")
+    return "\n".join(lines)
+
+
+class SummaryTableManager:
+    """
+    Proposes, creates and refreshes summary tables, and publishes them to `SQLDatabase.get_table_info`.
+
+    Attributes:
+    db (SQLDatabase): Database the agent queries; used for EXPLAIN estimates and table notes.
+    engine (Engine): Engine on the primary, where summary tables are written.
+    table_versions (Callable): Table names -> modification counters, e.g. `QueryResultCache.table_versions`.
+    """
+
+    def __init__(self, db, engine: Engine, table_versions: Optional[Callable[[List[str]], Optional[Dict[str, str]]]] = None,
+                 path: str = SUMMARY_REGISTRY_PATH):
+        self.db = db
+        self.engine = engine
+        self.table_versions = table_versions
+        self.path = path
+        self._lock = threading.Lock()
+        self._thread = None
+        self.refreshes = 0
+        # summary name -> {"summary": SummaryTable fields, "versions": ..., "refreshed_at": ...}
+        self._registry: Dict[str, dict] = {}
+        # summary name -> refreshed_at of registry entries whose table no longer exists
+        self._dropped: Dict[str, float] = {}
+        self._load()
+        self._publish()
+
+    def summaries(self) -> List[SummaryTable]:
+        with self._lock:
+            return [SummaryTable(**entry["summary"]) for entry in self._registry.values()]
+
+    def propose(self, path: str = WORKLOAD_LOG_PATH) -> List[SummaryTable]:
+        """
+        Summary tables for the heaviest repeated aggregate shapes in the workload log.
+
+        Returns:
+        List[SummaryTable]: Proposals with planner estimates, heaviest shape first.
+        """
+        if self.db.dialect != "postgresql" or not os.path.exists(path):
+            return []
+        existing = {summary.fingerprint for summary in self.summaries()}
+        proposals = []
+        for shape in aggregate(read_entries(path)):
+            executions = shape["statuses"].get("ok", 0)
+            if (
+                executions < MIN_EXECUTIONS
+                or shape["total_ms"] < MIN_TOTAL_SECONDS * 1000
+                or shape["fingerprint"] in existing
+                or not shape["tables"]
+                or any(table.split(".")[-1].startswith(SUMMARY_TABLE_PREFIX) for table in shape["tables"])
+            ):
+                continue
+            summary = plan_summary(shape["sample_sql"], shape["fingerprint"])
+            if summary is None:
+                continue
+            estimate = self._estimate(summary)
+            if estimate is None:
+                continue
+            rows, input_rows = estimate
+            if rows > MAX_SUMMARY_ROWS or rows * MIN_REDUCTION > input_rows:
+                continue
+            proposals.append(summary._replace(
+                executions=executions, total_ms=shape["total_ms"], estimated_rows=rows, input_rows=input_rows
+            ))
+        return sorted(proposals, key=lambda summary: summary.total_ms, reverse=True)
+
+    def _estimate(self, summary: SummaryTable) -> Optional[tuple]:
+        try:
+            rows = self.db.explain(summary.sql)["Plan"]["Plan Rows"]
+            input_rows = self.db.explain(f"SELECT 1 {summary.source}")["Plan"]["Plan Rows"]
+        except (SQLAlchemyError, ValueError, KeyError, IndexError) as e:
+            print(f"Error estimating summary table {summary.name}: {str(e)}")
+            return None
+        return rows, input_rows
+
+    def create(self, summary: SummaryTable) -> None:
+        """Build a proposed summary table on the primary and advertise it."""
+        versions = self._versions(summary)
+        with self.engine.begin() as connection:
+            connection.execute(text(f"CREATE TABLE {summary.name} AS {summary.sql}"))
+            connection.execute(text(f"ANALYZE {summary.name}"))
+        with self._lock:
+            self._registry[summary.name] = {
+                "summary": summary._asdict(), "versions": versions, "refreshed_at": time.time(),
+            }
+        self._save()
+        self.db.add_usable_table(summary.name)
+        self._publish()
+
+    def refresh(self, force: bool = False) -> int:
+        """
+        Rebuild summaries whose source tables changed since their last refresh.
+
+        Summaries registered by another process since the last call are picked up first.
+
+        Returns:
+        int: Number of summaries rebuilt.
+        """
+        if self._merge_registry():
+            self._publish()
+        refreshed = 0
+        for summary in self.summaries():
+            with self._lock:
+                previous = self._registry.get(summary.name, {}).get("versions")
+            versions = self._versions(summary)
+            if not force and versions is not None and versions == previous:
+                continue
+            try:
+                # readers keep seeing the previous rows until the transaction commits
+                with self.engine.begin() as connection:
+                    connection.execute(text(f"DELETE FROM {summary.name}"))
+                    connection.execute(text(f"INSERT INTO {summary.name} {summary.sql}"))
+                    connection.execute(text(f"ANALYZE {summary.name}"))
+            except SQLAlchemyError as e:
+                print(f"Error refreshing summary table {summary.name}: {str(e)}")
+                continue
+            with self._lock:
+                if summary.name in self._registry:
+                    self._registry[summary.name].update(versions=versions, refreshed_at=time.time())
+            refreshed += 1
+        if refreshed:
+            with self._lock:
+                self.refreshes += refreshed
+            self._save()
+            self._publish()
+        return refreshed
+
+    def start_refresher(self) -> None:
+        """Refresh (and with AUTO_CREATE_SUMMARIES, create) summaries on a daemon thread; later calls are no-ops."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run_refresher, name="summary-refresh", daemon=True)
+        self._thread.start()
+
+    def _run_refresher(self) -> None:
+        while True:
+            time.sleep(REFRESH_INTERVAL_SECONDS)
+            try:
+                self.refresh()
+                if AUTO_CREATE_SUMMARIES:
+                    for summary in self.propose()[:max(MAX_AUTO_CREATED - len(self.summaries()), 0)]:
+                        self.create(summary)
+            except Exception as e:
+                print(f"Error maintaining summary tables: {str(e)}")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            refreshed = [entry.get("refreshed_at") or 0 for entry in self._registry.values()]
+            return {
+                "tables": len(self._registry),
+                "refreshes": self.refreshes,
+                "oldest_refresh_age_seconds": time.time() - min(refreshed) if refreshed else 0,
+            }
+
+    def _versions(self, summary: SummaryTable) -> Optional[Dict[str, str]]:
+        return self.table_versions(summary.tables) if self.table_versions is not None else None
+
+    def _publish(self) -> None:
+        """Attach each summary's description to its own table info and to that of its source tables."""
+        self._merge_registry()
+        notes: Dict[str, List[str]] = {}
+        with self._lock:
+            entries = list(self._registry.values())
+        for entry in entries:
+            summary = SummaryTable(**entry["summary"])
+            note = describe(summary, entry.get("refreshed_at"))
+            for table in [summary.name] + summary.tables:
+                notes.setdefault(table.split(".")[-1], []).append(note)
+        self.db.set_table_notes({table: "\n\n".join(table_notes) for table, table_notes in notes.items()})
+
+    def _load(self) -> None:
+        registry = self._read()
+        usable = set(self.db.get_usable_table_names())
+        # summaries dropped outside the app are forgotten
+        self._registry = {name: entry for name, entry in registry.items() if name in usable}
+        self._dropped = {
+            name: entry.get("refreshed_at") or 0 for name, entry in registry.items() if name not in usable
+        }
+
+    def _read(self) -> Dict[str, dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error loading summary tables: {str(e)}")
+            return {}
+
+    def _merge_registry(self) -> List[str]:
+        """
+        Merge the registry file into memory: new summaries are added, known ones keep the latest refresh.
+
+        Returns:
+        List[str]: Names of the summaries added, which are made usable.
+        """
+        added = []
+        registry = self._read()
+        with self._lock:
+            for name, entry in registry.items():
+                current = self._registry.get(name)
+                if name in self._dropped and (entry.get("refreshed_at") or 0) <= self._dropped[name]:
+                    continue
+                if current is None:
+                    added.append(name)
+                elif (entry.get("refreshed_at") or 0) <= (current.get("refreshed_at") or 0):
+                    continue
+                self._registry[name] = entry
+        for name in added:
+            self.db.add_usable_table(name)
+        return added
+
+    def _save(self) -> None:
+        # summaries created or refreshed by another process since the last read are kept
+        self._merge_registry()
+        with self._lock:
+            data = json.dumps(self._registry, default=str)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving summary tables: {str(e)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Propose, create and refresh summary tables.")
+    parser.add_argument("command", choices=["advise", "apply", "refresh", "list"])
+    parser.add_argument("--log", default=WORKLOAD_LOG_PATH)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--force", action="store_true", help="refresh even if the source tables did not change")
+    args = parser.parse_args()
+
+    from utils.database import summary_tables
+
+    if args.command == "refresh":
+        print(f"Refreshed {summary_tables.refresh(force=args.force)} summary tables")
+        return
+    if args.command == "list":
+        for summary in summary_tables.summaries():
+            print(describe(summary))
+            print(summary.sql)
+            print()
+        return
+    for summary in summary_tables.propose(args.log)[: args.top]:
+        print(f"{summary.name}: {summary.executions} runs, {summary.total_ms / 1000:.0f} s in total, "
+              f"about {summary.estimated_rows:.0f} rows instead of {summary.input_rows:.0f}")
+        print(f"   {summary.sql}")
+        if args.command == "apply":
+            summary_tables.create(summary)
+            print("   created")
+        print()
+
+
+if __name__ == "__main__":
+    main()
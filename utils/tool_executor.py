@@ -0,0 +1,174 @@
+"""
+Concurrent tool execution for the workflow's action node.
+
+When the model emits several tool calls in one turn they are run concurrently,
+so the turn takes as long as the slowest tool instead of the sum of all of them:
+- every tool (or group of tools) has a process-wide concurrency limit shared by all sessions
+- every call has its own timeout
+- a failing or timed-out call only turns its own result into an error message; the
+  database statements of a timed-out call are cancelled
+- a call keeps its concurrency slot until its work has really stopped: an async tool
+  is cancelled at the timeout, but a sync tool runs on a worker thread that cannot be
+  interrupted, so its slot is only freed when the thread returns
+- results are returned in the order of the calls
+
+Tools that mutate the shared QuickSight builders depend on each other's side
+effects (a sheet must exist before charts are added to it), so within a turn
+they run one after another, in call order, and a timed-out one is waited for
+before the next one starts. Reading an analysis back joins the same group, so it
+sees the builder steps called before it.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool
+
+from utils.query_cancellation import query_canceller
+from utils.tracing import span
+
+# Tool execution setting
+DEFAULT_CONCURRENCY_LIMIT = 8
+DEFAULT_TIMEOUT_SECONDS = 120
+TOOL_CONCURRENCY_LIMITS = {
+    "execute_query": 4,
+    "get_table_info": 4,
+    "match_accurate_propernoun_tool": 8,
+    "get_all_datasets_from_quicksight": 2,
+    "get_analysis_info": 2,
+}
+TOOL_TIMEOUTS = {
+    "execute_query": 300,
+    "build_compile": 180,
+    "get_table_info": 120,
+    "match_accurate_propernoun_tool": 30,
+}
+SERIAL_TOOLS = {
+    "create_or_select_quicksight_builder_with_analysis",
+    "create_or_select_sheet",
+    "create_or_operate_charts",
+    "create_or_operate_filter_and_control",
+    "build_compile",
+    "get_analysis_info",
+}
+
+
+class ConcurrentToolExecutor:
+    """
+    Replacement for langgraph's ToolNode that fans independent tool calls out concurrently.
+
+    Attributes:
+    tools_by_name (Dict[str, BaseTool]): Tools available to the agent.
+    """
+
+    def __init__(self, tools: Sequence[BaseTool], concurrency_limits: Dict[str, int] = None,
+                 timeouts: Dict[str, float] = None, serial_tools=SERIAL_TOOLS):
+        self.tools_by_name = {tool.name: tool for tool in tools}
+        self.concurrency_limits = concurrency_limits or TOOL_CONCURRENCY_LIMITS
+        self.timeouts = timeouts or TOOL_TIMEOUTS
+        self.serial_tools = set(serial_tools)
+        self._semaphores = {
+            name: asyncio.Semaphore(self.concurrency_limits.get(name, DEFAULT_CONCURRENCY_LIMIT))
+            for name in self.tools_by_name
+        }
+
+    async def arun(self, state: Dict[str, Any], config: RunnableConfig) -> Dict[str, List[ToolMessage]]:
+        """
+        Graph node: execute the tool calls of the last AI message.
+
+        Args:
+        state (dict): Agent state; its last message carries the tool calls.
+        config (RunnableConfig): Run config, forwarded so callbacks see every tool call.
+
+        Returns:
+        dict: One ToolMessage per tool call, in call order.
+        """
+        with span("node", "action") as node_span:
+            tool_calls = state["messages"][-1].tool_calls
+            node_span.set(tool_calls=len(tool_calls))
+            return await self._run_all(tool_calls, config)
+
+    async def arun_call(self, tool_call: Dict[str, Any], config: RunnableConfig) -> ToolMessage:
+        """
+        Execute one tool call outside the graph, with the same limit, timeout and cancellation scope.
+
+        Args:
+        tool_call (dict): Tool call with "name", "args" and "id".
+        config (RunnableConfig): Run config, forwarded to the tool.
+
+        Returns:
+        ToolMessage: The result, or an error message.
+        """
+        return await self._run(tool_call, config)
+
+    async def _run_all(self, tool_calls, config):
+        results: List[ToolMessage] = [None] * len(tool_calls)
+
+        async def run_at(index):
+            results[index] = await self._run(tool_calls[index], config)
+
+        async def run_serial(indexes):
+            for index in indexes:
+                results[index] = await self._run(tool_calls[index], config, finish=True)
+
+        serial = [i for i, call in enumerate(tool_calls) if call["name"] in self.serial_tools]
+        parallel = [run_at(i) for i, call in enumerate(tool_calls) if call["name"] not in self.serial_tools]
+        await asyncio.gather(run_serial(serial), *parallel)
+        return {"messages": results}
+
+    async def _run(self, tool_call: Dict[str, Any], config: RunnableConfig, finish: bool = False) -> ToolMessage:
+        """
+        Execute one tool call under its tool's concurrency limit and timeout.
+
+        Args:
+        finish (bool): After a timeout, wait until the call's work has stopped before returning,
+            so that the next call of a serial group does not overlap with it.
+        """
+        name = tool_call["name"]
+        tool = self.tools_by_name.get(name)
+        if tool is None:
+            content = f"Error: {name} is not a valid tool, try one of [{', '.join(self.tools_by_name)}]."
+            return ToolMessage(content=content, name=name, tool_call_id=tool_call["id"])
+
+        timeout = self.timeouts.get(name, DEFAULT_TIMEOUT_SECONDS)
+        with span("tool", name) as tool_span, query_canceller.tool_call(tool_call["id"]):
+            queued_at = time.perf_counter()
+            semaphore = self._semaphores[name]
+            await semaphore.acquire()
+            tool_span.set(queued_ms=round((time.perf_counter() - queued_at) * 1000, 3))
+            task = asyncio.ensure_future(tool.ainvoke(tool_call["args"], config))
+            # the slot is freed when the work stops, not when this call gives up on it
+            task.add_done_callback(lambda done: _release(semaphore, done))
+            try:
+                output = await asyncio.wait_for(asyncio.shield(task), timeout)
+                content = output if isinstance(output, str) else str(output)
+            except asyncio.TimeoutError:
+                content = f"Error: {name} did not finish within {timeout} seconds. Try a cheaper request."
+                tool_span.set(timeout=1, cancelled_backends=await query_canceller.acancel_current())
+                _stop(tool, task)
+                if finish:
+                    await asyncio.wait([task])
+            except asyncio.CancelledError:
+                _stop(tool, task)
+                raise
+            except Exception as e:
+                content = f"Error: {repr(e)}\n Please fix your mistakes."
+                tool_span.set(failed=1)
+            tool_span.set(output_bytes=len(content.encode("utf-8")))
+        return ToolMessage(content=content, name=name, tool_call_id=tool_call["id"])
+
+
+def _stop(tool: BaseTool, task: asyncio.Future) -> None:
+    # an async tool stops at the cancellation; cancelling the task of a sync tool would only
+    # drop the wrapper around its worker thread, so that task is left to finish
+    if getattr(tool, "coroutine", None) is not None:
+        task.cancel()
+
+
+def _release(semaphore: asyncio.Semaphore, task: asyncio.Future) -> None:
+    semaphore.release()
+    if not task.cancelled():
+        # retrieved so that an abandoned call's error is not reported as never retrieved
+        task.exception()
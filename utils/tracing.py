@@ -0,0 +1,277 @@
+"""
+Per-turn tracing of graph nodes, tool calls, SQL statements and AWS API calls.
+
+Every chat turn is a trace. Spans nest through a context variable, so spans
+opened in concurrently running tools, and in worker threads started via
+`asyncio.to_thread`/`run_in_executor`, get the right parent. Each span records
+its duration and free-form numeric or string attributes, such as token counts,
+row counts and payload sizes.
+
+Finished spans are
+- appended as one JSON object per line to TRACE_LOG_PATH by a background
+  writer, rotated at TRACE_LOG_MAX_BYTES
+- aggregated into Prometheus-style histograms and counters, served as text by
+  `start_metrics_server` on METRICS_HOST:METRICS_PORT at /metrics
+
+Other modules can publish gauges (cache hit rates, pool saturation, ...) via
+`register_gauge_source`.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+from uuid import uuid4
+
+from utils.jsonl_writer import JsonLinesWriter
+
+# Tracing setting
+TRACE_LOG_PATH = "traces.jsonl"
+TRACE_LOG_MAX_BYTES = 100 * 1024 * 1024
+TRACE_LOG_BACKUPS = 3
+# bind to all interfaces ("0.0.0.0") only when a scraper on another host needs it
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9464
+DURATION_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_current_span = contextvars.ContextVar("bico_current_span", default=None)
+
+
+class Span:
+    """
+    A timed operation within a trace.
+
+    Attributes:
+    kind (str): One of "turn", "node", "tool", "sql", "aws".
+    name (str): Node, tool, statement or API operation name.
+    attributes (dict): Token counts, row counts, payload sizes, ...
+    """
+
+    def __init__(self, kind: str, name: str, parent: Optional["Span"] = None, **attributes):
+        self.kind = kind
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid4().hex
+        self.span_id = uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.start = time.time()
+        self._start_perf = time.perf_counter()
+        self.duration = None
+        self.error = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.duration = time.perf_counter() - self._start_perf
+        if error is not None:
+            self.error = repr(error)
+        tracer.export(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "kind": self.kind,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """
+    Exports finished spans to the JSONL log and the in-process metric aggregates.
+    """
+
+    def __init__(self, log_path=TRACE_LOG_PATH):
+        self.log_path = log_path
+        self._writer = JsonLinesWriter(log_path, max_bytes=TRACE_LOG_MAX_BYTES, backups=TRACE_LOG_BACKUPS)
+        self._lock = threading.Lock()
+        self._histograms: Dict[tuple, list] = {}
+        self._counters: Dict[tuple, float] = {}
+        self._gauge_sources: Dict[str, Callable[[], dict]] = {}
+        self._server = None
+
+    def export(self, span: Span) -> None:
+        self._writer.write(span.to_dict())
+        key = (span.kind, span.name)
+        with self._lock:
+            histogram = self._histograms.setdefault(key, [0] * len(DURATION_BUCKETS) + [0, 0.0])
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.duration <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += span.duration
+            if span.error:
+                self._counters[key + ("errors",)] = self._counters.get(key + ("errors",), 0) + 1
+            for attribute, value in span.attributes.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self._counters[key + (attribute,)] = self._counters.get(key + (attribute,), 0) + value
+
+    def register_gauge_source(self, name: str, source: Callable[[], dict]) -> None:
+        """Publish the numeric values of `source()` as gauges named bico_<name>_<key>."""
+        self._gauge_sources[name] = source
+
+    def render_metrics(self) -> str:
+        """Render all aggregates in the Prometheus text exposition format."""
+        lines = ["# TYPE bico_span_duration_seconds histogram"]
+        with self._lock:
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+            counters = dict(self._counters)
+        for (kind, name), histogram in sorted(histograms.items()):
+            labels = f'kind="{kind}",name="{_escape(name)}"'
+            for bound, count in zip(DURATION_BUCKETS, histogram):
+                lines.append(f'bico_span_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'bico_span_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram[-2]}')
+            lines.append(f"bico_span_duration_seconds_sum{{{labels}}} {histogram[-1]}")
+            lines.append(f"bico_span_duration_seconds_count{{{labels}}} {histogram[-2]}")
+        lines.append("# TYPE bico_span_attribute_total counter")
+        for (kind, name, attribute), value in sorted(counters.items()):
+            lines.append(
+                f'bico_span_attribute_total{{kind="{kind}",name="{_escape(name)}",attribute="{attribute}"}} {value}'
+            )
+        for source_name, source in list(self._gauge_sources.items()):
+            try:
+                values = _flatten(source())
+            except Exception as e:
+                print(f"Error collecting gauge source {source_name}: {str(e)}")
+                continue
+            for key, value in values.items():
+                lines.append(f"bico_{source_name}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+    def start_metrics_server(self, port: int = METRICS_PORT, host: str = METRICS_HOST) -> None:
+        """Serve /metrics on a daemon thread; later calls, and calls after a failed bind, are no-ops."""
+        with self._lock:
+            if self._server is not None:
+                return
+            tracer_ref = self
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.rstrip("/") != "/metrics":
+                        self.send_response(404)
+                        self.end_headers()
+                        return
+                    body = tracer_ref.render_metrics().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            try:
+                self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+            except OSError as e:
+                # e.g. another worker already serves the port; tracing itself keeps working
+                print(f"Error starting metrics server on {host}:{port}: {str(e)}")
+                self._server = False
+                return
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _flatten(values: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in values.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}_"))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+tracer = Tracer()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_span(kind: str, name: str, **attributes) -> Span:
+    """Start a span under the current one without making it current; call `finish` to export it."""
+    return Span(kind, name, parent=_current_span.get(), **attributes)
+
+
+@contextmanager
+def span(kind: str, name: str, **attributes):
+    """
+    Time a block as a child of the current span and make it current inside the block.
+
+    Example:
+        with span("tool", "execute_query") as s:
+            result = run()
+            s.set(rows=len(result))
+    """
+    new_span = start_span(kind, name, **attributes)
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.finish(error=e)
+        raise
+    else:
+        new_span.finish()
+    finally:
+        _current_span.reset(token)
+
+
+def instrument_sqlalchemy_engine(engine) -> None:
+    """Record a "sql" span for every statement executed on the engine."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("bico_spans", []).append(
+            start_span("sql", statement.split(None, 1)[0].upper() if statement.strip() else "SQL",
+                       statement=statement[:2000], statement_bytes=len(statement))
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("bico_spans")
+        if spans:
+            sql_span = spans.pop()
+            sql_span.set(rows=cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else None)
+            sql_span.finish()
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("bico_spans") if conn is not None else None
+        if spans:
+            spans.pop().finish(error=exception_context.original_exception)
+
+
+def instrument_boto3_client(client) -> None:
+    """Record an "aws" span for every API call made through a boto3 client."""
+    service = client.meta.service_model.service_id.hyphenize()
+
+    def _before_call(model, params, context, **kwargs):
+        context["bico_span"] = start_span("aws", f"{service}.{model.name}")
+
+    def _after_call(http_response, parsed, model, context, **kwargs):
+        aws_span = context.pop("bico_span", None)
+        if aws_span is None:
+            return
+        error = (parsed or {}).get("Error", {}).get("Code")
+        aws_span.set(status_code=getattr(http_response, "status_code", None), error_code=error)
+        # Reading the content of a streaming response would consume the stream
+        if not model.has_streaming_output:
+            aws_span.set(response_bytes=len(getattr(http_response, "content", b"") or b""))
+        aws_span.finish()
+
+    client.meta.events.register(f"before-call.{service}.*", _before_call)
+    client.meta.events.register(f"after-call.{service}.*", _after_call)
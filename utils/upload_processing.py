@@ -0,0 +1,224 @@
+"""
+Upload processing for chat attachments.
+
+Uploaded files are turned into Claude content blocks without blocking the event loop:
+- files are hashed and base64-encoded in fixed-size chunks on a worker thread
+- files above MAX_UPLOAD_BYTES are rejected, and non-tabular files above
+  MAX_INLINE_BYTES are not inlined into the prompt
+- encoded payloads are cached by content hash (sha256), so re-uploading the same
+  file skips the encoding
+- tabular files (csv, tsv, xlsx) above TABULAR_INGEST_BYTES are loaded into a
+  database table instead, and the model only receives the table name and columns;
+  if loading fails, the model receives the first PREVIEW_ROWS rows and is asked to
+  tell the user that the answer only covers that preview
+"""
+import asyncio
+import base64
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+# Upload setting
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+MAX_INLINE_BYTES = 4 * 1024 * 1024
+TABULAR_INGEST_BYTES = 256 * 1024
+# Must be a multiple of 3 so that chunk encodings concatenate without padding
+CHUNK_BYTES = 3 * 256 * 1024
+CACHE_MAX_BYTES = 128 * 1024 * 1024
+INGEST_CHUNK_ROWS = 10000
+PREVIEW_ROWS = 50
+UPLOAD_TABLE_PREFIX = "upload_"
+
+TABULAR_FORMATS = {"csv", "tsv", "xlsx", "xls"}
+
+
+class EncodedPayloadCache:
+    """
+    Thread-safe LRU of base64 payloads (or ingest results) keyed by content hash, bounded in bytes.
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, digest: str) -> Optional[str]:
+        with self._lock:
+            value = self._items.get(digest)
+            if value is not None:
+                self._items.move_to_end(digest)
+            return value
+
+    def put(self, digest: str, value: str) -> None:
+        with self._lock:
+            if digest in self._items:
+                self._size -= len(self._items.pop(digest))
+            self._items[digest] = value
+            self._size += len(value)
+            while self._size > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+
+payload_cache = EncodedPayloadCache()
+
+
+def file_digest(path: str) -> str:
+    """Hash a file in chunks without loading it into memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encode_file(path: str) -> str:
+    """Base64-encode a file chunk by chunk."""
+    parts = []
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_BYTES), b""):
+            parts.append(base64.b64encode(chunk).decode("ascii"))
+    return "".join(parts)
+
+
+def ingest_table(path: str, file_format: str, digest: str) -> str:
+    """
+    Load a tabular file into the database and describe the resulting table.
+
+    The table name is derived from the content hash, so the same file is only loaded once.
+
+    Returns:
+    str: Text for the model naming the table, its row count and columns.
+    """
+    try:
+        import pandas as pd
+    except ImportError:
+        raise ImportError(
+            "pandas package not found, please install with `pip install pandas`"
+        )
+    from utils.database import db, router
+
+    table_name = f"{UPLOAD_TABLE_PREFIX}{re.sub(r'[^0-9a-z_]', '_', Path(path).stem.lower())[:40]}_{digest[:8]}"
+    if file_format in ("xlsx", "xls"):
+        chunks = [pd.read_excel(path)]
+    else:
+        chunks = pd.read_csv(path, sep="\t" if file_format == "tsv" else ",", chunksize=INGEST_CHUNK_ROWS)
+
+    rows, columns = 0, []
+    for index, frame in enumerate(chunks):
+        frame.to_sql(
+            table_name,
+            # replicas are read-only
+            router.engine("writer"),
+            schema=db._schema,
+            if_exists="replace" if index == 0 else "append",
+            index=False,
+            chunksize=INGEST_CHUNK_ROWS,
+            method="multi",
+        )
+        rows += len(frame)
+        columns = columns or [f"{name} ({dtype})" for name, dtype in frame.dtypes.items()]
+    db.add_usable_table(table_name)
+
+    return (
+        f"The uploaded file '{Path(path).name}' was loaded into the database table {table_name} "
+        f"({rows} rows). Columns: {', '.join(columns)}. "
+        f"Query it with get_table_info and execute_query instead of reading the file."
+    )
+
+
+def preview_table(path: str, file_format: str, error: Exception) -> str:
+    """
+    Describe a tabular file that could not be loaded, with its first PREVIEW_ROWS rows inline.
+
+    Returns:
+    str: Text for the model with the failure, the preview, and an instruction to tell the user.
+    """
+    try:
+        if file_format in ("xlsx", "xls"):
+            import pandas as pd
+            preview = pd.read_excel(path, nrows=PREVIEW_ROWS).to_csv(index=False)
+        else:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                preview = "".join(line for _, line in zip(range(PREVIEW_ROWS + 1), f))
+    except Exception as e:
+        print(f"Error reading preview of {path}: {str(e)}")
+        preview = ""
+    covered = f"its first {PREVIEW_ROWS} rows" if preview else "none of its rows"
+    note = (
+        f"[The uploaded file '{Path(path).name}' could not be loaded into the database ({str(error)}). "
+        f"Tell the user that the file was not fully loaded and that the answer only covers {covered}.]"
+    )
+    return f"{note}\n{preview}" if preview else note
+
+
+def _process(path: str, mime: str) -> Optional[dict]:
+    path_obj = Path(path)
+    if not path_obj.exists():
+        return None
+    size = path_obj.stat().st_size
+    name = path_obj.stem.replace('.', '-')
+    file_format = path_obj.suffix.lstrip('.').lower()
+    if size > MAX_UPLOAD_BYTES:
+        return {"type": "text", "text": f"[File '{path_obj.name}' was not attached: {size} bytes exceeds the {MAX_UPLOAD_BYTES} byte upload limit.]"}
+
+    digest = file_digest(path)
+    is_tabular = file_format in TABULAR_FORMATS and "image" not in mime
+    if is_tabular and size > TABULAR_INGEST_BYTES:
+        key = f"table:{digest}"
+        description = payload_cache.get(key)
+        if description is None:
+            try:
+                description = ingest_table(path, file_format, digest)
+            except Exception as e:
+                print(f"Error loading upload {path_obj.name} into the database: {str(e)}")
+                # not cached, so the next upload of the file tries to load it again
+                return {"type": "text", "text": preview_table(path, file_format, e)}
+            payload_cache.put(key, description)
+        return {"type": "text", "text": description}
+
+    if size > MAX_INLINE_BYTES:
+        return {"type": "text", "text": f"[File '{path_obj.name}' was not attached: {size} bytes exceeds the {MAX_INLINE_BYTES} byte inline limit.]"}
+
+    file_data = payload_cache.get(digest)
+    if file_data is None:
+        file_data = encode_file(path)
+        payload_cache.put(digest, file_data)
+
+    if "image" in mime:
+        return {
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": mime,
+                "data": file_data
+            }
+        }
+    return {
+        "type": "document",
+        "source": {
+            "type": "base64",
+            "media_type": mime or "application/octet-stream",
+            "data": file_data
+        },
+        "name": name,
+        "format": file_format
+    }
+
+
+async def process_upload(path: str, mime: Optional[str]) -> Optional[dict]:
+    """
+    Turn an uploaded file into a content block on a worker thread.
+
+    Args:
+    path (str): Local path of the uploaded file.
+    mime (str): MIME type reported by the client.
+
+    Returns:
+    dict: Image, document or text content block, or None if the file doesn't exist.
+    """
+    return await asyncio.to_thread(_process, path, mime or "")
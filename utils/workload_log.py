@@ -0,0 +1,253 @@
+"""
+Append-only log of the SQL the agent runs.
+
+Every `execute_query` call appends one JSON object per line to WORKLOAD_LOG_PATH:
+- the shape fingerprint (`fingerprint(sql, strip_literals=True)`), so repeated
+  statements that differ only in literals group together, and the shape text
+- the raw statement as written by the model, and the statement actually run when
+  the query guard rewrote it
+- chat session and tool call, latency, rows, bytes returned to the agent, and
+  the outcome ("ok", "error", "cached", "rejected") with the guard's action
+- the tables read, for index and summary-table planning
+
+With EXPLAIN_ANALYZE_SLOW_QUERIES, a strictly read-only query slower than
+SLOW_QUERY_SECONDS is run once more under `EXPLAIN (ANALYZE, BUFFERS)` on a
+background thread, at most once per shape every EXPLAIN_ANALYZE_INTERVAL_SECONDS,
+inside a transaction that is always rolled back.
+The plan is appended as a separate "plan" entry with the same query id.
+
+Run `python -m utils.workload_log` for the heaviest shapes in the log.
+"""
+import argparse
+import json
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from uuid import uuid4
+
+from utils.jsonl_writer import JsonLinesWriter
+from utils.query_cancellation import current_scope
+from utils.sql_fingerprint import fingerprint, is_read_only, normalize_sql, referenced_tables
+
+# Workload log setting
+WORKLOAD_LOG_PATH = "workload.jsonl"
+MAX_LOGGED_SQL_LENGTH = 20000
+SLOW_QUERY_SECONDS = 5
+# EXPLAIN ANALYZE runs the query again, so it is opt-in
+EXPLAIN_ANALYZE_SLOW_QUERIES = False
+EXPLAIN_ANALYZE_INTERVAL_SECONDS = 3600
+
+
+class WorkloadLog:
+    """
+    Appends executed statements, and plans of slow ones, to a JSON lines file.
+
+    Attributes:
+    path (str): Log file, appended to.
+    slow_query_seconds (float): Latency above which a query counts as slow.
+    explain_slow_queries (bool): Whether slow queries get an EXPLAIN ANALYZE entry.
+    """
+
+    def __init__(self, path: str = WORKLOAD_LOG_PATH, slow_query_seconds: float = SLOW_QUERY_SECONDS,
+                 explain_slow_queries: bool = EXPLAIN_ANALYZE_SLOW_QUERIES,
+                 explain_interval: float = EXPLAIN_ANALYZE_INTERVAL_SECONDS):
+        self.path = path
+        self.slow_query_seconds = slow_query_seconds
+        self.explain_slow_queries = explain_slow_queries
+        self.explain_interval = explain_interval
+        self._lock = threading.Lock()
+        # entries are written by a background thread, never on the event loop
+        self._writer = JsonLinesWriter(path)
+        # shape fingerprint -> time of its last EXPLAIN ANALYZE
+        self._explained: Dict[str, float] = {}
+
+    def record(self, sql: str, status: str, latency: float, result: str = "",
+               executed_sql: Optional[str] = None, rows: Optional[int] = None,
+               guard: Optional[str] = None, explain: Optional[Callable[[str], Dict[str, Any]]] = None) -> str:
+        """
+        Append one executed (or cached, or rejected) statement.
+
+        Args:
+        sql (str): Statement as written by the model.
+        status (str): "ok", "error", "cached" or "rejected".
+        latency (float): Seconds spent in the tool, including planning.
+        result (str): Text returned to the agent.
+        executed_sql (Optional[str]): Statement run instead of `sql`, e.g. with an injected LIMIT.
+        rows (Optional[int]): Rows read, when known.
+        guard (Optional[str]): The query guard's action.
+        explain (Optional[Callable]): `db.explain`-like callable, used for slow queries.
+
+        Returns:
+        str: Id of the entry.
+        """
+        query_id = uuid4().hex[:16]
+        executed = executed_sql or sql
+        shape = fingerprint(sql, strip_literals=True)
+        scope = current_scope() or (None, None)
+        entry = {
+            "type": "query",
+            "ts": time.time(),
+            "query_id": query_id,
+            "session": scope[0],
+            "tool_call": scope[1],
+            "fingerprint": shape,
+            "exact_fingerprint": fingerprint(sql),
+            "shape": normalize_sql(sql, strip_literals=True)[:MAX_LOGGED_SQL_LENGTH],
+            "sql": sql[:MAX_LOGGED_SQL_LENGTH],
+            "executed_sql": executed[:MAX_LOGGED_SQL_LENGTH] if executed != sql else None,
+            "tables": referenced_tables(executed),
+            "status": status,
+            "guard": guard,
+            "latency_ms": round(latency * 1000, 3),
+            "rows": rows,
+            "bytes": len(result.encode("utf-8")),
+        }
+        self._append(entry)
+        if (
+            explain is not None
+            and status == "ok"
+            and latency >= self.slow_query_seconds
+            and is_read_only(executed)
+            and not executed.lstrip().lower().startswith("explain")
+            and self._claim_explain(shape)
+        ):
+            threading.Thread(
+                target=self._explain, args=(explain, executed, query_id, shape), name="workload-explain", daemon=True
+            ).start()
+        return query_id
+
+    def _claim_explain(self, shape: str) -> bool:
+        if not self.explain_slow_queries:
+            return False
+        now = time.time()
+        with self._lock:
+            if now - self._explained.get(shape, 0) < self.explain_interval:
+                return False
+            self._explained[shape] = now
+            return True
+
+    def _explain(self, explain: Callable[[str], Dict[str, Any]], sql: str, query_id: str, shape: str) -> None:
+        try:
+            plan = explain(sql)
+        except Exception as e:
+            print(f"Error running EXPLAIN ANALYZE for workload log: {str(e)}")
+            return
+        self._append({"type": "plan", "ts": time.time(), "query_id": query_id, "fingerprint": shape, "plan": plan})
+
+    def _append(self, entry: dict) -> None:
+        self._writer.write(entry)
+
+
+def read_entries(path: str = WORKLOAD_LOG_PATH) -> Iterator[dict]:
+    """Entries of a workload log, skipping lines that do not parse (e.g. a partly written last line)."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def aggregate(entries: Iterator[dict]) -> List[dict]:
+    """
+    Group query entries by shape fingerprint.
+
+    Returns:
+    List[dict]: One dict per shape with its count, latency totals and percentiles,
+    rows, bytes, outcomes, tables, a sample statement and the most recent plan.
+    """
+    shapes: Dict[str, dict] = {}
+    plans: Dict[str, dict] = {}
+    for entry in entries:
+        key = entry.get("fingerprint")
+        if key is None:
+            continue
+        if entry.get("type") == "plan":
+            plans[key] = entry["plan"]
+            continue
+        shape = shapes.setdefault(key, {
+            "fingerprint": key,
+            "shape": entry.get("shape"),
+            "sample_sql": entry.get("sql"),
+            "tables": entry.get("tables"),
+            "count": 0,
+            "executed": 0,
+            "latencies": [],
+            "rows": 0,
+            "bytes": 0,
+            "statuses": {},
+            "sessions": set(),
+        })
+        shape["count"] += 1
+        shape["statuses"][entry["status"]] = shape["statuses"].get(entry["status"], 0) + 1
+        shape["bytes"] += entry.get("bytes") or 0
+        shape["sessions"].add(entry.get("session"))
+        if entry["status"] in ("ok", "error"):
+            shape["executed"] += 1
+            shape["latencies"].append(entry.get("latency_ms") or 0)
+            shape["rows"] += entry.get("rows") or 0
+    report = []
+    for key, shape in shapes.items():
+        latencies = sorted(shape.pop("latencies"))
+        shape["sessions"] = len(shape["sessions"] - {None})
+        shape["total_ms"] = sum(latencies)
+        shape["mean_ms"] = shape["total_ms"] / len(latencies) if latencies else 0
+        shape["p95_ms"] = latencies[max(math.ceil(len(latencies) * 0.95) - 1, 0)] if latencies else 0
+        shape["max_ms"] = latencies[-1] if latencies else 0
+        shape["plan"] = plans.get(key)
+        report.append(shape)
+    return report
+
+
+def summarize_plan(plan: Dict[str, Any], top: int = 3) -> List[str]:
+    """The nodes of an EXPLAIN ANALYZE plan that took the most time of their own."""
+    root = plan.get("Plan", plan)
+    nodes, stack = [], [root]
+    while stack:
+        node = stack.pop()
+        children = node.get("Plans", [])
+        stack.extend(children)
+        loops = node.get("Actual Loops", 1) or 1
+        total = node.get("Actual Total Time", 0) * loops
+        own = total - sum(child.get("Actual Total Time", 0) * (child.get("Actual Loops", 1) or 1) for child in children)
+        nodes.append((own, node))
+    lines = []
+    for own, node in sorted(nodes, key=lambda item: item[0], reverse=True)[:top]:
+        relation = f" on {node['Relation Name']}" if "Relation Name" in node else ""
+        lines.append(
+            f"{node['Node Type']}{relation}: {own:.0f} ms, "
+            f"{int(node.get('Actual Rows', 0))} rows (estimated {int(node.get('Plan Rows', 0))})"
+        )
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank the heaviest query shapes in the workload log.")
+    parser.add_argument("--path", default=WORKLOAD_LOG_PATH)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--by", choices=["total_ms", "count", "mean_ms", "p95_ms", "rows", "bytes"], default="total_ms")
+    args = parser.parse_args()
+
+    report = sorted(aggregate(read_entries(args.path)), key=lambda shape: shape[args.by], reverse=True)
+    for rank, shape in enumerate(report[: args.top], 1):
+        statuses = ", ".join(f"{status} {count}" for status, count in sorted(shape["statuses"].items()))
+        print(f"#{rank} {shape['fingerprint'][:16]}  calls {shape['count']} ({statuses}), "
+              f"sessions {shape['sessions']}")
+        print(f"   total {shape['total_ms']:.0f} ms, mean {shape['mean_ms']:.0f} ms, "
+              f"p95 {shape['p95_ms']:.0f} ms, max {shape['max_ms']:.0f} ms, "
+              f"rows {shape['rows']}, bytes {shape['bytes']}")
+        if shape["tables"]:
+            print(f"   tables: {', '.join(shape['tables'])}")
+        print(f"   {shape['shape'][:300]}")
+        if shape["plan"]:
+            for line in summarize_plan(shape["plan"]):
+                print(f"   plan: {line}")
+        print()
+
+
+workload_log = WorkloadLog()
+
+
+if __name__ == "__main__":
+    main()